@@ -25,6 +25,7 @@ from Game.userdata import *
 from Game.interface import *
 from Game.music_manager import *
 from Game.skill import *
+from Game.simulation import *
 
 import logging
 
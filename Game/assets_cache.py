@@ -0,0 +1,201 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with cache of things assets loader has figured out during previous
+# launches: content of asset directories, parsed configs and cut spritesheets.
+# Entries are checked against files' modification time and size, with fallback
+# to hash of content if these have changed - so touched, but not edited files
+# wont invalidate anything
+
+import logging
+import pickle
+from hashlib import sha1
+from os import makedirs, replace, stat
+from os.path import dirname, join
+from panda3d.core import Texture
+
+log = logging.getLogger(__name__)
+
+MANIFEST = "manifest.pickle"
+# increase on changes of manifest's format, to make old ones get ignored
+MANIFEST_VERSION = 1
+
+
+def get_stamp(path: str) -> tuple:
+    """Get (modification time, size) of file"""
+    info = stat(path)
+    return info.st_mtime_ns, info.st_size
+
+
+def get_hash(path: str) -> str:
+    """Get hash of file's content"""
+    with open(path, "rb") as f:
+        return sha1(f.read()).hexdigest()
+
+
+class ManifestCache:
+    """Cache of loaded assets' data, persistent between launches"""
+
+    def __init__(self, path: str):
+        self.path = join(path, MANIFEST)
+        # contents of directories, by (directory, arguments of get_files)
+        self.listings = {}
+        # parsed configs, by paths of their files
+        self.configs = {}
+        # pixels of sprites, cut from spritesheets, by paths of spritesheets
+        self.sheets = {}
+        # keys of entries, used during this launch. Only these get saved, so
+        # data of removed files wont pile up
+        self.used = set()
+        self.changed = False
+
+    def load(self):
+        """Load manifest from disk. Missing or outdated one is ignored"""
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            log.debug(f"There is no manifest on {self.path} yet")
+            return
+        except Exception as e:
+            log.warning(f"Unable to load manifest from {self.path}: {e}")
+            return
+
+        if data.get("version") != MANIFEST_VERSION:
+            log.debug("Manifest is outdated, wont use it")
+            return
+
+        self.listings = data["listings"]
+        self.configs = data["configs"]
+        self.sheets = data["sheets"]
+        log.debug(f"Loaded manifest from {self.path}")
+
+    def save(self):
+        """Write entries, used during this launch, to disk"""
+        stale = {*self.listings, *self.configs, *self.sheets} - self.used
+        if not self.changed and not stale:
+            return
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "listings": {k: v for k, v in self.listings.items() if k in self.used},
+            "configs": {k: v for k, v in self.configs.items() if k in self.used},
+            "sheets": {k: v for k, v in self.sheets.items() if k in self.used},
+        }
+        try:
+            makedirs(dirname(self.path), exist_ok=True)
+            # writing to temporary file first, so crash mid-way wont leave
+            # broken manifest behind
+            with open(f"{self.path}.tmp", "wb") as f:
+                pickle.dump(data, f)
+            replace(f"{self.path}.tmp", self.path)
+        except Exception as e:
+            log.warning(f"Unable to save manifest to {self.path}: {e}")
+            return
+
+        self.changed = False
+        log.debug(f"Saved manifest to {self.path}")
+
+    def is_fresh(self, path: str, entry: dict) -> bool:
+        """Check if entry, made out of provided file, is still valid"""
+        try:
+            stamp = get_stamp(path)
+        except OSError:
+            return False
+
+        if stamp == entry["stamp"]:
+            return True
+        # file has been touched - checking if its content has actually changed
+        if stamp[1] == entry["stamp"][1] and get_hash(path) == entry["hash"]:
+            entry["stamp"] = stamp
+            self.changed = True
+            return True
+        return False
+
+    def make_entry(self, path: str, **kwargs) -> dict:
+        return {"stamp": get_stamp(path), "hash": get_hash(path), **kwargs}
+
+    def get_files(self, key: tuple) -> list:
+        """Get cached list of files for provided key or None, if content of any
+        of related directories has changed since it has been made"""
+        entry = self.listings.get(key)
+        if entry is None:
+            return None
+        for directory, stamp in entry["dirs"].items():
+            try:
+                if get_stamp(directory)[0] != stamp:
+                    return None
+            except OSError:
+                return None
+        self.used.add(key)
+        return entry["files"]
+
+    def set_files(self, key: tuple, directories: list, files: list):
+        """Cache list of files, made out of content of provided directories"""
+        self.listings[key] = {
+            "dirs": {str(d): get_stamp(d)[0] for d in directories},
+            "files": files,
+        }
+        self.used.add(key)
+        self.changed = True
+
+    def get_config(self, path, parse):
+        """Get content of config file, parsing it with provided function if its
+        not in cache or has changed"""
+        key = str(path)
+        entry = self.configs.get(key)
+        if entry is None or not self.is_fresh(key, entry):
+            entry = self.make_entry(key, content=parse(path))
+            self.configs[key] = entry
+            self.changed = True
+        self.used.add(key)
+        return entry["content"]
+
+    def get_sprites(self, path, sprite_sizes: tuple) -> list:
+        """Get textures of sprites, cut from provided spritesheet during one of
+        previous launches. Returns None if there are none or sheet has changed"""
+        key = str(path)
+        entry = self.sheets.get(key)
+        if (
+            entry is None
+            or entry["sprite_sizes"] != sprite_sizes
+            or not self.is_fresh(key, entry)
+        ):
+            return None
+
+        self.used.add(key)
+        textures = []
+        for name, (x, y), pixels in entry["sprites"]:
+            texture = Texture(name)
+            texture.setup_2d_texture(x, y, Texture.T_unsigned_byte, Texture.F_rgba)
+            texture.set_ram_image_as(pixels, "RGBA")
+            texture.set_orig_file_size(x, y, 1)
+            textures.append(texture)
+        return textures
+
+    def set_sprites(self, path, sprite_sizes: tuple, textures: list):
+        """Save pixels of sprites, cut from provided spritesheet"""
+        key = str(path)
+        sprites = []
+        for texture in textures:
+            size = (texture.get_x_size(), texture.get_y_size())
+            pixels = bytes(texture.get_ram_image_as("RGBA"))
+            sprites.append((texture.get_name(), size, pixels))
+        self.sheets[key] = self.make_entry(
+            key, sprite_sizes=sprite_sizes, sprites=sprites
+        )
+        self.used.add(key)
+        self.changed = True
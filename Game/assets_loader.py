@@ -17,15 +17,21 @@
 # module where I specify functions related to loading game assets into memory
 
 from os import listdir
-from os.path import isfile, isdir, basename, splitext
+from os.path import isfile, isdir, basename, splitext, getsize
 
 # For the reasoning behind this rework, see documentation:
 # https://docs.panda3d.org/1.10/python/programming/advanced-loading/filename-syntax
 from pathlib import Path
 from toml import load as tomload
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import json
-from panda3d.core import SamplerState
+from panda3d.core import SamplerState, TexturePool
 from p3dss import processor
+from Game.assets_cache import ManifestCache
+from Game import config_schema
 import logging
 
 log = logging.getLogger(__name__)
@@ -45,16 +51,149 @@ HEADS_DIR = Path(ENTITY_DIR, "Heads")
 BODIES_DIR = Path(ENTITY_DIR, "Bodies")
 FONTS_DIR = Path(ASSETS_DIR, "Fonts")
 
+# max amount of bytes, kept in memory by lazily loaded sprites and music. Least
+# recently used ones get unloaded when its exceeded, and loaded again on next
+# access. Sfx are small and used all the time, thus not limited
+SPRITE_CACHE_SIZE = 64 * 1024 * 1024
+MUSIC_CACHE_SIZE = 32 * 1024 * 1024
+
+# amount of threads, used to read and parse config files
+PARSE_WORKERS = 4
+
+# Threaded steps only read and parse files (or, for lazily loaded assets, only
+# find them), thus can be done in background. Ones that create textures or
+# sounds go through panda's loader, which is only safe to use from main thread.
+# Functions of these are generators that load one file per iteration and yield
+# part of step done so far, so loading could be spread across several frames
+LoadingStep = namedtuple(
+    "LoadingStep", ["name", "function", "path", "threaded"], defaults=(True,)
+)
+
+# names of steps which assets are required to build main menu. These get loaded
+# first, so menu could be shown while the rest is still loading
+MENU_STEPS = ("ui", "sfx", "music", "classes")
+
+
+def load_json(path) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class LazyAssets(Mapping):
+    """Mapping of assets, that only knows paths to them until they are accessed
+    for the first time. If max_size is set, least recently used assets get
+    unloaded with release_function once total size of loaded ones exceeds it.
+    Size of each asset is measured by get_size function, that receives its path
+    and asset itself"""
+
+    def __init__(
+        self, load_function, release_function, max_size: int = None, get_size=None
+    ):
+        self.load_function = load_function
+        self.release_function = release_function
+        self.max_size = max_size
+        self.get_size = get_size or (lambda path, asset: getsize(path))
+        # paths to assets, by their names
+        self.paths = {}
+        # assets that are currently in memory, from least to most recently used
+        self.loaded = OrderedDict()
+        self.sizes = {}
+        self.total_size = 0
+        # names of assets that never get unloaded, see pin()
+        self.pinned = set()
+
+    def __getitem__(self, name: str):
+        if name in self.loaded:
+            self.loaded.move_to_end(name)
+            return self.loaded[name]
+
+        path = self.paths[name]
+        log.debug(f"Loading {name} from {path}")
+        asset = self.load_function(path)
+        self.loaded[name] = asset
+        if self.max_size is not None:
+            self.sizes[name] = self.get_size(path, asset)
+            self.total_size += self.sizes[name]
+            self.evict()
+        return asset
+
+    def __contains__(self, name) -> bool:
+        return name in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def add_paths(self, paths: dict):
+        """Add or override paths of assets with provided names"""
+        for name in paths:
+            self.unload(name)
+        self.paths.update(paths)
+
+    def pin(self, name: str):
+        """Load asset with provided name and keep it in memory for the rest of
+        session. Meant for assets that get referenced by archetypes - unloading
+        these wont free anything anyway, while load errors are better to get
+        on startup than in the middle of game"""
+        asset = self[name]
+        if name not in self.pinned:
+            self.pinned.add(name)
+            self.total_size -= self.sizes.pop(name, 0)
+        return asset
+
+    def unload(self, name: str):
+        """Remove asset with provided name from memory, if its loaded"""
+        asset = self.loaded.pop(name, None)
+        if asset is None:
+            return
+        self.pinned.discard(name)
+        self.total_size -= self.sizes.pop(name, 0)
+        self.release_function(asset)
+
+    def evict(self):
+        """Unload least recently used assets, till total size fits into max_size.
+        Most recently used one is always kept, even if its bigger than limit"""
+        for name in list(self.loaded)[:-1]:
+            if self.total_size <= self.max_size:
+                return
+            if name in self.pinned:
+                continue
+            log.debug(f"Unloading {name} to free up memory")
+            self.unload(name)
+
+    def clear(self):
+        for name in list(self.loaded):
+            self.unload(name)
+        self.paths = {}
+
 
 class AssetsLoader:
-    def __init__(self):
+    def __init__(self, cache_path: str = None):
         # this will load all the default assets into memory. With reworked loader,
         # it should conceptually be possible to load custom stuff on top of these
         # in future. E.g for modding and such purposes
-        self.music = {}
-        self.sfx = {}
+        # using lambdas, coz showbase's loader doesnt exist yet at this point.
+        # Unloading sounds removes them from audio manager's cache, and textures
+        # from TexturePool - otherwise these would keep them in memory forever
+        self.music = LazyAssets(
+            lambda path: loader.load_music(path),
+            lambda sound: base.musicManager.uncache_sound(sound.get_name()),
+            MUSIC_CACHE_SIZE,
+        )
+        self.sfx = LazyAssets(
+            lambda path: loader.load_sfx(path), lambda sound: loader.unload_sfx(sound)
+        )
         self.ui = {}
-        self.sprite = {}
+        # these are loaded on demand, since lots of sprites (say, of mods) may
+        # never be used during session
+        self.sprite = LazyAssets(
+            self.load_texture,
+            TexturePool.release_texture,
+            SPRITE_CACHE_SIZE,
+            lambda path, texture: texture.estimate_texture_memory(),
+        )
         self.classes = {}
         self.enemies = {}
         self.skills = {}
@@ -62,8 +201,29 @@ class AssetsLoader:
         self.heads = {}
         self.bodies = {}
 
+        # data of previous launches, that allows to skip walking directories,
+        # parsing configs and cutting spritesheets. Disabled if there is no path
+        self.cache = ManifestCache(cache_path) if cache_path else None
+
         # self.load_all()
 
+    def get_steps(self) -> list:
+        """Get LoadingSteps of all default assets, with these required for main
+        menu coming first"""
+        steps = [
+            LoadingStep("ui", self.load_ui_by_file, UI_DIR, threaded=False),
+            LoadingStep("sfx", self.load_sfx, SFX_DIR),
+            LoadingStep("music", self.load_music, MUSIC_DIR),
+            LoadingStep("classes", self.load_classes, CLASSES_DIR),
+            LoadingStep("sprites", self.load_sprite, SPRITE_DIR),
+            LoadingStep("enemies", self.load_enemies, ENEMIES_DIR),
+            LoadingStep("skills", self.load_skills, SKILLS_DIR),
+            LoadingStep("projectiles", self.load_projectiles, PROJECTILES_DIR),
+            LoadingStep("heads", self.load_heads, HEADS_DIR),
+            LoadingStep("bodies", self.load_bodies, BODIES_DIR),
+        ]
+        return sorted(steps, key=lambda step: step.name not in MENU_STEPS)
+
     def get_files(
         self,
         pathtodir: str,
@@ -73,7 +233,32 @@ class AssetsLoader:
     ) -> list:
         """Fetches and returns list of files in provided directory. Optionally
         may include subdirectories and seek for specific file extension"""
+        key = (str(pathtodir), include_subdirs, extension, case_insensitive)
+        if self.cache:
+            files = self.cache.get_files(key)
+            if files is not None:
+                return files
+
+        directories = []
+        files = self.walk(
+            pathtodir, include_subdirs, extension, case_insensitive, directories
+        )
+        if self.cache:
+            self.cache.set_files(key, directories, files)
+        return files
+
+    def walk(
+        self,
+        pathtodir: str,
+        include_subdirs: bool,
+        extension: str,
+        case_insensitive: bool,
+        directories: list,
+    ) -> list:
+        """Actually walk the directory for get_files. Paths of processed
+        directories get added to provided list"""
         files = []
+        directories.append(pathtodir)
 
         log.debug(f"Attempting to parse directory {pathtodir}")
         directory_content = listdir(pathtodir)
@@ -88,7 +273,13 @@ class AssetsLoader:
                         f"{itempath} leads to directory, attempting "
                         "to process its content"
                     )
-                    files += self.get_files(itempath, include_subdirs, extension)
+                    files += self.walk(
+                        itempath,
+                        include_subdirs,
+                        extension,
+                        case_insensitive,
+                        directories,
+                    )
             else:
                 # assuming that everything that isnt directory is file
                 log.debug(f"{itempath} leads to file")
@@ -111,6 +302,26 @@ class AssetsLoader:
         log.debug(f"Got following files in total: {files}")
         return files
 
+    def get_paths(self, pathtodir: str, extension: str) -> dict:
+        """Get paths to files in provided directory, by names of files without
+        extensions"""
+        files = self.get_files(pathtodir, extension=extension)
+        return {splitext(basename(item))[0]: item for item in files}
+
+    def parse(self, path, parse_function):
+        """Parse config file with provided function, or get its content from
+        cache, if its there"""
+        if self.cache:
+            return self.cache.get_config(path, parse_function)
+        return parse_function(path)
+
+    def load_texture(self, path: str):
+        """Load texture with filtering, suitable for pixel art"""
+        sprite = loader.load_texture(path)
+        sprite.set_magfilter(SamplerState.FT_nearest)
+        sprite.set_minfilter(SamplerState.FT_nearest)
+        return sprite
+
     def get_textures(self, pathtodir: str, extension: str = ".png") -> dict:
         """Get textures from provided directory"""
         files = self.get_files(pathtodir, extension=extension)
@@ -120,9 +331,7 @@ class AssetsLoader:
             name_of_file = basename(item)
             name_without_extension = splitext(name_of_file)[0]
             try:
-                sprite = loader.load_texture(item)
-                sprite.set_magfilter(SamplerState.FT_nearest)
-                sprite.set_minfilter(SamplerState.FT_nearest)
+                sprite = self.load_texture(item)
             except Exception as e:
                 log.warning(f"Unable to fetch {item}: {e}")
                 continue
@@ -130,20 +339,52 @@ class AssetsLoader:
 
         return data
 
-    def get_jsons(self, pathtodir: str, extension: str = ".json") -> dict:
-        """Get jsons from provided directory"""
+    def parse_all(self, files: list, parse_function) -> list:
+        """Parse provided files in worker threads. Returns list of (path, content)
+        in order of files, with content being exception if parsing has failed"""
+
+        def parse(item):
+            try:
+                return self.parse(item, parse_function)
+            except Exception as e:
+                return e
+
+        if len(files) < 2:
+            return [(item, parse(item)) for item in files]
+
+        with ThreadPoolExecutor(PARSE_WORKERS) as pool:
+            return list(zip(files, pool.map(parse, files)))
+
+    def get_configs(self, pathtodir: str, extension: str, parse_function) -> list:
+        """Get (path, content) of valid config files from provided directory.
+        Files are checked against schema of their extension, if there is one.
+        Content of valid ones is frozen to be read-only"""
         files = self.get_files(pathtodir, extension=extension)
+        schema = config_schema.SCHEMAS.get(extension)
 
+        configs = []
+        for item, content in self.parse_all(files, parse_function):
+            if isinstance(content, Exception):
+                log.warning(f"Unable to fetch {item}: {content}")
+                continue
+            if schema is not None:
+                errors = config_schema.validate(content, schema)
+                if errors:
+                    log.warning(
+                        f"{item} has invalid format: {'; '.join(errors)}. "
+                        "Wont import"
+                    )
+                    continue
+            configs.append((item, config_schema.freeze(content)))
+
+        return configs
+
+    def get_jsons(self, pathtodir: str, extension: str = ".json") -> dict:
+        """Get jsons from provided directory"""
         data = {}
-        for item in files:
+        for item, content in self.get_configs(pathtodir, extension, load_json):
             name_of_file = basename(item)
             name_without_ext = splitext(name_of_file)[0]
-            try:
-                with open(item, "r") as f:
-                    content = json.load(f)
-            except Exception as e:
-                log.warning(f"Unable to fetch {item}: {e}")
-                continue
             data[name_without_ext] = content
 
         return data
@@ -153,116 +394,112 @@ class AssetsLoader:
     ) -> dict:
         """Get spritesheet descriptions from provided directory"""
         data = self.get_jsons(pathtodir, extension=extension)
-        # filtering invalid descriptions.
-        # Doing like that to avoid crash on dict size change
-        keys = list(data.keys())
-        for item in keys:
-            if (
-                not "sprite_size" in data[item]
-                or
-                # assumed first wont trigger on existing but empty
-                # #TODO: maybe add type/length check?
-                not data[item]["sprite_size"]
-                or not "batch_cutting" in data[item]
-                or not "sprites" in data[item]
-            ):
-                data.pop(item)
-
-        return data
+        # format is already checked against schema, thus only ensuring that
+        # size of sprites makes sense
+        return {
+            name: description
+            for name, description in data.items()
+            if len(description["sprite_size"]) == 2
+        }
 
     def get_tomls(self, pathtodir: str, extension: str = ".toml") -> dict:
         """Get tomls from provided directory"""
-        files = self.get_files(pathtodir, extension=extension)
         data = {}
-        for item in files:
+        for item, content in self.get_configs(pathtodir, extension, tomload):
             try:
-                toml_content = tomload(item)
-                internal_name = toml_content["Main"]["name"]
+                internal_name = content["Main"]["name"]
             except Exception as e:
                 log.warning(f"{item} has invalid format: {e}. Wont import")
                 continue
             else:
-                data[internal_name] = toml_content
+                data[internal_name] = content
 
         return data
 
-    def load_ui(self, pathtodir: str, extension: str = ".png"):
-        textures = self.get_textures(pathtodir, extension=extension)
-        descriptions = self.get_spritesheet_descriptions(pathtodir)
+    def cut_spritesheet(self, path, sprite_sizes: tuple) -> list:
+        """Get textures of sprites, cut out of spritesheet on provided path"""
+        if self.cache:
+            sprites = self.cache.get_sprites(path, sprite_sizes)
+            if sprites is not None:
+                for sprite in sprites:
+                    sprite.set_magfilter(SamplerState.FT_nearest)
+                    sprite.set_minfilter(SamplerState.FT_nearest)
+                return sprites
+
+        # avoiding possible issues with incorrect sized/formats
+        try:
+            sprites = processor.get_textures(
+                spritesheet=self.load_texture(path),
+                sprite_sizes=sprite_sizes,
+            )
+        except Exception as e:
+            log.warning(f"Unable to cut {path}: {e}")
+            return []
+
+        for sprite in sprites:
+            sprite.set_magfilter(SamplerState.FT_nearest)
+            sprite.set_minfilter(SamplerState.FT_nearest)
+        if self.cache:
+            self.cache.set_sprites(path, sprite_sizes, sprites)
+        return sprites
 
-        described_sheets = [x for x in list(textures) if x in list(descriptions)]
+    def load_ui(self, pathtodir: str, extension: str = ".png"):
+        for _ in self.load_ui_by_file(pathtodir, extension):
+            pass
 
-        # will crash on duplicates, shouldnt happen
-        for sheet in described_sheets:
-            # for now, all processed items get removed from textures list
-            # and results of processing with overlapping names will overwrite
-            # whatever is already in textures. Its made on purpose to provide
-            # smooth transition from textures to sheets. However it may break
-            # stuff in some cases and, maybe, require rework or some switch #TODO
+    def load_ui_by_file(self, pathtodir: str, extension: str = ".png"):
+        """Same as load_ui, but yields part of files processed after each one"""
+        paths = self.get_paths(pathtodir, extension)
+        descriptions = self.get_spritesheet_descriptions(pathtodir)
 
-            # for now, only batch cutting is supported. Precise sprite cutting
-            # is something I will need to add in future #TODO
-            # textures[sheet].set_keep_ram_image(True)
-            if descriptions[sheet]["batch_cutting"]:
-                # avoiding possible issues with incorrect sized/formats
+        textures = {}
+        sprite_data = {}
+        for num, (name, path) in enumerate(paths.items()):
+            yield num / len(paths)
+            if name not in descriptions:
                 try:
-                    sprites = processor.get_textures(
-                        spritesheet=textures[sheet],
-                        sprite_sizes=tuple(descriptions[sheet]["sprite_size"]),
-                    )
+                    textures[name] = self.load_texture(path)
                 except Exception as e:
-                    log.warning(f"Unable to cut {sheet}: {e}")
-                    pass
-                else:
-                    sprite_data = {}
-                    for sprite in sprites:
-                        sprite.set_magfilter(SamplerState.FT_nearest)
-                        sprite.set_minfilter(SamplerState.FT_nearest)
-                        # will crash on empty, shouldnt happen
-                        sprite_data[sprite.get_name()] = sprite
+                    log.warning(f"Unable to fetch {path}: {e}")
+                continue
 
-                    # maybe should do that after removal of original file?
-                    textures = {**textures, **sprite_data}
+            # described sheets dont get into textures themselves - only sprites,
+            # cut out of them. Results of processing with overlapping names will
+            # overwrite whatever is already in textures. Its made on purpose to
+            # provide smooth transition from textures to sheets. However it may
+            # break stuff in some cases and, maybe, require rework or some switch
+            # #TODO
 
-                    # textures[f"{sheet}_sprites"] = sprites
-                    textures[sheet] = sprites
-            textures.pop(sheet)
+            # for now, only batch cutting is supported. Precise sprite cutting
+            # is something I will need to add in future #TODO
+            if descriptions[name]["batch_cutting"]:
+                sprites = self.cut_spritesheet(
+                    path, tuple(descriptions[name]["sprite_size"])
+                )
+                for sprite in sprites:
+                    # will crash on empty, shouldnt happen
+                    sprite_data[sprite.get_name()] = sprite
 
         log.debug("Updating UI storage")
-        self.ui = textures
+        self.ui = {**textures, **sprite_data}
 
     def load_music(self, pathtodir: str, extension: str = ".ogg"):
-        """Load and update currently known music from provided directory and its subdirs"""
-        files = self.get_files(pathtodir, extension=extension)
-
-        data = {}
-        for item in files:
-            name_of_file = basename(item)
-            name_without_extension = splitext(name_of_file)[0]
-            data[name_without_extension] = loader.load_music(item)
-
+        """Update currently known music with these in provided directory. Tracks
+        get loaded on first access"""
         log.debug("Updating music storage")
-        self.music = {**self.music, **data}
+        self.music.add_paths(self.get_paths(pathtodir, extension))
 
     def load_sfx(self, pathtodir: str, extension: str = ".ogg"):
-        """Load and update currently known sfx from provided directory and its subdirs"""
-        files = self.get_files(pathtodir, extension=extension)
-
-        data = {}
-        for item in files:
-            name_of_file = basename(item)
-            name_without_extension = splitext(name_of_file)[0]
-            data[name_without_extension] = loader.load_sfx(item)
-
+        """Update currently known sfx with these in provided directory. Sounds
+        get loaded on first access"""
         log.debug("Updating sfx storage")
-        self.sfx = {**self.sfx, **data}
+        self.sfx.add_paths(self.get_paths(pathtodir, extension))
 
     def load_sprite(self, pathtodir: str, extension: str = ".png"):
-        """Load and update currently known sprites from provided directory"""
-        data = self.get_textures(pathtodir)
-
+        """Update currently known sprites with these in provided directory.
+        Sprites get loaded on first access"""
         log.debug("Updating sprite storage")
-        self.sprite = {**self.sprite, **data}
+        self.sprite.add_paths(self.get_paths(pathtodir, extension))
 
     def load_classes(self, pathtodir: str):
         """Load and update configuration files of player classes from provided
@@ -306,25 +543,37 @@ class AssetsLoader:
         log.debug("Updating bodies storage")
         self.bodies = {**self.bodies, **data}
 
-    def load_all(self):
-        """Load all assets from default paths"""
-        self.load_ui(UI_DIR)
-        self.load_music(MUSIC_DIR)
-        self.load_sfx(SFX_DIR)
-        self.load_sprite(SPRITE_DIR)
-        self.load_classes(CLASSES_DIR)
-        self.load_enemies(ENEMIES_DIR)
-        self.load_skills(SKILLS_DIR)
-        self.load_projectiles(PROJECTILES_DIR)
-        self.load_heads(HEADS_DIR)
-        self.load_bodies(BODIES_DIR)
+    def load_all(self, progress=None):
+        """Load all assets from default paths. If progress function is provided,
+        it receives name of finished step, amount of finished and total steps"""
+        if self.cache:
+            self.cache.load()
+
+        steps = self.get_steps()
+        for num, step in enumerate(steps, start=1):
+            log.debug(f"Loading {step.name}")
+            result = step.function(step.path)
+            if not step.threaded:
+                for _ in result:
+                    pass
+            if progress:
+                progress(step.name, num, len(steps))
+
+        if self.cache:
+            self.cache.save()
+
+    def load_in_background(self) -> "BackgroundLoading":
+        """Start loading all assets from default paths in separate thread"""
+        loading = BackgroundLoading(self)
+        loading.start()
+        return loading
 
     def reset(self):
         """Reset assets dictionaries to empty state"""
         self.ui = {}
-        self.music = {}
-        self.sfx = {}
-        self.sprite = {}
+        self.music.clear()
+        self.sfx.clear()
+        self.sprite.clear()
         self.classes = {}
         self.enemies = {}
         self.skills = {}
@@ -336,3 +585,108 @@ class AssetsLoader:
         """Reset assets dictionaries to be empty, then load defaults"""
         self.reset()
         self.load_all()
+
+
+class BackgroundLoading:
+    """Loading of assets, partially running in separate thread. Its .update()
+    is meant to be called each frame from main thread (say, by taskmanager
+    routine) - it does steps that cant be threaded, one file per call, and saves
+    the cache once everything is done. Gui and most of other stuff should only
+    be touched from main thread too, thus this class is only polled"""
+
+    def __init__(self, assets: AssetsLoader):
+        self.assets = assets
+        self.thread = Thread(target=self.run, name="assets loader", daemon=True)
+        steps = assets.get_steps()
+        self.threaded_steps = [step for step in steps if step.threaded]
+        self.main_steps = [step for step in steps if not step.threaded]
+        # generator of main thread's step in progress and part of it done
+        self.current = None
+        self.current_progress = 0
+        # names of finished steps
+        self.finished = []
+        self.total = len(steps)
+        # exception that stopped loading, if any
+        self.error = None
+        # set once all steps are done and cache has been saved
+        self.completed = False
+
+    @property
+    def progress(self) -> float:
+        """Part of steps done, from 0 to 1"""
+        if not self.total:
+            return 1
+        return (len(self.finished) + self.current_progress) / self.total
+
+    @property
+    def done(self) -> bool:
+        return self.error is not None or self.completed
+
+    def is_ready(self, names: tuple) -> bool:
+        """Check if steps with provided names have finished"""
+        return all(name in self.finished for name in names)
+
+    def start(self):
+        log.debug("Starting to load assets in background")
+        # cache is loaded before worker starts, so both threads could use it
+        if self.assets.cache:
+            self.assets.cache.load()
+        self.thread.start()
+
+    def do_step(self, step: LoadingStep) -> bool:
+        """Do provided step. Returns False if it has failed"""
+        log.debug(f"Loading {step.name}")
+        try:
+            step.function(step.path)
+        except Exception as e:
+            self.fail(step, e)
+            return False
+        self.finish(step)
+        return True
+
+    def fail(self, step: LoadingStep, error: Exception):
+        log.error(f"Unable to load {step.name}: {error}")
+        self.error = error
+
+    def finish(self, step: LoadingStep):
+        self.finished.append(step.name)
+        log.debug(f"Loaded {step.name} ({len(self.finished)}/{self.total})")
+
+    def advance(self):
+        """Load next file of main thread's step, starting the step if needed"""
+        step = self.main_steps[0]
+        try:
+            if self.current is None:
+                log.debug(f"Loading {step.name}")
+                self.current = step.function(step.path)
+            self.current_progress = next(self.current)
+        except StopIteration:
+            self.main_steps.pop(0)
+            self.current = None
+            self.current_progress = 0
+            self.finish(step)
+        except Exception as e:
+            self.fail(step, e)
+
+    def run(self):
+        for step in self.threaded_steps:
+            if self.error is not None or not self.do_step(step):
+                return
+
+    def update(self):
+        """Load next file of steps that have to be done on main thread. Once all
+        the steps are done, save the cache and mark loading as completed"""
+        if self.done:
+            return
+
+        if self.main_steps:
+            self.advance()
+            return
+
+        # saving only after worker has finished, so it wont change entries of
+        # cache while its being written
+        if self.thread.is_alive():
+            return
+        if self.assets.cache:
+            self.assets.cache.save()
+        self.completed = True
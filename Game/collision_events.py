@@ -17,199 +17,187 @@
 # various stuff triggered on collisions of certain objects
 
 import logging
-from panda3d.core import Vec3, CollisionEntry, NodePath
-from time import time
-from Game import shared
+import numpy as np
+from Game import entity2d, shared
 
 log = logging.getLogger(__name__)
 
-# pause between calls to per-node's damage function. Making it anyhow lower will
-# reintroduce the bug with multiple damage calls occuring during single frame
-COLLISION_CHECK_PAUSE = 0.2
-
-
-def check_damage_possibility(target: NodePath) -> bool:
-    """Check if its possible to damage specified target right now, based
-    on its "last_collision_time" python tag"""
-    # this is a workaround for issue caused by multiple collisions occuring
-    # at single frame, so damage check function cant keep up with it. Basically,
-    # we allow new target's collisions to only trigger damage function each
-    # 0.2 seconds. It may be good idea to abandon this thing in future in favor
-    # of something like collisionhandlerqueue, but for now it works
-
-    last_collision_time = target.get_python_tag("last_collision_time")
-    current_time = time()
-    if current_time - last_collision_time < COLLISION_CHECK_PAUSE:
-        return False
-
-    return True
-
-
-def creature_with_projectile(creature: str, collision: CollisionEntry):
-    """Things to do when creature collides with projectile.
-    Creature resembles category of creature, to which collision applies
-    (either player or enemy)"""
-    # In current implementation we dont filter category of projectile, leaving
-    # it to tracked events that trigger this function. This may cause issues
-
-    # Determining if we are working with player collision or enemy collision
-    if creature == shared.game_data.player_category:
-        category = shared.game_data.player_category
-    else:
-        category = shared.game_data.enemy_category
-
-    # At first - lets get raw data about what collided with what
-    hitter = collision.get_from_node_path().get_parent()
-    target = collision.get_into_node_path().get_parent()
-    hitter_category = hitter.get_python_tag("category")
-    target_category = target.get_python_tag("category")
-
-    # workaround for "None Type" exception that rarely occurs if one of colliding
-    # nodes has died the very second it needs to be used in another collision
-    if not hitter_category or not target_category:
-        log.debug(f"{hitter} or {target} is dead, ignored collision")
-        return
-
-    # Now lets maybe flip over hitter and target based on their category
-    if hitter_category == category:
-        hitter, target = target, hitter
-
-    # Checking if its even possible to hit creature right now
-    if not check_damage_possibility(target):
-        log.debug("Collision cant occur right now")
-        return
-    target.set_python_tag("last_collision_time", time())
-
-    # Finally, lets get required stats from projectile and damage target
-    damage = hitter.get_python_tag("damage")
-    damage_function = target.get_python_tag("get_damage")
-    effects = hitter.get_python_tag("effects")
-    log.debug(
-        f"Attempting to deal {damage} damage to "
-        f"{target.get_python_tag('name')} ({target.get_python_tag('id')})"
-    )
-    damage_function(damage, effects)
-
-    # Checking if projectile should die on collision with creature
-    if not hitter.get_python_tag("die_on_creature_collision"):
-        return
-
-    kill_hitter = hitter.get_python_tag("die_command")
-    if kill_hitter:
-        kill_hitter()
-
-
-def entity_with_border(collision: CollisionEntry):
-    """Function that triggers on collision of entity with map's border"""
-    col_obj = collision.get_from_node_path().get_parent()
-    # safety check for situations when object is in process of dying but hasnt
-    # been removed completely yet
-    if not col_obj:
-        log.warning(f"{col_obj} seems to be dead, collision wont occur")
-        return
-
-    # getting pos like that, because of how map borders work
-    wall_pos = collision.get_into_node_path().get_python_tag("position")[0]
-
-    # This is projectile-exclusive, but... maybe at some point creatures could
-    # use this too? #TODO
-    if col_obj.get_python_tag("ricochets_amount") and col_obj.get_python_tag(
-        "direction"
-    ):
-        # this will crash on non-int and break on negative ricochets_amount
-        col_obj.set_python_tag(
-            "ricochets_amount", (col_obj.get_python_tag("ricochets_amount") - 1)
+
+# amount of different layers masks can hold
+MAX_LAYERS = 32
+# amount of category codes entity storage can have, see EntityStore.category
+MAX_CATEGORIES = 256
+
+
+def get_categories() -> list:
+    """Get names of all the collision categories there are"""
+    return [
+        shared.game_data.player_category,
+        shared.game_data.enemy_category,
+        shared.game_data.player_projectile_category,
+        shared.game_data.enemy_projectile_category,
+    ]
+
+
+def get_collision_matrix() -> dict:
+    """Get table of what happens when entities of (from, into) categories touch.
+    Handlers receive lists of (from, into) pairs of slots. None means these pairs
+    are ignored and never get tested at all. Every pair of categories should be
+    listed exactly once, so nothing would be forgotten on addition of new ones"""
+    player = shared.game_data.player_category
+    enemy = shared.game_data.enemy_category
+    player_projectile = shared.game_data.player_projectile_category
+    enemy_projectile = shared.game_data.enemy_projectile_category
+
+    return {
+        # player colliding with enemy projectiles
+        (player, enemy_projectile): creatures_with_projectiles,
+        # same for enemies colliding with player's attack projectiles
+        (enemy, player_projectile): creatures_with_projectiles,
+        # there is only one player, and enemies are allowed to walk through it,
+        # so they could surround it. These pairs dont collide on purpose
+        (player, player): None,
+        (player, enemy): None,
+        # enemies are pushed apart by entity2d.CrowdSeparation instead
+        (enemy, enemy): None,
+        # creatures dont get hurt by projectiles of their own side
+        (player, player_projectile): None,
+        (enemy, enemy_projectile): None,
+        # projectiles fly through eachother
+        (player_projectile, player_projectile): None,
+        (player_projectile, enemy_projectile): None,
+        (enemy_projectile, enemy_projectile): None,
+    }
+
+
+def check_collision_matrix(matrix: dict, categories: list) -> list:
+    """Check collision matrix for mistakes. Returns list of found errors"""
+    errors = []
+    listed = {}
+    for (first, second), handler in matrix.items():
+        for category in (first, second):
+            if category not in categories:
+                errors.append(f"{first} x {second}: unknown category {category}")
+        if handler is not None and not callable(handler):
+            errors.append(f"{first} x {second}: handler {handler} isnt callable")
+        pair = frozenset((first, second))
+        if pair in listed:
+            errors.append(f"{first} x {second}: already listed as {listed[pair]}")
+        listed[pair] = f"{first} x {second}"
+
+    for num, first in enumerate(categories):
+        for second in categories[num:]:
+            if frozenset((first, second)) not in listed:
+                errors.append(f"{first} x {second}: missing from matrix")
+
+    handled = sum(handler is not None for handler in matrix.values())
+    if handled > MAX_LAYERS:
+        errors.append(f"{handled} handled pairs wont fit into {MAX_LAYERS} layers")
+
+    return errors
+
+
+class CollisionDispatcher:
+    """Receives contacts, found by CollisionEngine, and passes them to handlers
+    of related pairs of categories in batches. Collision masks of categories are
+    generated from provided matrix, so pairs without handlers are never tested"""
+
+    def __init__(self, entities: entity2d.EntityStore, matrix: dict, categories: list):
+        self.entities = entities
+        # handlers of (from, into) codes of categories. Each receives list of
+        # (from, into) pairs of entities' slots
+        self.handlers = {}
+        # masks of categories, by their codes. Each handled pair of categories
+        # gets its own bit, set in from mask of first one and into mask of second
+        self.from_masks = np.zeros(MAX_CATEGORIES, dtype=np.uint32)
+        self.into_masks = np.zeros(MAX_CATEGORIES, dtype=np.uint32)
+
+        # its better to explode there than to silently lose some collisions
+        # once level is already running
+        errors = check_collision_matrix(matrix, categories)
+        if errors:
+            raise ValueError(f"Invalid collision matrix: {'; '.join(errors)}")
+
+        for (first, second), handler in matrix.items():
+            if handler is not None:
+                self.add(first, second, handler)
+
+    def add(self, first: str, second: str, handler):
+        """Make collisions between entities of provided categories get passed to
+        handler. Order of slots in pairs will always match order of categories"""
+        if len(self.handlers) >= MAX_LAYERS:
+            raise ValueError(f"Cant have more than {MAX_LAYERS} handled pairs")
+
+        codes = (
+            self.entities.get_category_code(first),
+            self.entities.get_category_code(second),
+        )
+        layer = np.uint32(1 << len(self.handlers))
+        self.from_masks[codes[0]] |= layer
+        self.into_masks[codes[1]] |= layer
+        self.handlers[codes] = handler
+        log.debug(f"Collisions of {first} into {second} use layer {layer:#x}")
+
+    def dispatch(self, first: np.ndarray, second: np.ndarray):
+        """Pass (first, second) arrays of slots of touching entities to handlers
+        of their categories. Masks only let handled pairs through, and engine
+        always puts entity that collides into another first"""
+        categories = self.entities.category
+        first_categories = categories[first]
+        second_categories = categories[second]
+        # going in order of registration, to keep it consistent between runs
+        for (first_code, second_code), handler in self.handlers.items():
+            matching = (first_categories == first_code) & (
+                second_categories == second_code
+            )
+            if not matching.any():
+                continue
+
+            handler(list(zip(first[matching].tolist(), second[matching].tolist())))
+
+
+def creatures_with_projectiles(collisions: list):
+    """Things to do when creatures collide with projectiles. Receives list of
+    (creature, projectile) pairs of slots"""
+    entities = shared.level.entities
+    table = entities.collision_data
+    tick = shared.level.simulation.tick
+    for target_slot, hitter_slot in collisions:
+        target = table[target_slot]
+        hitter = table[hitter_slot]
+        # projectile could die from another collision on the same tick, in which
+        # case its already returned to pool. Creature could die the same way,
+        # in which case it shouldnt get hit anymore. Slots could also be freed
+        # by removal of their entities
+        if (
+            target is None
+            or hitter is None
+            or entities.has_flag(target_slot, entity2d.DEAD)
+            or entities.has_flag(hitter_slot, entity2d.DEAD)
+        ):
+            log.debug(f"{hitter_slot} or {target_slot} is dead, ignored collision")
+            continue
+
+        # each projectile hits each creature only once, or once per its rehit
+        # interval. Otherwise projectiles that stay for a while (say, mines)
+        # would deal damage on each tick their collision continues. Its tracked
+        # by pair, so other projectiles can hit the same creature meanwhile.
+        # Id is there in case creature's slot has been reused by another one
+        key = (target_slot, entities.ids[target_slot].item())
+        last_hit = hitter.hits.get(key)
+        if last_hit is not None and (
+            hitter.rehit is None or tick.number - last_hit < hitter.rehit
+        ):
+            continue
+        hitter.hits[key] = tick.number
+
+        # Finally, lets get required stats from projectile and damage target
+        log.debug(
+            f"Attempting to deal {hitter.damage} damage to "
+            f"{target.entity.name} ({target.entity.id})"
         )
+        target.entity.get_damage(hitter.damage, hitter.effects)
 
-        x, y, h = col_obj.get_python_tag("direction")
-
-        if wall_pos[0]:
-            x = -x
-            # dont ask me why and how rotation works, because "it just works"
-            col_obj.set_h(180)
-
-        if wall_pos[1]:
-            y = -y
-
-        col_obj.set_python_tag("direction", Vec3(x, y, h))
-        # see comment above. I have no idea why it works and it will probably
-        # break on billboard projectiles #TODO
-        col_obj.set_r(-(col_obj.get_r()))
-
-        # returning right there, because ricochets override whatever below
-        return
-
-    # this will be ideal knockback if we collide with wall right on its center
-    if col_obj.get_python_tag("mov_spd"):
-        col_pos = col_obj.get_pos()
-        vector = col_pos - wall_pos
-        vx, vy = vector.get_xy()
-
-        # workaround to fix the issue with entity running into a wall getting
-        # pushed to wall's center. This way it wont hapen anymore... I think
-        if wall_pos[1] < 0:
-            vx = 0
-            vy = 1
-        elif wall_pos[1] > 0:
-            vx = 0
-            vy = -1
-        else:
-            pass
-
-        if wall_pos[0] < 0:
-            vx = 1
-            vy = 0
-        elif wall_pos[0] > 0:
-            vx = -1
-            vy = 0
-        else:
-            pass
-
-        vector = Vec3(vx, vy, 0).normalized()
-
-        # this works for entities with any movement speed. However, there is some
-        # old issue, I was unable to fix:
-        # - Entity will get pushed back as far as its mov_spd is. Meaning entities
-        # that move faster will get pushed closer to map's center. Its not an
-        # issue for enemies (I think), but it may get annoying for player.
-        #
-        # For now, I have no idea how to solve both of these. Maybe at some point
-        # I will re-implement collisionhandlerpusher for player, to deal with the
-        # most annoying part of it #TODO
-        new_pos = col_pos - vector * col_obj.get_python_tag("mov_spd")
-
-        col_obj.set_pos(new_pos)
-
-    if not col_obj.get_python_tag("die_on_object_collision"):
-        return
-
-    kill_hitter = col_obj.get_python_tag("die_command")
-    if kill_hitter:
-        kill_hitter()
-
-
-def entity_with_entity(collision: CollisionEntry):
-    """Things to do when unspecified entity collides with other entity.
-    This is effectively a collisionhandlerpusher - if target has "is_pushable"
-    python tag set to True, it will be slightly moved away"""
-
-    hitter = collision.get_from_node_path().get_parent()
-    target = collision.get_into_node_path().get_parent()
-
-    # Ensuring that we can push target (its not turret or something)
-    if not target.get_python_tag("is_pushable") or not hitter.get_python_tag("mov_spd"):
-        # TODO: maybe if target isnt pushable, hitter shouldnt be able to move
-        # into target's direction?
-        return
-
-    # Pushing target into general direction of hitter's movement with hitter's
-    # mov_spd. This works, but right now also introduce some shaking. Maybe I
-    # should temporarily decrease someone's movement speed? #TODO
-    vec_to_target = target.get_pos() - hitter.get_pos()
-    vec_to_target = vec_to_target.normalized()
-    vxy = vec_to_target.get_xy()
-    new_pos = target.get_pos() + (vxy * hitter.get_python_tag("mov_spd"), 0)
-    target.set_pos(new_pos)
-
-    # if vec_to_target.length() < 1:
-    #    hitter.set_python_tag("mov_spd", 0)
+        # Checking if projectile should die on collision with creature
+        if hitter.die_on_creature_collision:
+            hitter.entity.die()
@@ -23,6 +23,7 @@
 from Game import assets_loader, userdata
 from Game.common import classes
 from copy import deepcopy
+from random import Random
 import logging
 
 log = logging.getLogger(__name__)
@@ -56,8 +57,6 @@ game_data.enemy_category = "enemy"
 game_data.player_category = "player"
 game_data.player_projectile_category = "player_projectile"
 game_data.enemy_projectile_category = "enemy_projectile"
-# This is the name of map border that prevents leaving the map's sides
-game_data.border_category = "border"
 
 # Default map size. I will probably purge this later in favor of per-map configs
 # #TODO
@@ -99,6 +98,10 @@ settings = deepcopy(default_settings)
 music_player = None
 sfx_manager = None
 
+# Source of all gameplay randomness. Its a separate instance and not module-level
+# functions of random, so it could be seeded to make runs reproducible
+rng = Random()
+
 # Storage for class used to build consistent ui parts
 ui_builder = None
 
@@ -110,7 +113,11 @@ ui = classes.InterfaceStorage()
 
 # Storage for assets. Since for now it doesnt break stuff, its initialized there
 # and not via GameWindow like sound managers. #TODO: remake in case of emergence
-assets = assets_loader.AssetsLoader()
+assets = assets_loader.AssetsLoader(cache_path=userdata.CACHE_DIR)
+
+# Storage for archetypes of entities and skills, compiled out of assets above.
+# Must be initialized from GameWindow's init, after assets have been loaded
+archetypes = None
 
 # Manager for user settings and stuff
 user_data = userdata.UserdataManager()
@@ -0,0 +1,228 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with schemas of configuration files and functions to check these
+# against them. Its done on load, so broken config (say, of some mod) gets
+# rejected right away, instead of crashing the game once its entity spawns
+
+from collections import namedtuple
+from types import MappingProxyType
+import logging
+
+log = logging.getLogger(__name__)
+
+# Rule of single key of config's table. Types is a type or tuple of them. Schema
+# is used to check content of tables, items - type(s) of content of arrays.
+# Choices limit values to provided ones
+Key = namedtuple(
+    "Key",
+    ["types", "required", "schema", "items", "choices"],
+    defaults=(False, None, None, None),
+)
+
+# Rule for keys that arent specified in schema explicitly
+ANY = "*"
+
+NUMBER = (int, float)
+
+ANIMATION = {
+    "sprites": Key(list, required=True, items=int),
+    "loop": Key(bool),
+    "speed": Key(NUMBER),
+    "reset_on_complete": Key(bool),
+}
+ANIMATIONS = {ANY: Key(dict, schema=ANIMATION)}
+
+CREATURE = {
+    "Main": Key(
+        dict,
+        required=True,
+        schema={
+            "name": Key(str, required=True),
+            "hitbox_size": Key(NUMBER),
+            "skills": Key(list, items=str),
+        },
+    ),
+    "Stats": Key(dict, required=True, schema={ANY: Key(NUMBER)}),
+    "Assets": Key(
+        dict,
+        schema={
+            "head": Key(str),
+            "default_head": Key(str),
+            "body": Key(str),
+            "Sounds": Key(dict, schema={ANY: Key(str)}),
+        },
+    ),
+}
+
+HEAD = {
+    "Main": Key(
+        dict,
+        required=True,
+        schema={
+            "name": Key(str, required=True),
+            "spritesheet": Key(str, required=True),
+            "size": Key(list, items=NUMBER),
+            "position": Key(list, items=NUMBER),
+            "default_head": Key(str),
+        },
+    ),
+    # heads are sets of animations, by names of heads
+    "Animations": Key(dict, required=True, schema={ANY: Key(dict, schema=ANIMATIONS)}),
+}
+
+BODY = {
+    "Main": Key(
+        dict,
+        required=True,
+        schema={
+            "name": Key(str, required=True),
+            "spritesheet": Key(str, required=True),
+            "size": Key(list, items=NUMBER),
+        },
+    ),
+    "Animations": Key(dict, required=True, schema=ANIMATIONS),
+}
+
+PROJECTILE = {
+    "Main": Key(
+        dict,
+        required=True,
+        schema={
+            "name": Key(str, required=True),
+            "hitbox_size": Key(NUMBER),
+            "scale": Key(NUMBER),
+            "billboard": Key(bool),
+            "angle": Key(NUMBER),
+        },
+    ),
+    "Assets": Key(dict, schema={"sprite": Key(str)}),
+    "Animations": Key(dict, schema=ANIMATIONS),
+}
+
+SKILL_EFFECTS = {"stun": Key(NUMBER)}
+
+SKILL = {
+    "Main": Key(
+        dict,
+        required=True,
+        schema={
+            "name": Key(str, required=True),
+            "caster_animation": Key(str),
+            "cast_time": Key(NUMBER),
+            "cooldown": Key(NUMBER),
+        },
+    ),
+    "Projectile": Key(
+        dict,
+        schema={
+            "name": Key(str),
+            "scale": Key(NUMBER),
+            "hitbox": Key(NUMBER),
+            "lifetime": Key(NUMBER),
+            "knockback": Key(NUMBER),
+            "spawn_offset": Key(NUMBER),
+            "speed": Key(NUMBER),
+            "ricochets_amount": Key(int),
+            "die_on_object_collision": Key(bool),
+            "die_on_creature_collision": Key(bool),
+            "scale_with_caster": Key(bool),
+            "rehit_interval": Key(NUMBER),
+            "behavior": Key(
+                str,
+                choices=(
+                    "follow_caster",
+                    "attach_to_caster",
+                    "move_towards_direction",
+                ),
+            ),
+        },
+    ),
+    "Stats": Key(dict, schema={"dmg": Key(NUMBER), "dmg_multiplier": Key(NUMBER)}),
+    "Effects": Key(
+        dict,
+        schema={
+            "caster": Key(dict, schema=SKILL_EFFECTS),
+            "target": Key(dict, schema=SKILL_EFFECTS),
+        },
+    ),
+}
+
+SPRITESHEET_DESCRIPTION = {
+    "sprite_size": Key(list, required=True, items=int),
+    "batch_cutting": Key(bool, required=True),
+    "sprites": Key(list, required=True),
+}
+
+# schemas of entity configs, by their extensions
+SCHEMAS = {
+    ".player": CREATURE,
+    ".enemy": CREATURE,
+    ".head": HEAD,
+    ".body": BODY,
+    ".projectile": PROJECTILE,
+    ".skill": SKILL,
+    ".ss": SPRITESHEET_DESCRIPTION,
+}
+
+
+def is_type(value, types) -> bool:
+    """Check if value is of provided types. Bools arent counted as numbers"""
+    if isinstance(value, bool) and bool not in (
+        types if isinstance(types, tuple) else (types,)
+    ):
+        return False
+    return isinstance(value, types)
+
+
+def validate(data: dict, schema: dict, path: str = "") -> list:
+    """Check data against provided schema. Returns list of found errors.
+    Unknown keys are allowed, to not break configs made for newer versions"""
+    errors = []
+    for key, rule in schema.items():
+        if key != ANY and rule.required and key not in data:
+            errors.append(f"{path}{key} is missing")
+
+    for key, value in data.items():
+        rule = schema.get(key, schema.get(ANY))
+        if rule is None:
+            continue
+
+        where = f"{path}{key}"
+        if not is_type(value, rule.types):
+            errors.append(f"{where} has invalid type {type(value).__name__}")
+        elif rule.choices is not None and value not in rule.choices:
+            errors.append(f"{where} should be one of {rule.choices}, not {value}")
+        elif rule.schema is not None:
+            errors += validate(value, rule.schema, f"{where}.")
+        elif rule.items is not None:
+            for num, item in enumerate(value):
+                if not is_type(item, rule.items):
+                    errors.append(
+                        f"{where}[{num}] has invalid type {type(item).__name__}"
+                    )
+
+    return errors
+
+
+def freeze(data):
+    """Make read-only copy of config's content, so nothing could accidently
+    change it after load"""
+    if isinstance(data, dict):
+        return MappingProxyType({k: freeze(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return tuple(freeze(item) for item in data)
+    return data
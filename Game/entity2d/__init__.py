@@ -14,11 +14,23 @@
 ## You should have received a copy of the GNU General Public License
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
+from Game.entity2d.store import *
 from Game.entity2d.entity2d import *
+
+# before creature, coz its annotations refer to archetypes
+from Game.entity2d.archetype import *
 from Game.entity2d.creature import *
 from Game.entity2d.player import *
 from Game.entity2d.enemy import *
 from Game.entity2d.projectile import *
+from Game.entity2d.ai import *
+from Game.entity2d.grid import *
+from Game.entity2d.bounds import *
+from Game.entity2d.physics import *
+from Game.entity2d.kinematics import *
+from Game.entity2d.pool import *
+from Game.entity2d.registry import *
+from Game.entity2d.instancing import *
 
 import logging
 
@@ -0,0 +1,128 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with enemies' ai. Instead of each enemy thinking on its own, all of them
+# get processed at once, with only rare per-enemy calls (casting skills, switching
+# animations) done one by one
+
+import logging
+import numpy as np
+from panda3d.core import Vec3
+from Game import shared
+from Game.entity2d import store
+
+log = logging.getLogger(__name__)
+
+# Distance to target, below which chasers stop moving. Without it, enemy keeps
+# running into target despite already colliding with it, which cause enemy's
+# animation to go wild. Ideally it should be calculated from both hitboxes
+STOP_DISTANCE = 6
+
+MOVE_ACTION = store.ACTION_CODES["move"]
+IDLE_ACTION = store.ACTION_CODES["idle"]
+
+
+class ChaserAI:
+    """Simulation's routine that makes all creatures of provided category chase
+    level's player and attack it with first available skill once close enough"""
+
+    def __init__(self, entities: store.EntityStore, category: str):
+        self.entities = entities
+        self.category = category
+
+    def update(self, event):
+        """Move all chasers towards player. Meant to be attached to ai stage"""
+        # TODO: maybe make it possible to chase not for just player?
+        # TODO: not all enemies need to behave this way. e.g, for example, we can
+        # only affect enemies that have their ['ai'] set to ['chaser']...
+        # or something among these lines, will see in future
+        target = shared.level.player
+        # disable ai if player is dead, since there is nobody left to chase
+        if target is None or target.dead:
+            return
+
+        entities = self.entities
+        slots = entities.select(category=self.category)
+        if not slots.size:
+            return event.cont
+
+        stunned = (entities.flags[slots] & store.STUNNED) != 0
+        entities.velocity[slots[stunned]] = 0
+        slots = slots[~stunned]
+        if not slots.size:
+            return event.cont
+
+        positions = entities.position[slots]
+        vectors = entities.position[target.slot] - positions
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        # normalizing vectors is the key to avoid "flickering" effect, as its
+        # basically ignores whatever minor difference in placement there are
+        directions = np.divide(
+            vectors,
+            distances[:, None],
+            out=np.zeros_like(vectors),
+            where=distances[:, None] > 0,
+        )
+        speeds = entities.speed[slots]
+        velocities = directions * speeds[:, None]
+
+        moving = distances > STOP_DISTANCE
+        velocities[~moving] = 0
+        entities.velocity[slots] = velocities
+        entities.position[slots] = positions + velocities
+
+        flags = entities.flags[slots]
+        casting = (flags & store.CASTING) != 0
+        # it may be good idea to also track camera angle, if I will decide
+        # to implement camera controls, at some point or another. #TODO
+        face_left = directions[:, 0] * speeds >= 0
+        turned = face_left != ((flags & store.FACING_LEFT) != 0)
+
+        # this thing basically makes enemy move till it hit player, than play
+        # attack animation. May backfire if player's sprite size is not equal
+        # to player's hitbox
+        in_range = distances <= shared.game_data.sprite_size[0] * 2
+        actions = np.where(in_range, IDLE_ACTION, MOVE_ACTION)
+        animated = ~casting & (actions != entities.action[slots])
+
+        # trying to find angle that wont suck. Basically its the same thing, as
+        # with player. Its an angle between (0, 1) and (-x, y) of direction
+        angles = np.degrees(np.arctan2(directions[:, 0], directions[:, 1]))
+
+        # everything below is per-creature, thus only done for these that need it
+        instances = entities.entities
+        for slot, left in zip(slots[turned].tolist(), face_left[turned].tolist()):
+            instances[slot].change_direction("left" if left else "right")
+
+        for slot, action in zip(slots[animated].tolist(), actions[animated].tolist()):
+            instances[slot].change_animation(
+                "move" if action == MOVE_ACTION else "idle"
+            )
+
+        # casting last, coz spawning projectiles may grow storage's columns
+        for slot, (x, y), angle in zip(
+            slots[in_range].tolist(),
+            directions[in_range].tolist(),
+            angles[in_range].tolist(),
+        ):
+            creature = instances[slot]
+            # cast the very first skill available. #TODO: add something to affect
+            # order of skills in creature.skills
+            skill = creature.get_available_skill()
+            if skill:
+                skill.cast(direction=Vec3(x, y, 0), angle=angle)
+
+        return event.cont
@@ -0,0 +1,388 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with archetypes - immutable descriptions of entities and skills, compiled
+# once out of configuration files after assets have been loaded. This way each
+# spawn only has to build nodes, instead of walking raw config dicts again
+
+import logging
+from collections import namedtuple
+from types import MappingProxyType
+import p3dss
+from Game import entity2d, shared
+
+log = logging.getLogger(__name__)
+
+# relatively to player height, not scene
+HEAD_HEIGHT = 0.2
+
+# Description of SpritesheetNode and its placement on entity
+SpritesheetArchetype = namedtuple(
+    "SpritesheetArchetype",
+    [
+        "spritesheet",
+        "sprite_sizes",
+        # tuple of p3dss.SpritesheetItem. These are frozen, thus can be shared
+        "items",
+        "default_item",
+        "position",
+        "layer",
+        "remove_on_death",
+    ],
+)
+
+CreatureArchetype = namedtuple(
+    "CreatureArchetype",
+    ["name", "stats", "skills", "hitbox_size", "body", "head", "death_sound"],
+)
+
+ProjectileArchetype = namedtuple(
+    "ProjectileArchetype",
+    ["name", "hitbox_size", "scale", "body", "billboard", "angle"],
+)
+
+# Settings of projectile, spawned by skill
+SkillProjectile = namedtuple(
+    "SkillProjectile",
+    [
+        "name",
+        "scale",
+        "hitbox",
+        "lifetime",
+        "knockback",
+        "spawn_offset",
+        "die_on_object_collision",
+        "die_on_creature_collision",
+        "ricochets_amount",
+        "behavior",
+        "speed",
+        "scale_with_caster",
+        "rehit_interval",
+    ],
+)
+
+SkillArchetype = namedtuple(
+    "SkillArchetype",
+    [
+        "name",
+        "caster_animation",
+        "cast_time",
+        "cooldown",
+        "projectile",
+        # (value, multiplier) of skill's damage, or None
+        "dmg",
+        "target_effects",
+        "caster_effects",
+    ],
+)
+
+Archetypes = namedtuple("Archetypes", ["classes", "enemies", "projectiles", "skills"])
+
+
+def compile_items(animations: dict, reset_on_complete: bool = False) -> tuple:
+    """Turn animations table from config file into SpritesheetItems"""
+    items = []
+    for name, settings in animations.items():
+        items.append(
+            p3dss.SpritesheetItem(
+                name=name,
+                sprites=settings["sprites"],
+                loop=settings.get("loop", False),
+                playback_speed=settings.get("speed", shared.game_data.playback_speed),
+                reset_on_complete=settings.get("reset_on_complete", reset_on_complete),
+            )
+        )
+    return tuple(items)
+
+
+def get_spritesheet(name: str, assets):
+    """Get sprite with provided name, if its known. Sprites used by archetypes
+    are kept in memory for the whole session, see LazyAssets.pin()"""
+    if not name or name not in assets.sprite:
+        return None
+    return assets.sprite.pin(name)
+
+
+def compile_body(name: str, assets) -> SpritesheetArchetype:
+    """Compile body with provided name. Returns None if it cant be used"""
+    body_data = assets.bodies.get(name, None)
+    if not body_data:
+        return None
+
+    # not checking if "main" exists, coz it should be already filtered out by
+    # assets loader
+    spritesheet = get_spritesheet(body_data["Main"].get("spritesheet", None), assets)
+    animations = body_data.get("Animations", None)
+    if not spritesheet or not animations:
+        return None
+
+    return SpritesheetArchetype(
+        spritesheet=spritesheet,
+        # idk if this will break at some point
+        sprite_sizes=body_data["Main"].get("size", None)
+        or shared.game_data.sprite_size,
+        items=compile_items(animations),
+        default_item=None,
+        position=(0, 0, 0),
+        layer=0.0,
+        remove_on_death=False,
+    )
+
+
+def compile_head(name: str, default_head: str, assets) -> SpritesheetArchetype:
+    """Compile head with provided name. Returns None if it cant be used"""
+    head_data = assets.heads.get(name, None)
+    if (
+        not head_data
+        or not head_data["Main"].get("spritesheet", None)
+        or not (head_data["Main"]["spritesheet"] in assets.sprite)
+        or not head_data.get("Animations")
+    ):
+        return None
+
+    # if no head has been set to start with, or head doesnt exist - setting
+    # up the very first one to be shown instead
+    starting_head = default_head or head_data["Main"].get("default_head", None)
+    if starting_head and head_data["Animations"].get(starting_head, None):
+        sprites = head_data["Animations"][starting_head]
+    else:
+        head_name = list(head_data["Animations"].keys())[0]
+        sprites = head_data["Animations"][head_name]
+
+    return SpritesheetArchetype(
+        spritesheet=get_spritesheet(head_data["Main"]["spritesheet"], assets),
+        sprite_sizes=head_data["Main"].get("size", None)
+        or shared.game_data.sprite_size,
+        items=compile_items(sprites, reset_on_complete=True),
+        default_item=list(sprites)[0],
+        # Depending on values, sprite may render slightly different.
+        # Been told that it happens because of lack of antialiasing #TODO
+        position=tuple(head_data["Main"].get("position", (0, 0, 0))),
+        layer=HEAD_HEIGHT,
+        remove_on_death=True,
+    )
+
+
+def compile_creature(name: str, data: dict, assets) -> CreatureArchetype:
+    """Compile archetype of creature out of its configuration file"""
+    body = head = death_sound = None
+    if data.get("Assets", None):
+        head_name = data["Assets"].get("head", None)
+        if head_name:
+            head = compile_head(
+                head_name, data["Assets"].get("default_head", None), assets
+            )
+
+        body_name = data["Assets"].get("body", None)
+        if body_name:
+            body = compile_body(body_name, assets)
+
+        if data["Assets"].get("Sounds", None):
+            death_sound = data["Assets"]["Sounds"].get("death", None)
+
+    if death_sound and (death_sound in assets.sfx):
+        death_sound = assets.sfx[death_sound]
+    else:
+        log.warning(f"{name} has no custom death sound, using fallback")
+        death_sound = assets.sfx["default_death"]
+
+    # stats not known to entity storage would be lost anyway
+    stats = {}
+    for stat, value in data["Stats"].items():
+        if stat in entity2d.STAT_COLUMNS:
+            stats[stat] = value
+        else:
+            log.warning(f"{name} has unknown stat {stat}, ignoring")
+
+    skills = []
+    for item in data["Main"].get("skills", None) or ():
+        if item in assets.skills:
+            skills.append(item)
+        else:
+            log.warning(f"{name} has unknown skill {item}, ignoring")
+
+    return CreatureArchetype(
+        name=name,
+        stats=MappingProxyType(stats),
+        skills=tuple(skills),
+        hitbox_size=data["Main"].get("hitbox_size", None)
+        or shared.game_data.hitbox_size,
+        body=body,
+        head=head,
+        death_sound=death_sound,
+    )
+
+
+def compile_projectile(name: str, data: dict, assets) -> ProjectileArchetype:
+    """Compile archetype of projectile out of its configuration file"""
+    body = None
+    # its probably possible to do this in less ugly way, but whatever
+    if data.get("Assets", None):
+        spritesheet = get_spritesheet(data["Assets"].get("sprite", None), assets)
+        animations = data.get("Animations", None)
+        if spritesheet and animations:
+            body = SpritesheetArchetype(
+                spritesheet=spritesheet,
+                sprite_sizes=data.get("size", None) or shared.game_data.sprite_size,
+                items=compile_items(animations),
+                default_item=None,
+                position=(0, 0, 0),
+                layer=0.0,
+                remove_on_death=False,
+            )
+
+    return ProjectileArchetype(
+        name=name,
+        hitbox_size=data["Main"].get("hitbox_size", 0),
+        scale=data["Main"].get("scale", 1),
+        body=body,
+        billboard=data["Main"].get("billboard", False),
+        angle=data["Main"].get("angle", 0),
+    )
+
+
+def compile_skill(name: str, data: dict) -> SkillArchetype:
+    """Compile archetype of skill out of its configuration file"""
+    main = data["Main"]
+    effects = data.get("Effects", None) or {}
+
+    projectile = None
+    dmg = None
+    target_effects = None
+    # it makes no sense to load these if skill has no projectile attached to it,
+    # as these only affect projectile
+    projectile_data = data.get("Projectile", None)
+    if projectile_data and projectile_data.get("name", None):
+        projectile = SkillProjectile(
+            name=projectile_data["name"],
+            scale=projectile_data.get("scale", 0),
+            hitbox=projectile_data.get("hitbox", 0),
+            lifetime=projectile_data.get("lifetime", 0),
+            knockback=projectile_data.get("knockback", 0),
+            spawn_offset=projectile_data.get("spawn_offset", 0),
+            die_on_object_collision=projectile_data.get(
+                "die_on_object_collision", False
+            ),
+            die_on_creature_collision=projectile_data.get(
+                "die_on_creature_collision", False
+            ),
+            # max is there to ensure that no negative ricochet values can be set
+            ricochets_amount=max(0, projectile_data.get("ricochets_amount", 0)),
+            behavior=projectile_data.get("behavior", None),
+            speed=projectile_data.get("speed", 0),
+            scale_with_caster=projectile_data.get("scale_with_caster", False),
+            rehit_interval=max(0, projectile_data.get("rehit_interval", 0)),
+        )
+
+        dstats = data.get("Stats", None) or {}
+        if dstats.get("dmg", 0) or dstats.get("dmg_multiplier", 0):
+            dmg = (dstats.get("dmg", 0), dstats.get("dmg_multiplier", 0))
+
+        if "target" in effects:
+            target_effects = MappingProxyType(
+                {"stun": effects["target"].get("stun", 0)}
+            )
+
+    caster_effects = None
+    if "caster" in effects:
+        caster_effects = MappingProxyType({"stun": effects["caster"].get("stun", 0)})
+
+    return SkillArchetype(
+        name=name,
+        caster_animation=main.get("caster_animation", None),
+        cast_time=main.get("cast_time", 0),
+        cooldown=main.get("cooldown", 0),
+        projectile=projectile,
+        dmg=dmg,
+        target_effects=target_effects,
+        caster_effects=caster_effects,
+    )
+
+
+def compile_archetypes(assets) -> Archetypes:
+    """Compile archetypes of everything described in loaded assets"""
+    log.debug("Compiling archetypes")
+    return Archetypes(
+        classes=MappingProxyType(
+            {k: compile_creature(k, v, assets) for k, v in assets.classes.items()}
+        ),
+        enemies=MappingProxyType(
+            {k: compile_creature(k, v, assets) for k, v in assets.enemies.items()}
+        ),
+        projectiles=MappingProxyType(
+            {k: compile_projectile(k, v, assets) for k, v in assets.projectiles.items()}
+        ),
+        skills=MappingProxyType(
+            {k: compile_skill(k, v) for k, v in assets.skills.items()}
+        ),
+    )
+
+
+def build_visuals(archetype: SpritesheetArchetype, name: str):
+    """Build SpritesheetNode out of provided archetype and wrap it into
+    VisualsNode, ready to be attached to entity"""
+    node = p3dss.SpritesheetNode(
+        name=name,
+        spritesheet=archetype.spritesheet,
+        sprite_sizes=archetype.sprite_sizes,
+        # #TODO: ability to set custom scale
+        scale=shared.game_data.node_scale,
+    )
+    for item in archetype.items:
+        node.add_item(item)
+    if archetype.default_item:
+        node.set_default(archetype.default_item)
+
+    return entity2d.VisualsNode(
+        node,
+        archetype.position,
+        archetype.layer,
+        0,
+        archetype.remove_on_death,
+    )
+
+
+def build_instanced_visuals(
+    archetype: SpritesheetArchetype,
+    name: str,
+    scale: float = 1,
+    height: float = 0,
+):
+    """Same as build_visuals, but sprite gets drawn by level's SpriteRenderer,
+    together with sprites of the same name of all other entities. Height is
+    the offset of entity's visuals node, since batch knows nothing about it.
+    Sprite gets bound to its entity once Entity2D allocates storage slot"""
+    batch = shared.level.sprites.get(
+        name,
+        archetype.spritesheet,
+        sprite_sizes=archetype.sprite_sizes,
+        items=archetype.items,
+        default_item=archetype.default_item,
+    )
+    x, _, z = archetype.position
+    sprite = batch.add(
+        offset=(x, archetype.layer, z + height),
+        scale=scale,
+        remove_on_death=archetype.remove_on_death,
+    )
+
+    return entity2d.VisualsNode(
+        sprite,
+        archetype.position,
+        archetype.layer,
+        0,
+        archetype.remove_on_death,
+    )
@@ -0,0 +1,92 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module that keeps entities inside of arena. Since arena is always a rectangle,
+# there is no need to have actual walls to collide with - its enough to compare
+# entities' positions with arena's sides
+
+import logging
+import numpy as np
+from Game.entity2d import store
+
+log = logging.getLogger(__name__)
+
+
+class ArenaBounds:
+    """Simulation's routine that stops entities with BOUNDED flag from leaving
+    arena of provided (min x, max x, min y, max y) size. Projectiles with
+    ricochets left bounce off arena's sides, projectiles that should die on
+    collision with objects - die"""
+
+    def __init__(self, entities: store.EntityStore, map_size: tuple):
+        self.entities = entities
+        min_x, max_x, min_y, max_y = map_size
+        self.lower = np.array((min_x, min_y))
+        self.upper = np.array((max_x, max_y))
+
+    def update(self, event):
+        """Clamp positions of all bounded entities in one pass"""
+        entities = self.entities
+        slots = entities.select(include=store.ACTIVE | store.BOUNDED)
+        if not slots.size:
+            return event.cont
+
+        positions = entities.position[slots]
+        radii = entities.radius[slots, None]
+        lower = self.lower + radii
+        upper = self.upper - radii
+        # (x, y) sides of arena that each entity has bumped into
+        below = positions < lower
+        above = positions > upper
+        hit = below | above
+        hit_any = hit.any(axis=1)
+        if not hit_any.any():
+            return event.cont
+
+        slots = slots[hit_any]
+        below = below[hit_any]
+        above = above[hit_any]
+        hit = hit[hit_any]
+        entities.position[slots] = np.clip(
+            positions[hit_any], lower[hit_any], upper[hit_any]
+        )
+
+        # This is projectile-exclusive, but... maybe at some point creatures could
+        # use this too? #TODO
+        ricochets = entities.ricochets[slots]
+        bouncing = ricochets > 0
+        if bouncing.any():
+            bouncing_slots = slots[bouncing]
+            entities.ricochets[bouncing_slots] -= 1
+            # always turning velocity away from the side entity has hit, so it
+            # wont get stuck bouncing if it stays outside for more than one tick
+            velocities = np.abs(entities.velocity[bouncing_slots])
+            velocities = np.where(below[bouncing], velocities, -velocities)
+            entities.velocity[bouncing_slots] = np.where(
+                hit[bouncing], velocities, entities.velocity[bouncing_slots]
+            )
+
+            for slot, horizontal in zip(
+                bouncing_slots.tolist(), hit[bouncing, 0].tolist()
+            ):
+                entities.entities[slot].ricochet(horizontal)
+
+        # killing these last, coz it frees their slots
+        fragile = (entities.flags[slots] & store.FRAGILE) != 0
+        for slot in slots[fragile & ~bouncing].tolist():
+            entities.entities[slot].die()
+
+        return event.cont
@@ -15,12 +15,11 @@
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
 import logging
-from direct.interval.LerpInterval import LerpColorScaleInterval
+from direct.interval.LerpInterval import LerpFunctionInterval
 from direct.interval.IntervalGlobal import Sequence, Func, Wait
 from panda3d.core import Vec3, NodePath, CardMaker, Texture, CollisionCapsule
 import p3dss
-from random import randint
-from Game import entity2d, skill, shared
+from Game import entity2d, skill, shared, simulation
 
 log = logging.getLogger(__name__)
 
@@ -32,143 +31,40 @@ p3dss_logger.setLevel(logging.ERROR)
 MINIMUM_ALLOWED_DAMAGE = 1
 DODGE_CHANCE_RANGE = (0, 100)
 MAX_DODGE_CHANCE = 75
-HEAD_HEIGHT = 0.2  # relatively to player height, not scene
+# offset of visuals node, to make shadow appear somewhat on center
+VISUALS_HEIGHT = 3
 
 
 class Creature(entity2d.Entity2D):
     """Subclass of Entity2D, dedicated to generation of player and enemies"""
 
     def __init__(
-        self, name: str, category: str, data: dict, collision_mask=None, scale=None
+        self,
+        archetype: entity2d.CreatureArchetype,
+        category: str,
+        scale=None,
+        instanced: bool = False,
     ):
-
-        # First, lets extract all data unified for all creatures from our dict.
-        # Safety checks are all over the place - some instances are secured, others
-        # will cause crash on invalid/non-existing data
-        stats = data["Stats"]
-        skills = data["Main"].get("skills", None)
-        hitbox_size = data["Main"].get("hitbox_size", None)
-
-        if data.get("Assets", None):
-            head = data["Assets"].get("head", None)
-            if head:
-                default_head = data["Assets"].get("default_head", None)
-                # there should be parsing of head config
-                head_data = shared.assets.heads.get(head, None)
-            else:
-                head_data = None
-
-            body = data["Assets"].get("body", None)
-            if body and (body in shared.assets.bodies):
-                body_data = shared.assets.bodies[body]
-                # not checking if "main" exists, coz it should be already filtered
-                # out by assets loader
-                bspritesheet_name = body_data["Main"].get("spritesheet", None)
-                if bspritesheet_name and (bspritesheet_name in shared.assets.sprite):
-                    bspritesheet = shared.assets.sprite[bspritesheet_name]
-                    # idk if this will break at some point
-                    sprite_size = body_data["Main"].get("size", None)
-                    animations = body_data.get("Animations", None)
-                else:
-                    bspritesheet = (None,)
-                    animations = (None,)
-                    sprite_size = None
-            else:
-                bspritesheet = (None,)
-                animations = (None,)
-                sprite_size = None
-
-            if data["Assets"].get("Sounds", None):
-                death_sound = data["Assets"]["Sounds"].get("death", None)
-            else:
-                death_sound = None
-        else:
-            bspritesheet = (None,)
-            animations = (None,)
-            sprite_size = (None,)
-            death_sound = None
-
+        # Everything that is the same for all instances of this creature has
+        # already been compiled into archetype. Only nodes are built there
+        name = archetype.name
+        self.archetype = archetype
+        hitbox_size = archetype.hitbox_size
+
+        # instanced creatures dont get nodes with sprites of their own. Instead,
+        # their sprites are drawn by level's SpriteRenderer together with sprites
+        # of all other creatures of the same kind
         parts = []
-
-        if bspritesheet and animations:
-            body = p3dss.SpritesheetNode(
-                name=f"{name}_body",
-                spritesheet=bspritesheet,
-                sprite_sizes=sprite_size or shared.game_data.sprite_size,
-                # #TODO: ability to set custom scale
-                scale=shared.game_data.node_scale,
-            )
-            for sprite_name in list(animations):
-                item = p3dss.SpritesheetItem(
-                    name=sprite_name,
-                    sprites=animations[sprite_name]["sprites"],
-                    loop=animations[sprite_name].get("loop", False),
-                    playback_speed=animations[sprite_name].get(
-                        "speed", shared.game_data.playback_speed
-                    ),
+        for part, part_name in ((archetype.body, "body"), (archetype.head, "head")):
+            if not part:
+                continue
+            if instanced:
+                visuals = entity2d.build_instanced_visuals(
+                    part, f"{name}_{part_name}", scale, VISUALS_HEIGHT
                 )
-                body.add_item(item)
-            parts.append(entity2d.VisualsNode(body, (0, 0, 0), 0.0, 0, False))
-
-        # placeholder code that implements support for attachable heads
-        # not really efficient, I should probably do it somewhere else
-        # its func coz vars overlapped with other init stuff
-        if (
-            head_data
-            and head_data["Main"].get("spritesheet", None)
-            and (head_data["Main"]["spritesheet"] in shared.assets.sprite)
-            and head_data.get("Animations")
-        ):
-            # if no head has been set to start with, or head doesnt exist - setting
-            # up the very first one to be shown instead
-            starting_head = default_head or head_data["Main"].get("default_head", None)
-            if starting_head and head_data["Animations"].get(starting_head, None):
-                sprites = head_data["Animations"][starting_head]
             else:
-                head_name = list(head_data["Animations"].keys())[0]
-                sprites = head_data["Animations"][head_name]
-
-            # default_action = list(sprites.keys())[0]
-            # # if default action's sprite isnt single - it should be tuple or list
-            # if isinstance(sprites[default_action]["sprites"], int):
-            #     default_sprite = sprites[default_action]["sprites"]
-            # else:
-            #     default_sprite = sprites[default_action]["sprites"][0]
-
-            hspritesheet_name = head_data["Main"]["spritesheet"]
-            hspritesheet = shared.assets.sprite[hspritesheet_name]
-
-            head_sizes = (
-                head_data["Main"].get("size", None) or shared.game_data.sprite_size
-            )
-            head = p3dss.SpritesheetNode(
-                name=f"{name}_head",
-                spritesheet=hspritesheet,
-                sprite_sizes=head_sizes,
-                scale=shared.game_data.node_scale,
-            )
-
-            for sprite_name in list(sprites):
-                item = p3dss.SpritesheetItem(
-                    name=sprite_name,
-                    sprites=sprites[sprite_name]["sprites"],
-                    loop=sprites[sprite_name].get("loop", False),
-                    playback_speed=sprites[sprite_name].get(
-                        "speed", shared.game_data.playback_speed
-                    ),
-                    reset_on_complete=True,
-                )
-                head.add_item(item)
-
-            head.set_default(list(sprites)[0])
-
-            # Depending on values, sprite may render slightly different.
-            # Been told that it happens because of lack of antialiasing #TODO
-            # self.head.node.set_pos(0.2, 0, 5)
-            position = tuple(head_data["Main"].get("position", (0, 0, 0)))
-            parts.append(entity2d.VisualsNode(head, position, HEAD_HEIGHT, 0, True))
-
-        hitbox_size = hitbox_size or shared.game_data.hitbox_size
+                visuals = entity2d.build_visuals(part, f"{name}_{part_name}")
+            parts.append(visuals)
 
         # its collision shape is capsule and not sphere, coz this way it will be
         # possible to hit things somewhat consistently regardless of their size
@@ -178,7 +74,6 @@ class Creature(entity2d.Entity2D):
             shape=CollisionCapsule,
             size=(0, 0, 0, 0, 0, 30, hitbox_size),
             position=(0, 0, -shared.game_data.entity_layer / 2),
-            mask=collision_mask or None,
         )
 
         # Initializing all the stuff from parent class'es init to be done
@@ -192,89 +87,83 @@ class Creature(entity2d.Entity2D):
 
         # #TODO: since all entities would have one shadow, maybe we should keep
         # it pre-generated somewhere else?
-        self.shadow = p3dss.make_sprite_node(
-            sprite=shared.assets.sprite["shadow"],
-            size=(hitbox_size, hitbox_size),
-            name=f"{name}_shadow",
-            is_transparent=True,
-            # Toggle this in case shadow appears invisible
-            is_two_sided=False,
-            parent=self.node,
-            # Attaching it to collision node and setting height together didnt work
-            position=(0, 0, -shared.game_data.entity_layer + 0.1),
-        )
+        # Attaching it to collision node and setting height together didnt work
+        shadow_position = (0, 0, -shared.game_data.entity_layer + 0.1)
+        if instanced:
+            batch = shared.level.sprites.get(
+                f"{name}_shadow",
+                shared.assets.sprite["shadow"],
+                frame_size=(hitbox_size, hitbox_size),
+                billboard=False,
+            )
+            shadow = batch.add(
+                self.slot, offset=shadow_position, scale=scale, remove_on_death=True
+            )
+            # its empty node, kept to have the same interface as regular shadow
+            self.shadow = shadow.node
+            self.shadow.reparent_to(self.node)
+        else:
+            self.shadow = p3dss.make_sprite_node(
+                sprite=shared.assets.sprite["shadow"],
+                size=(hitbox_size, hitbox_size),
+                name=f"{name}_shadow",
+                is_transparent=True,
+                # Toggle this in case shadow appears invisible
+                is_two_sided=False,
+                parent=self.node,
+                position=shadow_position,
+            )
 
         # Moving visuals a bit higher to make shadow appear somewhat on center
-        self.visuals.set_pos(0, 0, 3)
+        self.visuals.set_pos(0, 0, VISUALS_HEIGHT)
 
-        if death_sound and (death_sound in shared.assets.sfx):
-            self.death_sound = shared.assets.sfx[death_sound]
-        else:
-            log.warning(f"{name} has no custom death sound, using fallback")
-            self.death_sound = shared.assets.sfx["default_death"]
+        self.death_sound = archetype.death_sound
 
         self.change_animation("idle")
-        # its .copy() coz otherwise we will link to dictionary itself, which will
-        # cause any change to stats of one enemy to affect every other enemy
-        self.stats = stats.copy()
+        # stats are stored in level's entity storage, this is but a view on them.
+        # Copying values there, coz otherwise any change to stats of one enemy
+        # would affect every other enemy
+        self.stats = entity2d.StatsView(self.store, self.slot)
+        self.stats.update(archetype.stats)
+        # stats to restore on reset. Subclasses that change stats on init should
+        # update this too
+        self.default_stats = dict(self.stats)
 
         # list with timed status effects. When any of these reach 0 - they get ignored
         self.status_effects = {}
 
-        self.node.set_python_tag("stats", self.stats)
-        self.node.set_python_tag("get_damage", self.get_damage)
-
-        # shenanigans for skills
-        self.node.set_python_tag("dead", self.dead)
-        self.node.set_python_tag("direction", self.direction)
-        self.node.set_python_tag("change_animation", self.change_animation)
-        # self.using_skill = False
-        # setting it like that, because there doesnt seem to be the way to update
-        # variable linked to tag - only to override it. Or maybe I didnt find it
-        self.node.set_python_tag("using_skill", False)
-        self.node.set_python_tag("status_effects", self.status_effects)
-
-        self.node.set_python_tag("mov_speed", self.stats["mov_spd"])
-
-        if skills:
-            # I should probably rework this into list or idk
-            entity_skills = {}
-            for item in skills:
-                if item in shared.assets.skills:
-                    skill_instance = skill.Skill(item, self.node)
-                    entity_skills[item] = skill_instance
-            self.skills = entity_skills
+        if archetype.skills:
+            # unknown skills have been already filtered out by archetype
+            self.skills = {item: skill.Skill(item, self) for item in archetype.skills}
         else:
             self.skills = None
 
-        # attaching our node's collisions to traverser
-        # otherwise they wont be detected
-        base.cTrav.add_collider(self.collision, base.chandler)
-
         # billboard is effect to ensure that node always face camera the same
         # e.g this is the key to achieve that "2.5D style" I aim for
         # self.node.set_billboard_point_eye()
         self.visuals.set_billboard_point_eye()
 
-        # used to avoid issue with getting multiple damage func calls per frame
-        # see game_window's damage functions
-        self.node.set_python_tag("last_collision_time", 0)
-
-        # proxifying self.apply_effect, so it will be possible for skills and
-        # projectiles to trigger this function
-        self.node.set_python_tag("apply_effect", self.apply_effect)
-
-        # this tag specifies if its possible to push node on collision
+        # this flag specifies if its possible to push node on collision
         # #TODO: make it configurable on per-entity basis
-        self.node.set_python_tag("is_pushable", True)
+        self.store.set_flag(self.slot, entity2d.PUSHABLE)
+        self.store.set_flag(self.slot, entity2d.BOUNDED)
 
         # default rgba values. Saved on init, used in blinking
-        self.default_colorscheme = self.node.get_color_scale()
+        self.default_colorscheme = tuple(self.node.get_color_scale())
 
         # id variable that will be set from game_window. Placed it there to avoid
         # possible crashes and to remind that its a thing that exists
         self.id = None
 
+    @property
+    def using_skill(self) -> bool:
+        """Whether creature is in the middle of casting some skill right now"""
+        return self.store.has_flag(self.slot, entity2d.CASTING)
+
+    @using_skill.setter
+    def using_skill(self, value: bool):
+        self.store.set_flag(self.slot, entity2d.CASTING, value)
+
     def spawn(self, position):
         """Spawn entity on provided position"""
         super().spawn(position)
@@ -283,25 +172,29 @@ class Creature(entity2d.Entity2D):
         # better solution rn, so it will do
         # self.shadow.look_at(0, 0, -1)
         self.shadow.set_p(shared.game_data.floor_angle)
-        base.task_mgr.add(self.status_effects_handler, "status effects handler")
+        shared.level.simulation.add(
+            simulation.EFFECTS_STAGE, self.status_effects_handler
+        )
 
     def status_effects_handler(self, event):
-        """Meant to run as taskmanager routine. Each frame, reduce lengh of active
+        """Meant to run as simulation's routine. Each tick, reduce lengh of active
         status effects. When it reaches 0 - remove status effect"""
-        if not self.status_effects:
-            return event.cont
-
-        # removing the task from being called again if target is already dead
+        # removing the handler from being called again if target is already dead
         if self.dead:
             return
 
-        dt = globalClock.get_dt()
+        if not self.status_effects:
+            return event.cont
+
+        dt = event.dt
         # copying to avoid causing issues by changing dic size during for loop
         se = self.status_effects.copy()
         for effect in se:
             self.status_effects[effect] -= dt
             if self.status_effects[effect] <= 0:
                 del self.status_effects[effect]
+                if effect == "stun":
+                    self.store.set_flag(self.slot, entity2d.STUNNED, False)
                 log.debug(f"{effect} effect has expired on {self.name}")
 
         return event.cont
@@ -314,6 +207,10 @@ class Creature(entity2d.Entity2D):
         else:
             self.status_effects[effect] = length
 
+        # mirroring stun to flags, so vectorized routines could skip stunned ones
+        if effect == "stun":
+            self.store.set_flag(self.slot, entity2d.STUNNED)
+
         log.info(f"{self.name} has got {effect} for {length} seconds")
 
     def get_damage(self, amount: int = 0, effects=None):
@@ -333,7 +230,7 @@ class Creature(entity2d.Entity2D):
         if dodge > 0:
             # ensuring that chance to dodge will never be more than MAX_DODGE_CHANCE
             dodge = min(MAX_DODGE_CHANCE, dodge)
-            hit_chance = randint(*DODGE_CHANCE_RANGE)
+            hit_chance = shared.rng.randint(*DODGE_CHANCE_RANGE)
             # idk if it should be just "<" instead
             if hit_chance <= dodge:
                 log.info(
@@ -345,7 +242,7 @@ class Creature(entity2d.Entity2D):
         # for now I've found it to be the most flexible way to apply any effects
         # to entity. But I may be wrong
         if effects:
-            for effect, length in vars(effects).items():
+            for effect, length in effects.items():
                 self.apply_effect(effect, length)
 
         # Ensuring that in case skill casted on us is just effects spell, we wont
@@ -399,34 +296,57 @@ class Creature(entity2d.Entity2D):
             length = length / 2
 
         if fade_in:
-            fade_in_effect = LerpColorScaleInterval(
-                nodePath=self.node,
-                duration=(length),
-                colorScale=rgba,
-                startColorScale=self.default_colorscheme,
+            fade_in_effect = LerpFunctionInterval(
+                self.blend_color,
+                duration=length,
+                extraArgs=[self.default_colorscheme, rgba],
             )
             sequence.append(fade_in_effect)
         else:
-            sequence.append(Func(self.node.set_color_scale, rgba))
+            sequence.append(Func(self.set_color, rgba))
 
         if fade_out:
-            fade_out_effect = LerpColorScaleInterval(
-                nodePath=self.node,
-                duration=(length),
-                colorScale=self.default_colorscheme,
-                startColorScale=rgba,
+            fade_out_effect = LerpFunctionInterval(
+                self.blend_color,
+                duration=length,
+                extraArgs=[rgba, self.default_colorscheme],
             )
             sequence.append(fade_out_effect)
         else:
             if not fade_in:
                 sequence.append(Wait(length))
-            sequence.append(Func(self.node.set_color_scale, self.default_colorscheme))
+            sequence.append(Func(self.set_color, self.default_colorscheme))
 
         sequence.start()
 
+    def set_color(self, rgba: tuple):
+        """Set color scale of creature. Instanced sprites take it from entity
+        storage's color column, regular ones - from node itself"""
+        # blinking may outlive entity that has been removed mid-way
+        if self.slot is None:
+            return
+        self.store.color[self.slot] = rgba
+        self.node.set_color_scale(*self.store.color[self.slot].tolist())
+
+    def blend_color(self, t: float, start: tuple, end: tuple):
+        """Set color scale in between of start and end ones. Used by fading
+        intervals of blink()"""
+        self.set_color(tuple(a + (b - a) * t for a, b in zip(start, end)))
+
+    def reset(self):
+        super().reset()
+        self.shadow.reparent_to(self.node)
+        self.set_color(self.default_colorscheme)
+        self.stats.update(self.default_stats)
+        self.status_effects = {}
+        if self.skills:
+            for item in self.skills.values():
+                item.reset()
+        self.change_animation("idle")
+
     def die(self):
         super().die()
-        self.shadow.remove_node()
+        self.shadow.detach_node()
 
         if self.death_sound:
             self.death_sound.play()
@@ -15,15 +15,12 @@
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
 import logging
-from panda3d.core import Vec2
-from Game import entity2d, shared
+from Game import entity2d, shared, simulation
 
 log = logging.getLogger(__name__)
 
 # module where I specify whatever stuff related to enemies
 
-ENEMY_COLLISION_MASK = 0x03
-
 HIT_SCORE = 10
 KILL_SCORE = 15
 ROT_TIMER = 15
@@ -50,15 +47,17 @@ class Enemy(entity2d.Creature):
             scale = 0
 
         super().__init__(
-            name=name,
+            archetype=shared.archetypes.enemies[name],
             category=shared.game_data.enemy_category,
-            data=shared.assets.enemies[name],
-            collision_mask=ENEMY_COLLISION_MASK,
             scale=scale,
+            # there may be lots of enemies on screen at once, thus drawing them
+            # in batches instead of separate nodes
+            instanced=True,
         )
 
         self.rot_timer = ROT_TIMER
-        self.can_be_removed = False
+        # handle in level's registry of enemies, assigned on spawn
+        self.handle = None
 
         if self.affix == "Big":
             # if enemy is big - reducing movement speed by 25%, but increasing
@@ -74,91 +73,7 @@ class Enemy(entity2d.Creature):
             # self.object.set_scale(0.5)
         else:
             pass
-
-        # base.task_mgr.add(self.ai_movement_handler, "enemy movement handler")
-
-    def spawn(self, position):
-        super().spawn(position)
-        base.task_mgr.add(self.ai_movement_handler, "enemy movement handler")
-
-    def ai_movement_handler(self, event):
-        """This is but nasty hack to make enemies follow character. TODO: remake
-        and move to its own module"""
-        # TODO: maybe make it possible to chase not for just player?
-        # TODO: not all enemies need to behave this way. e.g, for example, we can
-        # only affect enemies that have their ['ai'] set to ['chaser']...
-        # or something among these lines, will see in future
-
-        # disable this handler if the enemy or player are dead. Without it, game
-        # will crash the very next second after one of these events occur
-        if self.dead or shared.level.player.dead:
-            return
-
-        if "stun" in self.status_effects:
-            return event.cont
-
-        player_position = shared.level.player.node.get_pos()
-        mov_speed = self.stats["mov_spd"]
-
-        enemy_position = self.node.get_pos()
-        vector_to_player = player_position - enemy_position
-        distance_to_player = vector_to_player.length()
-        # normalizing vector is the key to avoid "flickering" effect, as its
-        # basically ignores whatever minor difference in placement there are
-        # I dont know how it works, lol
-        vector_to_player = vector_to_player.normalized()
-
-        # workaround to ensure enemy will stay on its layer, even if its different
-        # from player due to size difference or whatever else reasons
-        vxy = vector_to_player.get_xy()
-        # new_pos = enemy_position + (vector_to_player*mov_speed)
-        new_pos = enemy_position + (vxy * mov_speed, 0)
-        pos_diff = enemy_position - new_pos
-
-        self.node.set_python_tag("mov_spd", mov_speed)
-
-        action = "idle"
-
-        # trying to find angle that wont suck. Basically its the same thing, as
-        # with player. Really thinking about moving it to skill itself #TODO
-        hit_vector_x, hit_vector_y = vxy
-        hit_vector_2D = -hit_vector_x, hit_vector_y
-
-        y_vec = Vec2(0, 1)
-        angle = y_vec.signed_angle_deg(hit_vector_2D)
-
-        # it may be good idea to also track camera angle, if I will decide
-        # to implement camera controls, at some point or another. #TODO
-        if pos_diff[0] > 0:
-            self.change_direction("right")
-        else:
-            self.change_direction("left")
-
-        # this thing basically makes enemy move till it hit player, than play
-        # attack animation. May backfire if player's sprite size is not equal
-        # to player's hitbox
-        if distance_to_player > shared.game_data.sprite_size[0] * 2:
-            action = "move"
-        else:
-            # cast the very first skill available. #TODO: add something to affect
-            # order of skills in self.skills
-            skill = self.get_available_skill()
-            if skill:
-                # skill.cast(direction = (vector_to_player*(shared.DEFAULT_SPRITE_SIZE[0]/2)),
-                skill.cast(direction=vector_to_player, angle=angle)
-
-        # workaround for issue when enemy keeps running into player despite already
-        # colliding with it, which cause enemy's animation to go wild.
-        # idk about the numbers yet. I think, ideally it should be calculated from
-        # player's hitbox and enemy's hitbox... but for now this will do
-        if distance_to_player > 6:
-            self.node.set_pos(new_pos)
-        # self.object.set_pos(new_pos)
-
-        if not self.node.get_python_tag("using_skill"):
-            self.change_animation(action)
-
-        return event.cont
+        self.default_stats = dict(self.stats)
 
     def get_available_skill(self):
         """Iterate thought all known skills and return first that has 0 cooldown"""
@@ -176,23 +91,31 @@ class Enemy(entity2d.Creature):
         shared.level.increase_score(HIT_SCORE)
 
     def mark_for_removal(self, event):
-        """Taskmanager routine that remove enemy node and marks instance for
-        removal from enemies list"""
-        dt = globalClock.get_dt()
-        self.rot_timer -= dt
+        """Simulation's routine that remove enemy node and marks instance for
+        removal from level's registry of enemies"""
+        self.rot_timer -= event.dt
         if self.rot_timer > 0:
             return event.cont
 
-        self.can_be_removed = True
+        shared.level.enemies.discard(self.handle)
+        self.handle = None
         self.animation = None
-        self.node.remove_node()
+        # pooled corpses are kept to be reused by next spawns
+        if self.pool is not None:
+            self.release()
+        else:
+            self.remove()
         return
 
+    def reset(self):
+        super().reset()
+        self.rot_timer = ROT_TIMER
+
     def die(self):
         super().die()
 
         # remove enemy's gibs after self.rot_timer seconds
-        base.task_mgr.add(self.mark_for_removal, "mark for removal")
+        shared.level.simulation.add(simulation.LIFETIMES_STAGE, self.mark_for_removal)
 
         # for now this increase score based on HIT_SCORE+KILL_SCORE.
         # I dont think its a trouble, but may tweak at some point
@@ -14,10 +14,12 @@
 ## You should have received a copy of the GNU General Public License
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
-from panda3d.core import CollisionNode, BitMask32, PandaNode, NodePath
+from panda3d.core import CollisionNode, BitMask32, PandaNode, NodePath, Point3
 from p3dss import SpritesheetNode
 from collections import namedtuple
 from Game import shared
+from Game.entity2d import store
+from Game.entity2d.instancing import InstancedSprite
 import logging
 
 log = logging.getLogger(__name__)
@@ -29,9 +31,10 @@ VisualsNode = namedtuple(
     "VisualsNode", ["instance", "position", "layer", "scale", "remove_on_death"]
 )
 
-CollisionSettings = namedtuple(
-    "CollisionSettings", ["shape", "size", "position", "mask"]
-)
+# Shape is only used to show collisions for debug purposes, since for collision
+# engine every entity is a circle of size[-1] radius. What entity collides with
+# is decided by its category, see collision_events.get_collision_matrix()
+CollisionSettings = namedtuple("CollisionSettings", ["shape", "size", "position"])
 
 
 class Entity2D:
@@ -51,6 +54,12 @@ class Entity2D:
 
         self.category = category
 
+        # hot data of entity (position, stats, etc) lives in level's storage,
+        # in order to be processed together with the same data of other entities
+        self.store = shared.level.entities
+        self.slot = self.store.add(self, self.category)
+        self.store.radius[self.slot] = collision_settings.size[-1] * (scale or 1)
+
         # creating empty node to attach everything to. This way it will be easier
         # to attach other objects (like floating text and such), coz offset trickery
         # from animation wont affect other items attached to node (since its not
@@ -74,19 +83,20 @@ class Entity2D:
         self.static_parts = static_parts or []
         self.animated_parts = animated_parts or []
 
-        # setting character's collisions
-        entity_collider = CollisionNode(self.category)
-
-        # if no collision mask has been received - using defaults
-        if collision_settings.mask is not None:
-            mask = BitMask32(collision_settings.mask)
-            entity_collider.set_from_collide_mask(mask)
-            entity_collider.set_into_collide_mask(mask)
-
-        entity_collider.add_solid(collision_settings.shape(*collision_settings.size))
-        self.collision = self.node.attach_new_node(entity_collider)
-        if collision_settings.position:
-            self.collision.set_pos(*collision_settings.position)
+        # collision node is only made to show hitbox for debug purposes. Its
+        # never traversed, thus its masks are empty
+        self.collision = None
+        if shared.settings.show_collisions:
+            entity_collider = CollisionNode(self.category)
+            entity_collider.set_from_collide_mask(BitMask32(0))
+            entity_collider.set_into_collide_mask(BitMask32(0))
+            entity_collider.add_solid(
+                collision_settings.shape(*collision_settings.size)
+            )
+            self.collision = self.node.attach_new_node(entity_collider)
+            if collision_settings.position:
+                self.collision.set_pos(*collision_settings.position)
+            self.collision.show()
 
         self.direction = None
 
@@ -100,6 +110,9 @@ class Entity2D:
                     sp.instance.set_scale(sp.scale)
 
             for ap in self.animated_parts:
+                # instanced sprites are made before entity gets its slot
+                if isinstance(ap.instance, InstancedSprite):
+                    ap.instance.bind(self.slot)
                 ap.instance.node.wrt_reparent_to(self.visuals)
                 if ap.position:
                     ap.instance.node.set_pos(ap.position)
@@ -116,18 +129,44 @@ class Entity2D:
 
         # death status, that may be usefull during cleanup
         self.dead = False
-
-        # attaching python tags to node, so these will be accessible during
-        # collision events and similar stuff
-        self.node.set_python_tag("name", self.name)
-        self.node.set_python_tag("category", self.category)
-
-        # I thought to put ctrav there, but for whatever reason it glitched proj
-        # to fly into left wall. So I moved it to Creature subclass
-
-        # debug function to show collisions all time
-        if shared.settings.show_collisions:
-            self.collision.show()
+        # EntityPool this entity has been created by (if any), and its key there
+        self.pool = None
+        self.pool_key = None
+
+        # collision handlers find everything they need in storage's tables, by slot
+        self.collision_data = store.CollisionData(self)
+        self.store.collision_data[self.slot] = self.collision_data
+
+    @property
+    def position(self) -> Point3:
+        """Entity's position on current simulation tick"""
+        x, y = self.store.position[self.slot]
+        return Point3(x, y, self.store.height[self.slot])
+
+    @position.setter
+    def position(self, position):
+        # height is ignored, coz its static for the whole entity's lifetime
+        self.store.position[self.slot] = position[0], position[1]
+
+    @property
+    def id(self):
+        """Id assigned to entity by level, or None if there is none"""
+        if self.slot is None or self.store.ids[self.slot] < 0:
+            return None
+        return self.store.ids[self.slot].item()
+
+    @id.setter
+    def id(self, value):
+        self.store.ids[self.slot] = -1 if value is None else value
+
+    @property
+    def velocity(self):
+        """Distance passed by entity during one tick, as (x, y) array"""
+        return self.store.velocity[self.slot]
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.store.velocity[self.slot] = velocity[0], velocity[1]
 
     def add_part(
         self,
@@ -149,6 +188,8 @@ class Entity2D:
         """Change animation of self.animated_parts items"""
         for item in self.animated_parts:
             item.instance.play(action)
+        if self.slot is not None:
+            self.store.action[self.slot] = store.ACTION_CODES.get(action, 0)
         # log.debug(f"Changed animation of {self.name} to {action}")
 
     def change_direction(self, direction: str):
@@ -175,6 +216,7 @@ class Entity2D:
                 item.instance.set_y(item.layer)
 
         self.direction = direction
+        self.store.set_flag(self.slot, store.FACING_LEFT, direction != "right")
         log.debug(f"{self.name} is now facing {self.direction}")
 
     def spawn(self, position):
@@ -186,19 +228,65 @@ class Entity2D:
         # once per entity #TODO
         self.node.wrt_reparent_to(render)
         self.node.set_pos(*position)
+
+        x, y, z = position
+        self.store.position[self.slot] = x, y
+        self.store.previous[self.slot] = x, y
+        self.store.rendered[self.slot] = x, y
+        self.store.height[self.slot] = z
+        self.store.set_flag(self.slot, store.ACTIVE)
         log.debug(f"{self.name} has been spawned at {position}")
 
     def die(self):
         """Function that should be triggered when entity is about to die"""
-        self.collision.remove_node()
+        # detaching instead of removing, so pooled entities could get these back
+        if self.collision is not None:
+            self.collision.detach_node()
         self.dead = True
+        self.store.set_flag(self.slot, store.DEAD)
+        self.store.velocity[self.slot] = 0
         self.change_animation("dying")
 
         for ap in self.animated_parts:
             if ap.remove_on_death:
-                ap.instance.node.remove_node()
+                ap.instance.node.detach_node()
 
         for sp in self.static_parts:
             if sp.remove_on_death:
-                sp.instance.remove_node()
+                sp.instance.detach_node()
         log.debug(f"{self.name} is now dead")
+
+    def reset(self):
+        """Restore entity that has died, so it could be spawned again"""
+        self.dead = False
+        self.store.set_flag(
+            self.slot, store.DEAD | store.CASTING | store.STUNNED, False
+        )
+        if self.collision is not None:
+            self.collision.reparent_to(self.node)
+
+        for ap in self.animated_parts:
+            if ap.remove_on_death:
+                ap.instance.node.reparent_to(self.visuals)
+
+        for sp in self.static_parts:
+            if sp.remove_on_death:
+                sp.instance.reparent_to(self.visuals)
+
+    def release(self):
+        """Detach entity from scene and return it back to pool it came from"""
+        self.store.set_flag(self.slot, store.ACTIVE, False)
+        self.store.set_flag(self.slot, store.DEAD)
+        self.store.velocity[self.slot] = 0
+        for item in self.animated_parts:
+            item.instance.stop()
+        self.node.detach_node()
+        self.pool.release(self)
+
+    def remove(self):
+        """Remove entity's node from scene graph and free its storage slot"""
+        self.node.remove_node()
+        if self.slot is not None:
+            shared.level.sprites.remove(self.slot)
+            self.store.remove(self.slot)
+            self.slot = None
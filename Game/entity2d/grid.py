@@ -0,0 +1,143 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with uniform spatial grid, used to find entities that are close enough
+# to interact, without checking each possible pair of them
+
+import logging
+import numpy as np
+from Game import shared
+from Game.entity2d import store
+
+log = logging.getLogger(__name__)
+
+# Offsets of cells, which content should be checked against content of each cell.
+# Its only half of neighbours, coz the other half will check us on their own
+NEIGHBOUR_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+# Cells' y coordinate gets packed together with x into single int64 key. This is
+# but the range of y, big enough to never be reached on any sane map size
+CELL_KEY_RANGE = 1 << 20
+
+
+class SpatialGrid:
+    """Uniform grid, rebuilt from scratch for each query. Cell size should be no
+    less than the largest distance at which two items can interact"""
+
+    def __init__(self, cell_size: float = None):
+        # by default, cells fit two default-sized hitboxes touching eachother
+        self.cell_size = cell_size or shared.game_data.hitbox_size * 2
+
+    def get_pairs(self, positions: np.ndarray, reach: float = 0) -> tuple:
+        """Get (first, second) arrays of indexes of provided positions, that
+        share the same or neighbouring cells. Each pair is returned only once.
+        If reach is bigger than cell size - its used as cell size instead"""
+        empty = np.empty(0, dtype=np.int64)
+        if len(positions) < 2:
+            return empty, empty
+
+        cell_size = max(self.cell_size, reach)
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        keys = cells[:, 0] * CELL_KEY_RANGE + cells[:, 1]
+
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        # position of each item in sorted order, used to avoid same-cell repeats
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        first = [empty]
+        second = [empty]
+        for x, y in NEIGHBOUR_CELLS:
+            neighbour_keys = keys + (x * CELL_KEY_RANGE + y)
+            start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+            end = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+            if (x, y) == (0, 0):
+                # only pairing items with these that come after them in the same
+                # cell, to avoid pairing item with itself and duplicates
+                start = rank + 1
+
+            counts = np.maximum(end - start, 0)
+            total = counts.sum()
+            if not total:
+                continue
+
+            items = np.repeat(np.arange(len(keys)), counts)
+            # index of each pair's second item inside of sorted_keys
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            first.append(items)
+            second.append(order[np.repeat(start, counts) + offsets])
+
+        return np.concatenate(first), np.concatenate(second)
+
+
+class CrowdSeparation:
+    """Simulation's routine that pushes overlapping creatures of provided
+    category away from eachother"""
+
+    def __init__(self, entities: store.EntityStore, category: str):
+        self.entities = entities
+        self.category = category
+        self.grid = SpatialGrid()
+
+    def update(self, event):
+        """Push apart all overlapping creatures in one pass"""
+        entities = self.entities
+        slots = entities.select(category=self.category)
+        if slots.size < 2:
+            return event.cont
+
+        positions = entities.position[slots]
+        radii = entities.radius[slots]
+        first, second = self.grid.get_pairs(positions, reach=radii.max() * 2)
+        if not first.size:
+            return event.cont
+
+        vectors = positions[second] - positions[first]
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        overlaps = radii[first] + radii[second] - distances
+        touching = overlaps > 0
+        if not touching.any():
+            return event.cont
+
+        first = first[touching]
+        second = second[touching]
+        vectors = vectors[touching]
+        distances = distances[touching]
+        overlaps = overlaps[touching]
+
+        # creatures standing right on top of eachother (say, spawned on the same
+        # spot) have no direction to be pushed to, thus picking an arbitrary one
+        directions = np.divide(
+            vectors,
+            distances[:, None],
+            out=np.tile([1.0, 0.0], (len(vectors), 1)),
+            where=distances[:, None] > 0,
+        )
+
+        # each creature moves away by half of overlap, but not faster than the
+        # one pushing it. Going for whole mov_spd each tick caused some shaking
+        speeds = entities.speed[slots]
+        pushable = (entities.flags[slots] & store.PUSHABLE) != 0
+        first_push = np.minimum(overlaps / 2, speeds[second]) * pushable[first]
+        second_push = np.minimum(overlaps / 2, speeds[first]) * pushable[second]
+
+        shifts = np.zeros_like(positions)
+        np.add.at(shifts, first, -directions * first_push[:, None])
+        np.add.at(shifts, second, directions * second_push[:, None])
+        entities.position[slots] = positions + shifts
+
+        return event.cont
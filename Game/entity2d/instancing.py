@@ -0,0 +1,444 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with hardware-instanced sprites. Each SpritesheetNode is a separate card
+# and thus a separate draw call - which is fine for player, but not for crowds of
+# enemies. Instead, sprites of the same kind are drawn as instances of one card,
+# with per-instance data (position, frame, flip, color) passed via buffer texture
+
+import logging
+import numpy as np
+from panda3d.core import (
+    CardMaker,
+    GeomEnums,
+    NodePath,
+    OmniBoundingVolume,
+    PandaNode,
+    Shader,
+    Texture,
+)
+from p3dss import processor
+from Game import shared
+from Game.entity2d import store
+
+log = logging.getLogger(__name__)
+
+# Amount of instances allocated on init. Just like with EntityStore, batch
+# doubles in size each time it runs out of free ones
+DEFAULT_BATCH_CAPACITY = 64
+
+# Amount of rgba texels, used to describe each instance in buffer texture:
+# (x, y, z, scale) of entity, (x, y, z, flip) offset of sprite, (u, v) offset
+# of current frame and rgba color scale
+TEXELS_PER_INSTANCE = 4
+
+# Playback states of sprites, same as p3dss.types.PlaybackState
+STOPPED = 0
+PLAYING = 1
+PAUSED = 2
+
+VERTEX_SHADER = """
+#version 150
+
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+uniform samplerBuffer instances;
+uniform vec2 frame_size;
+uniform float billboard;
+
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+
+out vec2 texcoord;
+out vec4 color;
+
+void main() {
+    int first = gl_InstanceID * 4;
+    vec4 placement = texelFetch(instances, first);
+    vec4 offset = texelFetch(instances, first + 1);
+    vec4 frame = texelFetch(instances, first + 2);
+    color = texelFetch(instances, first + 3);
+
+    float scale = placement.w;
+    float flip = offset.w;
+    // cards are made in xz plane, just like the ones of SpritesheetNode
+    vec2 corner = vec2(p3d_Vertex.x * flip, p3d_Vertex.z);
+
+    vec4 position;
+    if (billboard > 0.5) {
+        // sprite always faces camera, thus its offset is applied in view space.
+        // Layer (offset.y) pushes sprite towards camera
+        position = p3d_ModelViewMatrix * vec4(placement.xyz, 1.0);
+        position.xy += (corner + vec2(offset.x * flip, offset.z)) * scale;
+        position.z += offset.y * scale;
+    } else {
+        // flat sprite, lying on the floor (say, shadow)
+        vec3 world = placement.xyz + (offset.xyz + vec3(corner, 0.0)) * scale;
+        position = p3d_ModelViewMatrix * vec4(world, 1.0);
+    }
+    gl_Position = p3d_ProjectionMatrix * position;
+
+    texcoord = p3d_MultiTexCoord0 * frame_size + frame.xy;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 150
+
+uniform sampler2D p3d_Texture0;
+
+in vec2 texcoord;
+in vec4 color;
+
+out vec4 p3d_FragColor;
+
+void main() {
+    vec4 result = texture(p3d_Texture0, texcoord) * color;
+    // instances cant be sorted against eachother, thus cutting transparent
+    // pixels out instead of blending them
+    if (result.a < 0.5) {
+        discard;
+    }
+    p3d_FragColor = result;
+}
+"""
+
+
+class InstancedSprite:
+    """Handle of sprite, drawn by SpriteBatch. Mimics the parts of
+    p3dss.SpritesheetNode used by entities, thus can be used as VisualsNode"""
+
+    def __init__(self, batch, index: int, name: str):
+        self.batch = batch
+        self.index = index
+        self.name = name
+        # sprite itself is drawn by batch. This empty node only exists so entity
+        # could attach, move and detach it, like any other part
+        self.node = NodePath(PandaNode(name))
+
+    def play(self, item_name: str, ignore_if_current: bool = True):
+        """Make sprite switch to showcase of selected spritesheet's item"""
+        self.batch.play(self.index, item_name, ignore_if_current)
+
+    def stop(self):
+        """Stop current playback"""
+        self.batch.stop(self.index)
+
+    def set_default(self, item_name: str):
+        """Set item with provided name to default"""
+        self.batch.set_default(self.index, item_name)
+
+    def bind(self, slot: int):
+        """Make sprite follow entity in provided storage slot"""
+        self.batch.slot[self.index] = slot
+
+
+class SpriteBatch:
+    """All sprites of the same kind, drawn as instances of one card in a single
+    draw call. Animations of all these sprites are processed together too"""
+
+    def __init__(
+        self,
+        name: str,
+        entities: store.EntityStore,
+        spritesheet: Texture,
+        sprite_sizes: tuple = None,
+        items: tuple = (),
+        default_item: str = None,
+        frame_size: tuple = None,
+        billboard: bool = True,
+        capacity: int = DEFAULT_BATCH_CAPACITY,
+    ):
+        self.name = name
+        # positions of sprites are taken from entities they belong to
+        self.store = entities
+        self.capacity = capacity
+        self.size = 0
+        self.free = []
+
+        # if no sizes has been passed - the whole texture is one sprite
+        sprite_sizes = sprite_sizes or (
+            spritesheet.get_orig_file_x_size(),
+            spritesheet.get_orig_file_y_size(),
+        )
+        sprite_data = processor.get_offsets(spritesheet, sprite_sizes)
+        self.offsets = np.array(
+            [tuple(i) for i in sprite_data.offsets], dtype=np.float32
+        )
+
+        # compiling animations into padded table of sprite numbers, so frames of
+        # all sprites could be switched at once
+        self.items = {item.name: num for num, item in enumerate(items)}
+        length = max((len(item.sprites) for item in items), default=1)
+        self.sequences = np.zeros((max(len(items), 1), length), dtype=np.int32)
+        self.lengths = np.ones(max(len(items), 1), dtype=np.int32)
+        self.speeds = np.zeros(max(len(items), 1), dtype=np.float64)
+        self.loops = np.zeros(max(len(items), 1), dtype=bool)
+        self.resets = np.zeros(max(len(items), 1), dtype=bool)
+        for num, item in enumerate(items):
+            sprites = item.sprites
+            if isinstance(sprites, int):
+                sprites = (sprites,)
+            self.sequences[num, : len(sprites)] = sprites
+            self.lengths[num] = len(sprites)
+            self.speeds[num] = item.playback_speed
+            self.loops[num] = item.loop
+            self.resets[num] = item.reset_on_complete
+        self.default_item = self.items.get(default_item, -1)
+
+        self.allocate(capacity)
+
+        # same card as the one made by p3dss.make_sprite_node(), but with node's
+        # scale already applied to it
+        if frame_size:
+            width, height = frame_size
+        else:
+            width = sprite_sizes[0] * shared.game_data.node_scale
+            height = sprite_sizes[1] * shared.game_data.node_scale
+        card = CardMaker(name)
+        card.set_frame(-width, width, -height, height)
+        self.node = render.attach_new_node(card.generate())
+        spritesheet.set_wrap_u(Texture.WM_clamp)
+        spritesheet.set_wrap_v(Texture.WM_clamp)
+        self.node.set_texture(spritesheet)
+        self.node.set_two_sided(True)
+        # instances are spread around whole arena, while bounds of node are the
+        # bounds of single card at scene's center
+        self.node.node().set_bounds(OmniBoundingVolume())
+        self.node.node().set_final(True)
+
+        self.node.set_shader(
+            Shader.make(Shader.SL_GLSL, VERTEX_SHADER, FRAGMENT_SHADER)
+        )
+        self.node.set_shader_input("frame_size", tuple(sprite_data.step_sizes))
+        self.node.set_shader_input("billboard", 1.0 if billboard else 0.0)
+        self.make_buffer()
+        self.node.hide()
+
+    def allocate(self, capacity: int):
+        """Resize per-sprite arrays to provided capacity"""
+        columns = (
+            # storage slot of entity that owns sprite, -1 for free indexes
+            ("slot", (), np.int64, -1),
+            # (x, y, z) offset of sprite from entity's position
+            ("offset", (3,), np.float32, 0),
+            ("scale", (), np.float32, 1),
+            ("remove_on_death", (), bool, False),
+            # indexes of current and default items, -1 if none
+            ("item", (), np.int32, -1),
+            ("default", (), np.int32, -1),
+            ("state", (), np.uint8, STOPPED),
+            # number of frame in current item's sequence
+            ("frame", (), np.int32, 0),
+            ("time_left", (), np.float64, 0),
+            # sprite that is shown right now
+            ("sprite", (), np.int32, 0),
+        )
+        for name, shape, dtype, default in columns:
+            column = np.full((capacity, *shape), default, dtype=dtype)
+            if hasattr(self, name):
+                column[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def make_buffer(self):
+        """Create buffer texture, big enough to fit data of all instances"""
+        self.buffer = Texture(f"{self.name}_instances")
+        self.buffer.setup_buffer_texture(
+            self.capacity * TEXELS_PER_INSTANCE,
+            Texture.T_float,
+            Texture.F_rgba32,
+            GeomEnums.UH_dynamic,
+        )
+        self.node.set_shader_input("instances", self.buffer)
+
+    def add(
+        self,
+        slot: int = -1,
+        offset: tuple = (0, 0, 0),
+        scale: float = 1,
+        remove_on_death: bool = False,
+    ) -> InstancedSprite:
+        """Add sprite of entity in provided storage slot to batch. Offset is
+        (x, layer, z). Sprites without slot are not drawn until bound to one"""
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.size >= self.capacity:
+                self.allocate(self.capacity * 2)
+                self.make_buffer()
+                log.debug(f"Increased capacity of {self.name} to {self.capacity}")
+            index = self.size
+            self.size += 1
+
+        self.slot[index] = slot
+        self.offset[index] = offset
+        self.scale[index] = scale or 1
+        self.remove_on_death[index] = remove_on_death
+        self.item[index] = -1
+        self.default[index] = self.default_item
+        self.state[index] = STOPPED
+        self.frame[index] = 0
+        self.time_left[index] = 0
+        self.sprite[index] = 0
+        return InstancedSprite(self, index, self.name)
+
+    def remove(self, slot: int):
+        """Free indexes of all sprites that belong to entity in provided slot"""
+        indexes = np.flatnonzero(self.slot[: self.size] == slot)
+        if not len(indexes):
+            return
+        self.slot[indexes] = -1
+        self.state[indexes] = STOPPED
+        self.item[indexes] = -1
+        self.free.extend(indexes.tolist())
+
+    def play(self, index: int, item_name: str, ignore_if_current: bool = True):
+        """Make sprite with provided index switch to selected item"""
+        if not item_name in self.items:
+            # its ok for sprites without animations at all, say shadows
+            if self.items:
+                log.warning(f"{self.name} has no item named {item_name}!")
+            return
+
+        item = self.items[item_name]
+        if ignore_if_current and self.item[index] == item:
+            return
+
+        self.item[index] = item
+        self.frame[index] = 0
+        self.time_left[index] = self.speeds[item]
+        self.state[index] = PLAYING
+
+    def stop(self, index: int):
+        """Stop playback of sprite with provided index"""
+        if self.item[index] >= 0:
+            self.state[index] = STOPPED
+            self.item[index] = -1
+            self.frame[index] = 0
+
+    def set_default(self, index: int, item_name: str):
+        """Set default item of sprite with provided index"""
+        if not item_name in self.items:
+            log.warning(f"{self.name} has no item named {item_name}!")
+            return
+        self.default[index] = self.items[item_name]
+
+    def animate(self, dt: float):
+        """Switch frames of all playing sprites at once. Works the same way as
+        playback routine of p3dss.SpritesheetNode"""
+        size = self.size
+        state = self.state[:size]
+        item = self.item[:size]
+
+        # sprites that get reset below only start playing on the next frame
+        playing = np.flatnonzero(state == PLAYING)
+
+        # non-looped items that has finished, get reset back to default one
+        default = self.default[:size]
+        # stopped sprites have no item (-1), thus only looking up these that do
+        has_item = item >= 0
+        resets = np.zeros(size, dtype=bool)
+        resets[has_item] = self.resets[item[has_item]]
+        reset = np.flatnonzero(
+            (state == PAUSED) & resets & (default >= 0) & (default != item)
+        )
+        if len(reset):
+            item[reset] = default[reset]
+            self.frame[reset] = 0
+            self.time_left[reset] = self.speeds[item[reset]]
+            state[reset] = PLAYING
+
+        self.time_left[playing] -= dt
+        due = playing[self.time_left[playing] <= 0]
+        if not len(due):
+            return
+
+        due_items = item[due]
+        frame = self.frame[due]
+        self.time_left[due] = self.speeds[due_items]
+        self.sprite[due] = self.sequences[due_items, frame]
+
+        frame += 1
+        more = frame < self.lengths[due_items]
+        self.frame[due] = np.where(more, frame, 0)
+        # if looping is disabled - keeping last frame
+        finished = due[~more & ~self.loops[due_items]]
+        state[finished] = PAUSED
+
+    def update(self, dt: float):
+        """Animate sprites and upload data of visible ones to buffer texture"""
+        self.animate(dt)
+
+        indexes = np.flatnonzero(self.slot[: self.size] >= 0)
+        slots = self.slot[indexes]
+        flags = self.store.flags[slots]
+        shown = ((flags & store.ACTIVE) != 0) & ~(
+            ((flags & store.DEAD) != 0) & self.remove_on_death[indexes]
+        )
+        indexes = indexes[shown]
+        slots = slots[shown]
+
+        count = len(indexes)
+        if not count:
+            self.node.hide()
+            return
+
+        data = np.empty((count, TEXELS_PER_INSTANCE, 4), dtype=np.float32)
+        data[:, 0, :2] = self.store.rendered[slots]
+        data[:, 0, 2] = self.store.height[slots]
+        data[:, 0, 3] = self.scale[indexes]
+        data[:, 1, :3] = self.offset[indexes]
+        data[:, 1, 3] = np.where(flags[shown] & store.FACING_LEFT, -1, 1)
+        data[:, 2, :2] = self.offsets[self.sprite[indexes]]
+        data[:, 2, 2:] = 0
+        data[:, 3] = self.store.color[slots]
+
+        memoryview(self.buffer.modify_ram_image()).cast("B")[
+            : data.nbytes
+        ] = data.tobytes()
+        self.node.set_instance_count(count)
+        self.node.show()
+
+
+class SpriteRenderer:
+    """Storage of level's SpriteBatches, by their names"""
+
+    def __init__(self, entities: store.EntityStore):
+        self.store = entities
+        self.batches = {}
+
+    def get(self, name: str, spritesheet: Texture, **kwargs) -> SpriteBatch:
+        """Get batch with provided name, or create new one out of provided data.
+        Kwargs are the same as these of SpriteBatch"""
+        batch = self.batches.get(name)
+        if batch is None:
+            log.debug(f"Creating sprite batch {name}")
+            batch = SpriteBatch(name, self.store, spritesheet, **kwargs)
+            self.batches[name] = batch
+        return batch
+
+    def remove(self, slot: int):
+        """Remove sprites of entity in provided slot from all the batches"""
+        for batch in self.batches.values():
+            batch.remove(slot)
+
+    def update(self, event):
+        """Taskmanager routine that updates all the batches each frame"""
+        dt = globalClock.get_dt()
+        for batch in self.batches.values():
+            batch.update(dt)
+        return event.cont
@@ -0,0 +1,123 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module that moves projectiles around. Skills may spawn lots of these at once,
+# thus instead of each projectile having its own movement and lifetime routines,
+# all of them are processed together. Ricochets are handled by ArenaBounds
+
+import logging
+import numpy as np
+from Game.entity2d import store
+
+log = logging.getLogger(__name__)
+
+
+class ProjectileKinematics:
+    """Simulation's routines that move entities with MOVING flag by their
+    velocities, turn velocities of CHASING ones towards their targets, keep
+    ATTACHED ones next to their targets and kill MORTAL ones once their lifetime
+    runs out"""
+
+    def __init__(self, entities: store.EntityStore):
+        self.entities = entities
+
+    def expire(self, event):
+        """Count down lifetimes of all mortal entities and kill these which
+        time has come. Meant to be attached to lifetimes stage"""
+        entities = self.entities
+        slots = entities.select(include=store.ACTIVE | store.MORTAL)
+        if not slots.size:
+            return event.cont
+
+        lifetimes = entities.lifetime[slots] - event.dt
+        entities.lifetime[slots] = lifetimes
+
+        instances = entities.entities
+        for slot in slots[lifetimes <= 0].tolist():
+            instances[slot].die()
+
+        return event.cont
+
+    def update(self, event):
+        """Move all moving entities in one pass. Meant to be attached to
+        movement stage"""
+        entities = self.entities
+        self.chase()
+
+        slots = entities.select(include=store.ACTIVE | store.MOVING)
+        if slots.size:
+            entities.position[slots] += entities.velocity[slots]
+
+        # attaching last, so these will stay next to wherever their targets
+        # have moved during this tick
+        self.attach()
+
+        return event.cont
+
+    def get_followers(self, flag: int) -> tuple:
+        """Get (slots, targets) of entities with provided flag, which targets
+        still exist. Ones that have lost their targets stop following them"""
+        entities = self.entities
+        slots = entities.select(include=store.ACTIVE | flag)
+        targets = entities.target[slots]
+        # target could have been removed and its slot reused by another entity.
+        # Followers that have lost their targets just stop, like they used to
+        found = (entities.ids[targets] == entities.target_id[slots]) & (
+            (entities.flags[targets] & store.ACTIVE) != 0
+        )
+        if not found.all():
+            lost = slots[~found]
+            entities.velocity[lost] = 0
+            entities.flags[lost] &= ~entities.flags.dtype.type(flag | store.MOVING)
+            slots = slots[found]
+            targets = targets[found]
+
+        return slots, targets
+
+    def attach(self, event=None):
+        """Move attached entities to their targets. Can be used as simulation's
+        routine, to catch up with targets that have been pushed around after
+        movement stage (say, by crowd separation or arena bounds)"""
+        entities = self.entities
+        slots, targets = self.get_followers(store.ATTACHED)
+        if slots.size:
+            entities.position[slots] = (
+                entities.position[targets] + entities.offset[slots]
+            )
+
+        if event is not None:
+            return event.cont
+
+    def chase(self):
+        """Point velocities of chasing entities towards their targets"""
+        entities = self.entities
+        slots, targets = self.get_followers(store.CHASING)
+        if not slots.size:
+            return
+
+        vectors = (
+            entities.position[targets]
+            + entities.offset[slots]
+            - entities.position[slots]
+        )
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        directions = np.divide(
+            vectors,
+            distances[:, None],
+            out=np.zeros_like(vectors),
+            where=distances[:, None] > 0,
+        )
+        entities.velocity[slots] = directions * entities.speed[slots, None]
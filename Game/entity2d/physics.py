@@ -0,0 +1,140 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with collision engine. Everything in game happens on flat floor, thus
+# instead of panda's 3d traverser, every entity is treated as circle on xy plane
+
+import logging
+import numpy as np
+from Game.entity2d import store
+from Game.entity2d.grid import SpatialGrid
+
+log = logging.getLogger(__name__)
+
+
+class CollisionEngine:
+    """Simulation's routine that finds all touching entities of storage in one
+    pass and passes them to provided function as (first, second) arrays of slots,
+    in order of moments these have started touching during the tick.
+    Entity collides into another if from mask of its category shares any bits
+    with into mask of category of another - just like panda's CollisionNodes do"""
+
+    def __init__(
+        self,
+        entities: store.EntityStore,
+        on_contacts,
+        from_masks: np.ndarray,
+        into_masks: np.ndarray,
+    ):
+        self.entities = entities
+        # function that receives (first, second) arrays of slots of entities
+        # that touch eachother, with first being the one that collided into second
+        self.on_contacts = on_contacts
+        # masks of categories, by their codes
+        self.from_masks = from_masks
+        self.into_masks = into_masks
+        self.grid = SpatialGrid()
+
+    def find_contacts(self) -> tuple:
+        """Get (first, second) arrays of slots of touching entities"""
+        entities = self.entities
+        empty = np.empty(0, dtype=np.int64)
+        slots = entities.select()
+        categories = entities.category[slots]
+        from_masks = self.from_masks[categories]
+        into_masks = self.into_masks[categories]
+        # entities that cant collide with anything and cant be collided into
+        # are of no interest. Say, ones of categories without handlers
+        relevant = (from_masks | into_masks) != 0
+        slots = slots[relevant]
+        from_masks = from_masks[relevant]
+        into_masks = into_masks[relevant]
+        if slots.size < 2:
+            return empty, empty
+
+        # entities are swept along the path they have made during this tick, so
+        # fast ones (say, bullets) wont tunnel through whatever they should hit.
+        # Broadphase goes by middles of paths, with reach extended by the longest
+        current = entities.position[slots]
+        previous = entities.previous[slots]
+        paths = current - previous
+        travel = np.sqrt(np.einsum("ij,ij->i", paths, paths))
+        radii = entities.radius[slots]
+        first, second = self.grid.get_pairs(
+            (current + previous) / 2, reach=radii.max() * 2 + travel.max()
+        )
+        if not first.size:
+            return empty, empty
+
+        # broadphase pairs are unordered, thus checking masks in both directions
+        # and flipping pairs where only second entity collides into first
+        forward = (from_masks[first] & into_masks[second]) != 0
+        backward = (from_masks[second] & into_masks[first]) != 0
+        listened = forward | backward
+        first = first[listened]
+        second = second[listened]
+        forward = forward[listened]
+
+        # sweeping second entity's circle relatively to first one. Both move in
+        # straight lines during tick, thus its enough to find the moment they
+        # were the closest and check distance at it
+        start = previous[second] - previous[first]
+        motion = paths[second] - paths[first]
+        reach = radii[first] + radii[second]
+        lengths = np.einsum("ij,ij->i", motion, motion)
+        closest_time = np.divide(
+            -np.einsum("ij,ij->i", start, motion),
+            lengths,
+            out=np.zeros_like(lengths),
+            where=lengths > 0,
+        ).clip(0, 1)
+        closest = start + motion * closest_time[:, None]
+        touching = np.einsum("ij,ij->i", closest, closest) < reach * reach
+        if not touching.any():
+            return empty, empty
+
+        first = first[touching]
+        second = second[touching]
+        forward = forward[touching]
+        start = start[touching]
+        motion = motion[touching]
+        reach = reach[touching]
+        lengths = lengths[touching]
+
+        # ordering contacts by the moment they've started, so projectile that
+        # dies on hit will hit the first creature on its path, not the random one
+        half_b = np.einsum("ij,ij->i", start, motion)
+        c = np.einsum("ij,ij->i", start, start) - reach * reach
+        root = np.sqrt(np.maximum(half_b * half_b - lengths * c, 0))
+        impact_time = np.divide(
+            -half_b - root, lengths, out=np.zeros_like(lengths), where=lengths > 0
+        )
+        impact_time = np.where(c < 0, 0, impact_time)
+        order = np.argsort(impact_time, kind="stable")
+        first = first[order]
+        second = second[order]
+        forward = forward[order]
+
+        return (
+            slots[np.where(forward, first, second)],
+            slots[np.where(forward, second, first)],
+        )
+
+    def update(self, event):
+        first, second = self.find_contacts()
+        if first.size:
+            self.on_contacts(first, second)
+        return event.cont
@@ -17,27 +17,21 @@
 import logging
 from panda3d.core import Point3, Plane, Vec2, Vec3
 from math import sqrt
-from Game import shared, entity2d
+from Game import shared, entity2d, simulation
 
 log = logging.getLogger(__name__)
 
 # module where I specify player's class
 
-PLAYER_COLLISION_MASK = 0x06
-
 
 class Player(entity2d.Creature):
     """Subclass of Creature, dedicated to creation of player"""
 
     def __init__(self, name: str):
         # this will crash on invalid, no safety checks for now
-        data = shared.assets.classes[name]
-
         super().__init__(
-            name=name,
+            archetype=shared.archetypes.classes[name],
             category=shared.game_data.player_category,
-            data=data,
-            collision_mask=PLAYER_COLLISION_MASK,
         )
         # position = position)
 
@@ -52,11 +46,11 @@ class Player(entity2d.Creature):
 
     def spawn(self, position):
         super().spawn(position)
-        base.task_mgr.add(self.controls_handler, f"controls handler of {self.name}")
-        base.task_mgr.add(self.get_mouse_vector, f"mouse vector tracker of {self.name}")
+        shared.level.simulation.add(simulation.INPUT_STAGE, self.get_mouse_vector)
+        shared.level.simulation.add(simulation.INPUT_STAGE, self.controls_handler)
 
     def get_mouse_vector(self, event):
-        """Task manager routine that tracks vector of mouse, relatively to player"""
+        """Simulation's routine that tracks vector of mouse, relatively to player"""
         if self.dead:
             return
 
@@ -64,8 +58,9 @@ class Player(entity2d.Creature):
 
         mouse_watcher = base.mouseWatcherNode
 
-        # safety check to avoid crash if mouse has got out of window
-        if not mouse_watcher.has_mouse():
+        # safety check to avoid crash if mouse has got out of window (or if
+        # there is no window at all)
+        if not mouse_watcher or not mouse_watcher.has_mouse():
             return event.cont
 
         # long story short, what happens there: we are getting mouse pointer's
@@ -84,7 +79,7 @@ class Player(entity2d.Creature):
             render.get_relative_point(base.camera, far),
         )
 
-        hit_vector = mouse_pos_3d - self.node.get_pos()
+        hit_vector = mouse_pos_3d - self.position
         # We throw away third value, coz we have static height and dont need it
         # moreover - setting custom height later, AFTER normalization, caused
         # that long-standing bug with projectile spawning above player's head
@@ -98,15 +93,16 @@ class Player(entity2d.Creature):
 
     def controls_handler(self, event):
         """
-        Intended to be used as part of task manager routine. Automatically receive
-        event from task manager, checks if buttons are pressed and log it. Then
-        return event back to task manager, so it keeps running in loop
+        Intended to be used as part of simulation's input stage. Automatically
+        receive tick from simulation, checks if buttons are pressed and log it.
+        Then return tick.cont back to simulation, so it keeps running in loop
         """
         # safety check to ensure that player isnt dead, otherwise it will crash
         if self.dead:
-            return event.cont
+            return
 
         if "stun" in self.status_effects:
+            self.velocity = (0, 0)
             return event.cont
 
         # idk if I need to export this to variable or call directly
@@ -125,7 +121,7 @@ class Player(entity2d.Creature):
         # on amount of animations I would obtain. For now, lets leave it like that
         mouse_watcher = base.mouseWatcherNode
         # ensuring that mouse pointer is part of game's window right now
-        if mouse_watcher.has_mouse():
+        if mouse_watcher and mouse_watcher.has_mouse():
             mouse_x = mouse_watcher.get_mouse_x()
             # independant direction change allows us to rotate node without resetting
             # animation frame. May be bad on characters that have facial features
@@ -167,26 +163,24 @@ class Player(entity2d.Creature):
         ):
             mov_speed = mov_speed / sqrt(2)
 
+        velocity = Vec2(0, 0)
         if shared.level.controls_status["move_up"]:
-            self.node.set_pos(self.node.get_pos() + (0, -mov_speed, 0))
+            velocity += (0, -mov_speed)
             action = "move"
         if shared.level.controls_status["move_down"]:
-            self.node.set_pos(self.node.get_pos() + (0, mov_speed, 0))
+            velocity += (0, mov_speed)
             action = "move"
         if shared.level.controls_status["move_left"]:
-            self.node.set_pos(self.node.get_pos() + (mov_speed, 0, 0))
+            velocity += (mov_speed, 0)
             action = "move"
         if shared.level.controls_status["move_right"]:
-            self.node.set_pos(self.node.get_pos() + (-mov_speed, 0, 0))
+            velocity += (-mov_speed, 0)
             action = "move"
 
-        self.node.set_python_tag("mov_spd", mov_speed)
+        self.velocity = velocity
+        self.position = self.position + (*velocity, 0)
 
-        # using it like that, because due to requirement to somehow pass caster to
-        # skill, Im unable to set using_skill to be a normal variable
-        if shared.level.controls_status["attack"] and not self.node.get_python_tag(
-            "using_skill"
-        ):
+        if shared.level.controls_status["attack"] and not self.using_skill:
 
             y_vec = Vec2(0, 1)
             # x has to be flipped on proj without billboard, y - on proj with it.
@@ -206,12 +200,11 @@ class Player(entity2d.Creature):
         # interrupting animation update tasks, in case we are in the middle of
         # casting skill. Iirc there is some case when it may backfire, but I cant
         # remember it. Wooops... #TODO
-        # if not self.using_skill:
-        if not self.node.get_python_tag("using_skill"):
+        if not self.using_skill:
             self.change_animation(action)
 
-        # it works a bit weird, but if we wont return .cont of task we received,
-        # then task will run just once and then stop, which we dont want
+        # it works a bit weird, but if we wont return .cont of tick we received,
+        # then handler will run just once and then stop, which we dont want
         return event.cont
 
     def get_damage(self, amount=None, effects=None):
@@ -225,7 +218,7 @@ class Player(entity2d.Creature):
         # this is a bit longer than stun lengh, to let player escape
         #    self.status_effects['immortal'] = 0.7
         # updating the value on player's hp gui
-        shared.level.player_hud.update_hp(self.stats["hp"])
+        shared.level.hud_model.set("hp", self.stats["hp"])
         shared.level.reset_score_multiplier()
 
     def die(self):
@@ -0,0 +1,89 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with pools of entities. Building an entity means creating a bunch of
+# nodes, colliders and spritesheets - thus instead of throwing dead ones away,
+# we keep them around and respawn them later
+
+import logging
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Amount of ticks that should pass before released entity can be reused. Its
+# needed to let simulation's routines of entity's previous life notice that its
+# dead and detach themselves, before new ones will be attached
+COOLDOWN_TICKS = 2
+
+
+class EntityPool:
+    """Storage of reusable entities, sorted by keys. Entities of the same key
+    should be identical, aside from state that gets restored by their .reset()"""
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # entities ready to be reused, by their keys
+        self.free = {}
+        # (tick of release, entity) of recently released entities
+        self.released = deque()
+        # amount of entities ever created for each key
+        self.created = {}
+
+    def create(self, key, factory):
+        """Create new entity of provided key, using provided factory function"""
+        entity = factory()
+        entity.pool = self
+        entity.pool_key = key
+        self.created[key] = self.created.get(key, 0) + 1
+        return entity
+
+    def prewarm(self, key, factory, amount: int, limit: int = None) -> int:
+        """Ensure that at least amount of entities of provided key exists.
+        If limit is set - create no more than that many entities per call, to
+        spread the work across multiple frames. Returns amount of created ones"""
+        batch = amount - self.created.get(key, 0)
+        if limit is not None:
+            batch = min(batch, limit)
+        if batch <= 0:
+            return 0
+
+        log.debug(f"Prewarming {batch} entities of {key}")
+        free = self.free.setdefault(key, [])
+        for _ in range(batch):
+            free.append(self.create(key, factory))
+        return batch
+
+    def get(self, key, factory):
+        """Get unused entity of provided key, or create new one if there are none"""
+        self.collect()
+        free = self.free.get(key)
+        if free:
+            entity = free.pop()
+            entity.reset()
+            return entity
+        return self.create(key, factory)
+
+    def release(self, entity):
+        """Return entity that has died back to pool"""
+        self.released.append((self.simulation.tick.number, entity))
+
+    def collect(self):
+        """Make entities, released long enough ago, available for reuse"""
+        released = self.released
+        ready_tick = self.simulation.tick.number - COOLDOWN_TICKS
+        while released and released[0][0] <= ready_tick:
+            _, entity = released.popleft()
+            self.free.setdefault(entity.pool_key, []).append(entity)
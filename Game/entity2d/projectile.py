@@ -15,15 +15,12 @@
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
 from panda3d.core import NodePath, CollisionSphere
-import p3dss
-from Game import entity2d, shared
+from Game import entity2d, shared, simulation
 import logging
 
 log = logging.getLogger(__name__)
 
 # module for 2d projectiles
-PLAYER_PROJECTILE_COLLISION_MASK = 0x09
-ENEMY_PROJECTILE_COLLISION_MASK = 0x04
 
 
 class Projectile(entity2d.Entity2D):
@@ -41,39 +38,20 @@ class Projectile(entity2d.Entity2D):
         scale_modifier=None,
         die_on_object_collision: bool = False,
         die_on_creature_collision: bool = False,
+        rehit_interval: float = 0,
     ):
         self.name = name
 
-        if category == shared.game_data.player_projectile_category:
-            collision_mask = PLAYER_PROJECTILE_COLLISION_MASK
-        elif category == shared.game_data.enemy_projectile_category:
-            collision_mask = ENEMY_PROJECTILE_COLLISION_MASK
-        else:
-            # this shouldnt happen, but just in case
-            collision_mask = None
-
         # just like with other entities - no safety checks for now, will explode
         # on invalid name
-        data = shared.assets.projectiles[name]
-
-        # its probably possible to do this in less ugly way, but whatever
-        assets = data.get("Assets", None)
-        if assets:
-            sheet = data["Assets"].get("sprite", None)
-            animations = data.get("Animations", None)
-            sprite_sizes = data.get("size", None)
-        else:
-            sprite_sizes = None
-            sheet = None
-            animations = None
-
-        spritesheet = shared.assets.sprite.get(sheet, None)
+        archetype = shared.archetypes.projectiles[name]
+        self.archetype = archetype
 
         # doing it like that, coz default value from projectile's config can be
         # overriden on init. Say, by skill's values
-        projectile_hitbox = hitbox_size or data["Main"].get("hitbox_size", 0)
+        projectile_hitbox = hitbox_size or archetype.hitbox_size
 
-        projectile_scale = scale or data["Main"].get("scale", 1)
+        projectile_scale = scale or archetype.scale
         # scale modifier is variable that tweaks raw scale value. Say, if we want
         # to adjust default scale to match some other entity
         if scale_modifier:
@@ -82,34 +60,14 @@ class Projectile(entity2d.Entity2D):
         self.direction = 0
 
         parts = []
-        if spritesheet and animations:
-            body = p3dss.SpritesheetNode(
-                name=f"{name}_body",
-                spritesheet=spritesheet,
-                sprite_sizes=sprite_sizes or shared.game_data.sprite_size,
-                # #TODO: add ability to set custom scale
-                scale=shared.game_data.node_scale,
-            )
-
-            for sprite_name in list(animations):
-                item = p3dss.SpritesheetItem(
-                    name=sprite_name,
-                    sprites=animations[sprite_name]["sprites"],
-                    loop=animations[sprite_name].get("loop", False),
-                    playback_speed=animations[sprite_name].get(
-                        "speed", shared.game_data.playback_speed
-                    ),
-                )
-                body.add_item(item)
-
-            parts.append(entity2d.VisualsNode(body, (0, 0, 0), 0.0, 0, False))
+        if archetype.body:
+            parts.append(entity2d.build_visuals(archetype.body, f"{name}_body"))
 
         # #TODO: make shape configurable (say, for rays)
         collision_settings = entity2d.CollisionSettings(
             shape=CollisionSphere,
             size=(0, 0, 0, projectile_hitbox),
             position=None,
-            mask=collision_mask or None,
         )
 
         super().__init__(
@@ -122,7 +80,7 @@ class Projectile(entity2d.Entity2D):
 
         # optionally enabling billboard effect for projectile, in case it has such
         # setting in config. I could probably pass it to entity2d directly, idk
-        if data["Main"].get("billboard", False):
+        if archetype.billboard:
             self.node.set_billboard_point_eye()
 
         # if projectile has no visuals attached to it, this wont do anything -
@@ -130,30 +88,34 @@ class Projectile(entity2d.Entity2D):
         self.change_animation("default")
 
         self.damage = damage
-        self.node.set_python_tag("damage", self.damage)
-        if effects:
-            self.effects = effects
-            self.node.set_python_tag("effects", self.effects)
+        self.effects = effects
+        self.collision_data.damage = damage
+        self.collision_data.effects = effects
+        # lingering projectiles (say, mines) may hit the same creature again
+        # after that many seconds. Otherwise they hit each creature only once
+        if rehit_interval:
+            self.collision_data.rehit = max(
+                1, round(rehit_interval * simulation.TICK_RATE)
+            )
         self.dead = False
 
-        self.default_angle = data["Main"].get("angle", 0)
+        self.default_angle = archetype.angle
 
-        if lifetime:
-            self.lifetime = lifetime
+        # lifetime itself is counted down by level's ProjectileKinematics, in
+        # storage. This one is used to restore it on each spawn
+        self.default_lifetime = lifetime
 
         # its probably possible to do it in less ugly way
         if die_on_object_collision or die_on_creature_collision:
-            # I should probably add collider on spawn, idk #TODO
-
-            # coz there is no point in traversing projectile itself otherwise
-            base.cTrav.add_collider(self.collision, base.chandler)
-            self.node.set_python_tag("die_command", self.die)
+            # coz there is no point in keeping projectile inside of arena
+            # otherwise
+            self.store.set_flag(self.slot, entity2d.BOUNDED)
 
         if die_on_creature_collision:
-            self.node.set_python_tag("die_on_creature_collision", True)
+            self.collision_data.die_on_creature_collision = True
 
         if die_on_object_collision:
-            self.node.set_python_tag("die_on_object_collision", True)
+            self.store.set_flag(self.slot, entity2d.FRAGILE)
 
     def spawn(self, position, direction=None, angle: int = 0, **kwargs):
         """Spawns the projectile on provided position"""
@@ -185,28 +147,37 @@ class Projectile(entity2d.Entity2D):
             self.node.set_r(angle)
 
         # target does nothing, for now. May come handly in future
-        if self.lifetime:
-            # schedulging projectile to die in self.lifetime seconds after spawn
-            base.task_mgr.add(self.dying_task, f"dying task of projectile {self.name}")
+        if self.default_lifetime:
+            # making projectile die in self.default_lifetime seconds after spawn
+            self.store.lifetime[self.slot] = self.default_lifetime
+            self.store.set_flag(self.slot, entity2d.MORTAL)
+
+    def follow(self, target, flag: int):
+        """Make projectile follow provided entity, staying at self.direction
+        from it. Flag decides how, see ProjectileKinematics"""
+        # actual following is done by level's ProjectileKinematics, together
+        # with all the other projectiles
+        store = self.store
+        store.target[self.slot] = target.slot
+        store.target_id[self.slot] = store.ids[target.slot]
+        if self.direction:
+            store.offset[self.slot] = self.direction[0], self.direction[1]
+        else:
+            store.offset[self.slot] = 0
+        store.set_flag(self.slot, flag)
 
-    def dying_task(self, event):
-        # ensuring that projectile didnt die already
-        if self.dead or not self.node:
+    def die(self):
+        # projectile may collide with multiple things at once, but can only die once
+        if self.dead:
             return
 
-        dt = globalClock.get_dt()
-        self.lifetime -= dt
-
-        if self.lifetime > 0:
-            return event.cont
-
-        self.die()
-        # super().die()
-        # moved it there, because death of creature required it
-        # self.node.remove_node()
-        return
+        # projectiles that came from pool get detached from scene and returned
+        # back there, instead of being destroyed
+        if self.pool is not None:
+            self.dead = True
+            self.release()
+            return
 
-    def die(self):
         super().die()
 
         # TODO: add ability to play death animation and only then remove node
@@ -214,9 +185,25 @@ class Projectile(entity2d.Entity2D):
         # anim. Maybe I should add something like optional "length" setting into
         # projectile's config file?
 
-        self.node.remove_node()
+        self.remove()
         # self.dying_task(0)
 
+    def reset(self):
+        """Restore state of projectile that has been returned to pool, so it
+        could be spawned again"""
+        super().reset()
+        # movement is set up again by spawn() of projectile's class
+        self.store.set_flag(
+            self.slot,
+            entity2d.MORTAL | entity2d.MOVING | entity2d.CHASING | entity2d.ATTACHED,
+            False,
+        )
+        self.store.velocity[self.slot] = 0
+        self.collision_data.hits.clear()
+        self.direction = 0
+        self.node.set_hpr(0, 0, 0)
+        self.change_animation("default")
+
 
 class ChasingProjectile(Projectile):
     """Projectile that always follows its target.
@@ -236,6 +223,7 @@ class ChasingProjectile(Projectile):
         scale_modifier=None,
         die_on_object_collision: bool = False,
         die_on_creature_collision: bool = False,
+        rehit_interval: float = 0,
     ):
 
         self.target = None
@@ -257,32 +245,40 @@ class ChasingProjectile(Projectile):
             scale_modifier=scale_modifier,
             die_on_object_collision=die_on_object_collision,
             die_on_creature_collision=die_on_creature_collision,
+            rehit_interval=rehit_interval,
         )
-        self.node.set_python_tag("mov_spd", self.speed)
+        self.store.speed[self.slot] = self.speed
+
+    def reset(self):
+        super().reset()
+        self.target = None
 
     def spawn(self, **kwargs):
         self.target = kwargs["target"]
         super().spawn(**kwargs)
-        base.task_mgr.add(self.follow_task, f"following task of {self.name}")
+        if self.target:
+            self.follow(self.target, entity2d.CHASING | entity2d.MOVING)
 
-    def follow_task(self, event):
-        """Taskmanager task that make projectile follow the target"""
-        if self.dead or not self.node or not self.target:
-            return
 
-        projectile_position = self.node.get_pos()
+class AttachedProjectile(Projectile):
+    """Projectile that sticks to its target for the whole lifetime, like its
+    been parented to it. Should receive "target" entity on spawn"""
 
-        vector_to_target = (
-            self.target.get_pos() + self.direction
-        ) - projectile_position
-        vector_to_target.normalize()
+    def __init__(self, *args, **kwargs):
+        self.target = None
+        super().__init__(*args, **kwargs)
 
-        # workaround to ensure node will its stay on its original layer
-        vxy = vector_to_target.get_xy()
-        new_pos = projectile_position + (vxy * self.speed, 0)
+    def reset(self):
+        super().reset()
+        self.target = None
 
-        self.node.set_pos(new_pos)
-        return event.cont
+    def spawn(self, **kwargs):
+        self.target = kwargs["target"]
+        super().spawn(**kwargs)
+        if self.target:
+            # unlike chasing projectile, this one doesnt move on its own. Its
+            # just placed next to target on each tick, thus never lags behind
+            self.follow(self.target, entity2d.ATTACHED)
 
 
 class MovingProjectile(Projectile):
@@ -302,6 +298,7 @@ class MovingProjectile(Projectile):
         ricochets_amount: int = 0,
         die_on_object_collision: bool = False,
         die_on_creature_collision: bool = False,
+        rehit_interval: float = 0,
     ):
 
         # I could probably move direction there too, since its mandatory anyway
@@ -320,13 +317,18 @@ class MovingProjectile(Projectile):
             scale_modifier=scale_modifier,
             die_on_object_collision=die_on_object_collision,
             die_on_creature_collision=die_on_creature_collision,
+            rehit_interval=rehit_interval,
         )
 
         # it makes no sense to ricochet chasing or static projectile, thus its there
-        if ricochets_amount:
-            self.node.set_python_tag("ricochets_amount", ricochets_amount)
+        self.ricochets_amount = ricochets_amount
+        self.store.ricochets[self.slot] = ricochets_amount
 
-        self.node.set_python_tag("mov_spd", self.speed)
+        self.store.speed[self.slot] = self.speed
+
+    def reset(self):
+        super().reset()
+        self.store.ricochets[self.slot] = self.ricochets_amount
 
     def spawn(self, **kwargs):
         super().spawn(**kwargs)
@@ -334,20 +336,18 @@ class MovingProjectile(Projectile):
         # it has to be done after parent's spawn, coz we need original direction
         # for sprite rotation and to make chasing projectile work
         self.direction.normalize()
-        # doing so to enable support for ricochets
+        # doing so to enable support for ricochets, which flip velocity on hit
         # doing it after spawn, coz self.direction is set in parent
-        self.node.set_python_tag("direction", self.direction)
-
-        base.task_mgr.add(self.move_task, f"moving task of {self.name}")
-
-    def move_task(self, event):
-        """Taskmanager task that make projectile fly in specified direction"""
-        if self.dead or not self.node:
-            return
-
-        # new_position = self.node.get_pos() + self.direction*self.speed
-        direction = self.node.get_python_tag("direction")
-        new_position = self.node.get_pos() + direction * self.speed
-
-        self.node.set_pos(new_position)
-        return event.cont
+        self.velocity = self.direction * self.speed
+        # projectile is moved by level's ProjectileKinematics from now on
+        self.store.set_flag(self.slot, entity2d.MOVING)
+
+    def ricochet(self, horizontal: bool):
+        """Turn projectile's sprite after it has bounced off arena's side.
+        Horizontal means its the left or right side"""
+        # dont ask me why and how rotation works, because "it just works"
+        if horizontal:
+            self.node.set_h(180)
+        # I have no idea why it works and it will probably break on billboard
+        # projectiles #TODO
+        self.node.set_r(-(self.node.get_r()))
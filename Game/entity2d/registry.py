@@ -0,0 +1,120 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with registry of alive entities. Entities get referred to by handles
+# that become invalid once their entity has been removed, so reused (pooled)
+# entities wont be mistaken for their previous lives
+
+import logging
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+Handle = namedtuple("Handle", ["index", "generation"])
+
+
+class EntityRegistry:
+    """Unordered collection of entities with O(1) addition and removal.
+    Entities are kept densely packed, and removing one moves the last entity
+    in its place. Removals are requested with .discard() and applied by .flush(),
+    which is meant to run at the end of simulation's tick"""
+
+    def __init__(self):
+        # entities themselves, without gaps between them
+        self.dense = []
+        # indexes of handles of entities in self.dense
+        self.owners = []
+        # positions in self.dense of entities, by index of their handles
+        self.positions = []
+        # increased on each removal, to invalidate old handles of index
+        self.generations = []
+        self.free_indexes = []
+        # handles of entities that should be removed on next flush
+        self.pending = []
+
+    def __len__(self) -> int:
+        return len(self.dense)
+
+    def __iter__(self):
+        return iter(self.dense)
+
+    def add(self, entity) -> Handle:
+        """Add entity to registry and return its handle"""
+        if self.free_indexes:
+            index = self.free_indexes.pop()
+        else:
+            index = len(self.positions)
+            self.positions.append(-1)
+            self.generations.append(0)
+
+        self.positions[index] = len(self.dense)
+        self.dense.append(entity)
+        self.owners.append(index)
+        return Handle(index, self.generations[index])
+
+    def is_valid(self, handle: Handle) -> bool:
+        """Check if handle refers to entity that is still in registry"""
+        return (
+            handle is not None
+            and handle.index < len(self.generations)
+            and self.generations[handle.index] == handle.generation
+            and self.positions[handle.index] >= 0
+        )
+
+    def get(self, handle: Handle):
+        """Get entity of provided handle, or None if its been removed"""
+        if not self.is_valid(handle):
+            return None
+        return self.dense[self.positions[handle.index]]
+
+    def remove(self, handle: Handle) -> bool:
+        """Remove entity of provided handle right away. Returns False if it has
+        already been removed before"""
+        if not self.is_valid(handle):
+            return False
+
+        index = handle.index
+        position = self.positions[index]
+        last = len(self.dense) - 1
+        if position != last:
+            # moving last entity in place of removed one
+            moved = self.owners[last]
+            self.dense[position] = self.dense[last]
+            self.owners[position] = moved
+            self.positions[moved] = position
+        self.dense.pop()
+        self.owners.pop()
+
+        self.positions[index] = -1
+        self.generations[index] += 1
+        self.free_indexes.append(index)
+        return True
+
+    def discard(self, handle: Handle):
+        """Mark entity of provided handle for removal on next flush"""
+        self.pending.append(handle)
+
+    def flush(self, event=None):
+        """Remove all the entities, marked for removal. Can be used as
+        simulation's routine"""
+        if self.pending:
+            for handle in self.pending:
+                self.remove(handle)
+            log.debug(f"Removed {len(self.pending)} entities from registry")
+            self.pending.clear()
+
+        if event is not None:
+            return event.cont
@@ -0,0 +1,292 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module with array-backed storage of entities' data. Keeping positions, stats
+# and such in contiguous columns (instead of per-instance dicts and python tags)
+# makes it possible to process all the entities at once with vectorized passes
+
+import logging
+from collections.abc import MutableMapping
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Amount of slots allocated on init. Storage doubles in size each time it runs
+# out of free slots, so this isnt a hard limit
+DEFAULT_CAPACITY = 64
+
+# Flags of entity, stored as bits of EntityStore.flags column
+# Entity has been spawned and currently exists on scene
+ACTIVE = 1 << 0
+# Entity has died, but hasnt been removed yet (say, its corpse is still rotting)
+DEAD = 1 << 1
+# Entity can be pushed away by other entities
+PUSHABLE = 1 << 2
+# Entity is in the middle of casting some skill
+CASTING = 1 << 3
+# Entity has "stun" status effect and thus cant move or attack
+STUNNED = 1 << 4
+# Entity's sprite is turned to the left
+FACING_LEFT = 1 << 5
+# Entity cant leave arena's bounds
+BOUNDED = 1 << 6
+# Entity dies on collision with objects (say, arena's sides)
+FRAGILE = 1 << 7
+# Entity moves by its velocity on each tick, see ProjectileKinematics
+MOVING = 1 << 8
+# Entity's velocity gets turned towards its target on each tick
+CHASING = 1 << 9
+# Entity dies once its lifetime runs out
+MORTAL = 1 << 10
+# Entity is glued to its target, always staying at the same offset from it
+ATTACHED = 1 << 11
+
+# Codes of animations that get switched by vectorized routines (like ai), stored
+# in EntityStore.action column. Everything else is stored as 0
+ACTION_CODES = {
+    "idle": 1,
+    "move": 2,
+}
+
+# Names of creature's stats, as they are written in configuration files, mapped
+# to the names of columns where these are stored
+STAT_COLUMNS = {
+    "hp": "hp",
+    "dmg": "dmg",
+    "defence": "defence",
+    "dodge": "dodge",
+    "mov_spd": "speed",
+}
+
+
+class CollisionData:
+    """Data of entity, required by collision handlers. Kept in EntityStore's
+    collision_data table, so handlers could get all of it with one lookup by
+    entity's slot, instead of fetching bunch of python tags from its node"""
+
+    __slots__ = (
+        "entity",
+        "damage",
+        "effects",
+        "hits",
+        "rehit",
+        "die_on_creature_collision",
+    )
+
+    def __init__(
+        self,
+        entity,
+        damage=0,
+        effects=None,
+        die_on_creature_collision: bool = False,
+    ):
+        self.entity = entity
+        self.damage = damage
+        self.effects = effects
+        # numbers of ticks on which this entity has hit others last time, by
+        # (slot, id) of these
+        self.hits = {}
+        # amount of ticks after which the same entity can be hit again. None
+        # means it can only be hit once
+        self.rehit = None
+        self.die_on_creature_collision = die_on_creature_collision
+
+
+class EntityStore:
+    """Structure-of-arrays storage of entities' data.
+    Each entity occupies one slot (index) in all columns. Slots of removed
+    entities get reused by new ones"""
+
+    # (name, shape of each item, dtype, default value) of each column
+    COLUMNS = (
+        # (x, y) position of entity on current tick
+        ("position", (2,), np.float64, 0),
+        # (x, y) position of entity on previous tick, used for interpolation
+        ("previous", (2,), np.float64, 0),
+        # (x, y) position at which entity's node has been rendered last time
+        ("rendered", (2,), np.float64, 0),
+        # height of entity's node. Its static, coz all entities live on a plane
+        ("height", (), np.float64, 0),
+        # (x, y) distance passed by entity on last tick
+        ("velocity", (2,), np.float64, 0),
+        # movement speed of entity (mov_spd stat for creatures)
+        ("speed", (), np.float64, 0),
+        ("hp", (), np.float64, 0),
+        ("dmg", (), np.float64, 0),
+        ("defence", (), np.float64, 0),
+        ("dodge", (), np.float64, 0),
+        # amount of times entity can bounce off arena's sides
+        ("ricochets", (), np.int16, 0),
+        # radius of entity's hitbox, already multiplied by node's scale
+        ("radius", (), np.float64, 0),
+        # seconds left until entity with MORTAL flag dies
+        ("lifetime", (), np.float64, 0),
+        # slot and id of entity that CHASING or ATTACHED entity follows. Id is
+        # checked to stop following once target's slot gets taken by someone else
+        ("target", (), np.int64, -1),
+        ("target_id", (), np.int64, -1),
+        # (x, y) offset from target's position that entity follows
+        ("offset", (2,), np.float64, 0),
+        ("flags", (), np.uint16, 0),
+        # code of animation that is currently playing, see ACTION_CODES
+        ("action", (), np.uint8, 0),
+        # code of entity's category, see get_category_code()
+        ("category", (), np.uint8, 0),
+        # id assigned to entity by level. -1 means there is none
+        ("ids", (), np.int64, -1),
+        # rgba color scale of entity's instanced sprites. Changed by intervals
+        # (say, blinking on damage) and read by SpriteBatch each frame
+        ("color", (4,), np.float32, 1),
+    )
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # amount of slots that have been used at least once. Everything past it
+        # is guaranteed to be empty, so vectorized passes can skip it
+        self.size = 0
+        self.free_slots = []
+        # instances that occupy slots
+        self.entities = []
+        # CollisionData of instances that occupy slots
+        self.collision_data = []
+        # category names, mapped to numerical codes used in category column
+        self.categories = {}
+
+        for name, shape, dtype, default in self.COLUMNS:
+            setattr(self, name, np.full((capacity, *shape), default, dtype=dtype))
+
+    def __len__(self):
+        return self.size - len(self.free_slots)
+
+    def get_category_code(self, category: str) -> int:
+        """Get numerical code of category with provided name"""
+        if category not in self.categories:
+            self.categories[category] = len(self.categories) + 1
+        return self.categories[category]
+
+    def grow(self):
+        """Double the capacity of storage"""
+        new_capacity = self.capacity * 2
+        for name, shape, dtype, default in self.COLUMNS:
+            column = np.full((new_capacity, *shape), default, dtype=dtype)
+            column[: self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+
+        log.debug(f"Increased entity storage capacity to {new_capacity}")
+        self.capacity = new_capacity
+
+    def add(self, entity, category: str) -> int:
+        """Allocate slot for provided entity and return its index"""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.entities[slot] = entity
+            self.collision_data[slot] = None
+        else:
+            if self.size >= self.capacity:
+                self.grow()
+            slot = self.size
+            self.size += 1
+            self.entities.append(entity)
+            self.collision_data.append(None)
+
+        self.category[slot] = self.get_category_code(category)
+        return slot
+
+    def remove(self, slot: int):
+        """Free provided slot, resetting its values to defaults"""
+        for name, shape, dtype, default in self.COLUMNS:
+            getattr(self, name)[slot] = default
+        self.entities[slot] = None
+        self.collision_data[slot] = None
+        self.free_slots.append(slot)
+
+    def has_flag(self, slot: int, flag: int) -> bool:
+        """Check if provided slot has flag set"""
+        return bool(self.flags[slot] & flag)
+
+    def set_flag(self, slot: int, flag: int, value: bool = True):
+        """Set or clear flag of provided slot"""
+        if value:
+            self.flags[slot] |= flag
+        else:
+            self.flags[slot] &= ~self.flags.dtype.type(flag)
+
+    def select(
+        self, include: int = ACTIVE, exclude: int = DEAD, category: str = None
+    ) -> np.ndarray:
+        """Get indexes of slots that have all the include flags and none of the
+        exclude flags set. Optionally, only pick slots of provided category"""
+        flags = self.flags[: self.size]
+        mask = ((flags & include) == include) & ((flags & exclude) == 0)
+        if category is not None:
+            mask &= self.category[: self.size] == self.get_category_code(category)
+        return np.flatnonzero(mask)
+
+    def save_positions(self):
+        """Remember current positions of all entities as previous ones"""
+        self.previous[: self.size] = self.position[: self.size]
+
+    def sync_nodes(self, alpha: float = 1):
+        """Move nodes of active entities to positions in between previous and
+        current ones. Alpha is the fraction of tick passed since the last one"""
+        slots = self.select(exclude=0)
+        previous = self.previous[slots]
+        target = previous + (self.position[slots] - previous) * alpha
+
+        # only touching nodes which position has actually changed
+        changed = np.any(target != self.rendered[slots], axis=1)
+        slots = slots[changed]
+        target = target[changed]
+        self.rendered[slots] = target
+
+        entities = self.entities
+        for slot, (x, y), z in zip(
+            slots.tolist(), target.tolist(), self.height[slots].tolist()
+        ):
+            entities[slot].node.set_pos(x, y, z)
+
+
+class StatsView(MutableMapping):
+    """Dict-like view on creature's stats, stored in EntityStore's columns.
+    Exists to keep the same syntax for stats access (e.g stats["hp"]), without
+    having to keep separate dictionary for each creature"""
+
+    __slots__ = ("store", "slot")
+
+    def __init__(self, store: EntityStore, slot: int):
+        self.store = store
+        self.slot = slot
+
+    def __getitem__(self, key: str):
+        column = getattr(self.store, STAT_COLUMNS[key])
+        return column[self.slot].item()
+
+    def __setitem__(self, key: str, value):
+        column = getattr(self.store, STAT_COLUMNS[key])
+        column[self.slot] = value
+
+    def __delitem__(self, key: str):
+        # stats cant be removed, since these are columns. Resetting them instead
+        self[key] = 0
+
+    def __iter__(self):
+        return iter(STAT_COLUMNS)
+
+    def __len__(self):
+        return len(STAT_COLUMNS)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -21,26 +21,92 @@ from direct.showbase.ShowBase import ShowBase
 from panda3d.core import WindowProperties
 from direct.gui.OnscreenText import TextNode
 from Game.common import shared
-from Game import assets_loader, level_loader, interface, music_manager
+from Game import assets_loader, level_loader, interface, music_manager, entity2d
 
 log = logging.getLogger(__name__)
 
 
 class GameWindow(ShowBase):
-    def __init__(self):
+    def __init__(self, background_loading: bool = True):
         log.debug("Setting up the window")
         super().__init__()
 
-        loading = interface.LoadingScreen()
-        shared.ui.add(loading, "loading")
+        self.loading_screen = interface.LoadingScreen()
+        shared.ui.add(self.loading_screen, "loading")
         shared.ui.switch("loading")
 
         # disabling mouse to dont mess with camera
         self.disable_mouse()
 
-        log.debug("Loading assets")
-        shared.assets.load_all()
+        log.debug("Loading user data")
+        shared.user_data.load_leaderboards()
+
+        # there is no window during headless runs, thus nothing to configure
+        if self.win is not None:
+            self.configure_window()
+
+        log.debug("Setting up the sound")
+        # setting volume so it should apply to all music tracks
+        # thats about where shared.settings break. I have no idea why, for now
+
+        shared.music_player = music_manager.MusicPlayer()
+        shared.music_player.set_player_volume(shared.settings.music_volume)
+
+        # same goes for sfx manager, which is a separate thing
+        shared.sfx_manager = base.sfxManagerList[0]
+        shared.sfx_manager.set_volume(shared.settings.sfx_volume)
 
+        # (player_class, map_scale) of level, requested before assets have been
+        # fully loaded. It will be started as soon as they are
+        self.requested_level = None
+        self.menu_ready = False
+
+        log.debug("Loading assets")
+        if background_loading:
+            # main menu gets shown as soon as assets it needs are there, while
+            # the rest keeps loading in background
+            self.assets_loading = shared.assets.load_in_background()
+            self.task_mgr.add(self.check_loading, "assets loading")
+        else:
+            self.assets_loading = None
+            shared.assets.load_all()
+            self.setup_interface()
+            self.finish_loading()
+
+    def check_loading(self, event):
+        """Taskmanager routine that reports progress of background loading of
+        assets and sets up things that depend on them, once they are there"""
+        loading = self.assets_loading
+        loading.update()
+        if loading.error is not None:
+            raise loading.error
+
+        if not loading.done:
+            step = loading.finished[-1] if loading.finished else "assets"
+            self.loading_screen.set_progress(
+                loading.progress, f"Loading... ({step} done)"
+            )
+
+        if not self.menu_ready and loading.is_ready(assets_loader.MENU_STEPS):
+            self.setup_interface()
+
+        if not loading.done:
+            return event.cont
+
+        self.finish_loading()
+
+    def finish_loading(self):
+        """Things to do once all the assets have been loaded"""
+        shared.archetypes = entity2d.compile_archetypes(shared.assets)
+        self.loading_screen.reset_progress()
+        log.debug("Assets have been loaded")
+
+        if self.requested_level is not None:
+            self.start_game(*self.requested_level)
+            self.requested_level = None
+
+    def setup_interface(self):
+        """Build menus. Requires ui, sfx, music and classes to be loaded"""
         log.debug("Initializing interface builder")
         shared.ui_builder = interface.builder.InterfaceBuilder(
             button_textures=(
@@ -61,61 +127,6 @@ class GameWindow(ShowBase):
             icon_pos=(-90, 1, 0),
         )
 
-        log.debug("Loading user data")
-        shared.user_data.load_leaderboards()
-
-        log.debug("Configuring game's window")
-        # setting up resolution
-        screen_info = base.pipe.getDisplayInformation()
-        # this is ugly, but it works, for now
-        # basically we are ensuring that custom window's resolution isnt bigger
-        # than screen size. And if yes - using default resolution instead
-
-        # idk why, but these require at least something to display max available window size
-        max_res = (
-            screen_info.getDisplayModeWidth(0),
-            screen_info.getDisplayModeHeight(0),
-        )
-
-        for cr, mr in zip(shared.settings.window_size, max_res):
-            if cr > mr:
-                log.warning(
-                    "Requested resolution is bigger than screen size, "
-                    "will use defaults instead"
-                )
-                shared.settings.window_size = shared.default_settings.window_size
-
-        window_settings = WindowProperties()
-        window_settings.set_size(shared.settings.window_size)
-
-        # ensuring that window cant be resized by dragging its borders around
-        window_settings.set_fixed_size(True)
-        # toggling fullscreen/windowed mode
-        window_settings.set_fullscreen(shared.settings.fullscreen)
-        # setting window's title
-        window_settings.set_title(shared.game_data.name)
-        # applying settings to our window
-        self.win.request_properties(window_settings)
-        log.debug(f"Resolution has been set to {shared.settings.window_size}")
-
-        # turning on fps meter, in case its enabled in settings
-        base.setFrameRateMeter(shared.settings.fps_meter)
-
-        # change background color to black. #TODO: move this to map generation,
-        # make it possible to set to other values, aswell as pictures
-        self.win.set_clear_color((0, 0, 0, 1))
-
-        log.debug("Setting up the sound")
-        # setting volume so it should apply to all music tracks
-        # thats about where shared.settings break. I have no idea why, for now
-
-        shared.music_player = music_manager.MusicPlayer()
-        shared.music_player.set_player_volume(shared.settings.music_volume)
-
-        # same goes for sfx manager, which is a separate thing
-        shared.sfx_manager = base.sfxManagerList[0]
-        shared.sfx_manager.set_volume(shared.settings.sfx_volume)
-
         shared.music_player.crossfade(shared.assets.music["menu_theme"], loop=True)
 
         # TODO: create separate storage for scenes
@@ -167,6 +178,50 @@ class GameWindow(ShowBase):
         leaderboard.update_visible_scores()
 
         shared.ui.switch("main")
+        self.menu_ready = True
+
+    def configure_window(self):
+        """Apply user's settings to game's window"""
+        log.debug("Configuring game's window")
+        # setting up resolution
+        screen_info = base.pipe.getDisplayInformation()
+        # this is ugly, but it works, for now
+        # basically we are ensuring that custom window's resolution isnt bigger
+        # than screen size. And if yes - using default resolution instead
+
+        # idk why, but these require at least something to display max available window size
+        max_res = (
+            screen_info.getDisplayModeWidth(0),
+            screen_info.getDisplayModeHeight(0),
+        )
+
+        for cr, mr in zip(shared.settings.window_size, max_res):
+            if cr > mr:
+                log.warning(
+                    "Requested resolution is bigger than screen size, "
+                    "will use defaults instead"
+                )
+                shared.settings.window_size = shared.default_settings.window_size
+
+        window_settings = WindowProperties()
+        window_settings.set_size(shared.settings.window_size)
+
+        # ensuring that window cant be resized by dragging its borders around
+        window_settings.set_fixed_size(True)
+        # toggling fullscreen/windowed mode
+        window_settings.set_fullscreen(shared.settings.fullscreen)
+        # setting window's title
+        window_settings.set_title(shared.game_data.name)
+        # applying settings to our window
+        self.win.request_properties(window_settings)
+        log.debug(f"Resolution has been set to {shared.settings.window_size}")
+
+        # turning on fps meter, in case its enabled in settings
+        base.setFrameRateMeter(shared.settings.fps_meter)
+
+        # change background color to black. #TODO: move this to map generation,
+        # make it possible to set to other values, aswell as pictures
+        self.win.set_clear_color((0, 0, 0, 1))
 
     def start_game(self, player_class, map_scale):
         """Hide main menu frame and load up the level"""
@@ -175,6 +230,13 @@ class GameWindow(ShowBase):
         # scene, it will be usefull to call switch here to show loading screen
         # self.main_menu.hide()
 
+        # level cant be built without entities' data. Waiting for it to load
+        if shared.archetypes is None:
+            log.debug("Assets are still loading, level will start afterwards")
+            self.requested_level = (player_class, map_scale)
+            shared.ui.switch("loading")
+            return
+
         shared.level = level_loader.LoadLevel(player_class, map_scale)
 
     def exit_game(self):
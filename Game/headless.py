@@ -0,0 +1,142 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module dedicated to headless runs of the game. These have no window, use clock
+# that moves with fixed steps, seeded randomness and player controlled by script.
+# Thus the same seed will always give the same results, which makes it possible
+# to benchmark and regression-test simulation without anyone playing
+
+import logging
+from hashlib import sha1
+from time import perf_counter
+import numpy as np
+from panda3d.core import ClockObject, ModelNode, Vec2, loadPrcFileData
+from Game.common import shared
+from Game import entity2d, game_window, level_loader, simulation
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TICKS = 3600
+DEFAULT_MAP_SCALE = 1
+
+
+class ScriptedPlayer(entity2d.Player):
+    """Player that stands still and keeps attacking the closest enemy, instead
+    of being controlled by keyboard and mouse. Enemies chase it, thus each run
+    goes through fights, damage, deaths and wave changes"""
+
+    def get_mouse_vector(self, event):
+        """Simulation's routine that aims at the closest enemy and holds attack
+        button while there are any enemies around"""
+        if self.dead:
+            return
+
+        store = self.store
+        enemies = store.select(category=shared.game_data.enemy_category)
+        if len(enemies):
+            vectors = store.position[enemies] - store.position[self.slot]
+            closest = vectors[np.argmin(np.einsum("ij,ij->i", vectors, vectors))]
+            vector = Vec2(*closest)
+            if vector.length():
+                self.mouse_vector = vector.normalized()
+                # same as mouse being on the right or left side of screen
+                if self.mouse_vector[0] < 0:
+                    self.change_direction("right")
+                else:
+                    self.change_direction("left")
+
+        controls = shared.level.controls_status
+        for key in controls:
+            controls[key] = False
+        controls["attack"] = bool(len(enemies))
+
+        return event.cont
+
+
+def get_checksum(entities: entity2d.EntityStore) -> str:
+    """Get checksum of state of all the entities in storage"""
+    checksum = sha1()
+    for column in ("position", "hp", "flags"):
+        checksum.update(getattr(entities, column)[: entities.size].tobytes())
+    return checksum.hexdigest()
+
+
+def run(
+    seed: int,
+    ticks: int = DEFAULT_TICKS,
+    player_class: str = None,
+    map_scale: int = DEFAULT_MAP_SCALE,
+) -> dict:
+    """Run level for provided amount of simulation ticks without window and
+    return the stats of run. Stops earlier if player dies"""
+    loadPrcFileData(
+        "headless",
+        """
+        window-type none
+        audio-library-name null
+        """,
+    )
+    shared.rng.seed(seed)
+
+    # there is no menu to interact with, thus no point to load in background
+    game = game_window.GameWindow(background_loading=False)
+    # without window, showbase doesnt make camera. But level needs one to follow
+    # the player around
+    if game.camera is None:
+        game.camera = game.render.attach_new_node(ModelNode("camera"))
+
+    # each frame is exactly one simulation tick long, regardless of how long it
+    # actually took to process it
+    clock = ClockObject.get_global_clock()
+    clock.set_mode(ClockObject.M_non_real_time)
+    clock.set_frame_rate(simulation.TICK_RATE)
+
+    # picking the first class in alphabetical order, since order of files on
+    # disk may differ between systems
+    player_class = player_class or sorted(shared.assets.classes)[0]
+    log.info(f"Running {ticks} ticks as {player_class} with seed {seed}")
+    level = level_loader.LoadLevel(
+        player_class,
+        map_scale,
+        player_type=ScriptedPlayer,
+        record_scores=False,
+        # time-based budget would make amount of spawns per frame depend on
+        # speed of machine, and thus break determinism
+        spawn_budget=None,
+    )
+    shared.level = level
+
+    started = perf_counter()
+    while level.simulation.tick.number < ticks and not level.player.dead:
+        game.task_mgr.step()
+    elapsed = perf_counter() - started
+
+    result = {
+        "seed": seed,
+        "ticks": level.simulation.tick.number,
+        "wave": level.wave_number,
+        "kills": level.kill_counter,
+        "score": level.score,
+        "hp": level.player.stats["hp"],
+        "player_dead": level.player.dead,
+        "checksum": get_checksum(level.entities),
+    }
+    for key, value in result.items():
+        log.info(f"{key}: {value}")
+    # not part of result, since it naturally differs between runs
+    log.info(f"Simulated in {elapsed:.2f}s")
+
+    return result
@@ -417,6 +417,17 @@ class PlayerHUD(Menu):
             duration=2.5,
         )
 
+        # values displayed above. Texts are only updated when values change
+        self.model = HUDModel(
+            {
+                "hp": self.update_hp,
+                "score": self.update_score,
+                "score_multiplier": self.update_multiplier,
+                "enemy_amount": self.update_enemy_counter,
+                "wave_number": self.update_current_wave,
+            }
+        )
+
     def show_new_wave_msg(self, wave_number: int, kill_requirement: int):
         """Inform player about begining of new wave and its clear conditions"""
         log.debug("Showing new wave messages")
@@ -425,9 +436,9 @@ class PlayerHUD(Menu):
         self.new_wave_msg.show()
         self.kill_req_msg.show()
 
-    def update_hp(self, value: int):
+    def update_hp(self, value: float):
         """Update self.player_hp to provided value"""
-        self.player_hp.setText(str(value))
+        self.player_hp.setText(f"{value:g}")
 
     def update_score(self, value: int):
         """Update self.score to provided value"""
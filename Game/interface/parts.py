@@ -19,7 +19,13 @@
 import logging
 from panda3d.core import NodePath
 from direct.gui.OnscreenText import OnscreenText, TextNode
-from direct.gui.DirectGui import DirectButton, DirectLabel, DirectSlider, DGG
+from direct.gui.DirectGui import (
+    DirectButton,
+    DirectLabel,
+    DirectSlider,
+    DirectWaitBar,
+    DGG,
+)
 
 # from direct.gui.OnscreenImage import OnscreenImage
 
@@ -76,7 +82,7 @@ class TextMsg:
 
 
 class LoadingScreen(TextMsg):
-    """Simple loading screen.
+    """Simple loading screen with progress bar.
     Meant to be used when we do some calculations that may slow/freeze game
     window (such as level loading)
     """
@@ -86,8 +92,48 @@ class LoadingScreen(TextMsg):
         if not "text" in kwargs:
             kwargs["text"] = "Loading..."
 
+        # todo: add configurable bg image
+        # bar is made before parent's init, coz that one calls self.hide()
+        self.bar = DirectWaitBar(
+            range=1,
+            value=0,
+            pos=(0, 0, -0.2),
+            frameSize=(-0.8, 0.8, -0.02, 0.02),
+            frameColor=(0.2, 0.2, 0.2, 1),
+            barColor=(1, 1, 1, 1),
+            parent=base.aspect2d,
+        )
+        self.bar.hide()
+        # progress bar is only shown after first call of set_progress, since
+        # for stuff like level loading there is no progress to report
+        self.has_progress = False
+
         super().__init__(**kwargs)
-        # todo: add configurable bg image, maybe progress bar
+
+    def set_progress(self, value: float, text: str = None):
+        """Set progress bar's value (from 0 to 1) and, optionally, message"""
+        self.has_progress = True
+        self.bar["value"] = value
+        if text is not None:
+            self.set_text(text)
+        if not self.msg.is_hidden():
+            self.bar.show()
+
+    def reset_progress(self):
+        """Hide progress bar and restore default message"""
+        self.has_progress = False
+        self.bar["value"] = 0
+        self.bar.hide()
+        self.set_text("Loading...")
+
+    def hide(self):
+        super().hide()
+        self.bar.hide()
+
+    def show(self):
+        super().show()
+        if self.has_progress:
+            self.bar.show()
 
 
 class Popup(TextMsg):
@@ -233,3 +279,53 @@ class Menu:
     def show(self):
         """Show menu"""
         self.frame.show()
+
+
+class HUDModel:
+    """Storage of values shown by hud. Changing value doesnt update text right
+    away - it only marks value as changed, and its text gets updated on the next
+    call of flush(). Thus no matter how many times value changes during frame,
+    its text gets regenerated just once, and unchanged values cost nothing"""
+
+    def __init__(self, renderers: dict):
+        # functions that update text of each field, by field names
+        self.renderers = renderers
+        self.values = {}
+        # names of fields that have been changed since last flush
+        self.dirty = set()
+
+    def set(self, field: str, value):
+        """Set value of provided field, marking it as changed if its different"""
+        if field in self.values and self.values[field] == value:
+            return
+        self.values[field] = value
+        self.dirty.add(field)
+
+    def get(self, field: str, default=None):
+        """Get value of provided field"""
+        return self.values.get(field, default)
+
+    def flush(self):
+        """Update text of all fields that have changed since last call"""
+        if not self.dirty:
+            return
+        for field in self.dirty:
+            self.renderers[field](self.values[field])
+        self.dirty.clear()
+
+
+class HUDField:
+    """Descriptor of attribute, which value is stored in owner's hud_model.
+    Makes it possible to keep plain attribute syntax (say, level.score += 1),
+    while hud gets notified about each change"""
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.hud_model.get(self.name)
+
+    def __set__(self, instance, value):
+        instance.hud_model.set(self.name, value)
@@ -17,14 +17,20 @@
 # module dedicated to manage per-level stuff
 
 import logging
-from panda3d.core import CollisionTraverser, CollisionHandlerEvent, PandaNode, Vec3
-from time import time
-from random import randint, choice
-from Game import entity2d, map_loader, shared, interface, collision_events
+from collections import deque
+from time import perf_counter
+from panda3d.core import PandaNode, Vec3
+from Game import (
+    entity2d,
+    map_loader,
+    shared,
+    interface,
+    collision_events,
+    simulation,
+)
 
 log = logging.getLogger(__name__)
 
-DEAD_CLEANUP_TIME = 5
 DEFAULT_SCORE_VALUE = 0
 DEFAULT_SCORE_MULTIPLIER = 1
 MAX_SCORE_MULTIPLIER = 5  # maybe just make it MULTIPLIER_INCREASE_STEP*10 ?
@@ -36,122 +42,126 @@ DEFAULT_ENEMIES_AMOUNT = 10
 PAUSE_BETWEEN_WAVES = 3
 # maximum amount of enemies on screen
 MAX_ENEMY_COUNT = 30
-# pause between spawn checks
+# pause between bursts of spawned enemies
 ENEMY_SPAWN_TIME = 2
+# max amount of enemies spawned together as a single group
+SPAWN_BURST_SIZE = 4
+# groups are spread among this many spawnpoints, furthest from player
+SPAWN_AMONG_FURTHEST = 2
+# max amount of seconds per tick, spent on spawning enemies. Enemies of group
+# that didnt fit into it get spawned on the next ticks
+SPAWN_TIME_BUDGET = 0.002
+# max amount of enemies spawned per tick, regardless of the above
+MAX_SPAWNS_PER_TICK = 4
+# max amount of enemies created in advance per tick, during pause between waves
+PREWARMED_ENEMIES_PER_TICK = 1
 
 # chance of unique enemy to spawn, in %
 UNIQUE_ENEMY_CHANCE = 25
 
 
+class WaveScheduler:
+    """Spreads spawns of wave's enemies over ticks. Each pause seconds, forms
+    a group of up to burst_size enemies, then spawns them as long as tick's
+    time budget allows. Pause is counted with leftovers, so the rate of spawns
+    doesnt depend on tick rate. Budget of None disables time limit, which
+    makes amount of spawns per tick depend on nothing but game's state"""
+
+    def __init__(
+        self,
+        spawn,
+        get_spawnpoints,
+        pause: float = ENEMY_SPAWN_TIME,
+        burst_size: int = SPAWN_BURST_SIZE,
+        max_alive: int = MAX_ENEMY_COUNT,
+        budget: float = SPAWN_TIME_BUDGET,
+        max_per_tick: int = MAX_SPAWNS_PER_TICK,
+    ):
+        # function that spawns enemy on provided position
+        self.spawn = spawn
+        # function that returns list of positions for group of provided size
+        self.get_spawnpoints = get_spawnpoints
+        self.pause = pause
+        self.burst_size = burst_size
+        self.max_alive = max_alive
+        self.budget = budget
+        self.max_per_tick = max_per_tick
+
+        # amount of enemies that havent been added to groups yet
+        self.remaining = 0
+        # positions of enemies of current group, that havent been spawned yet
+        self.queue = deque()
+        self.timer = pause
+
+    @property
+    def done(self) -> bool:
+        """True if all enemies of wave have been spawned"""
+        return self.remaining <= 0 and not self.queue
+
+    def start(self, amount: int):
+        """Begin spawning the wave of provided amount of enemies"""
+        self.remaining = amount
+        self.queue.clear()
+        self.timer = self.pause
+
+    def update(self, dt: float, alive: int) -> int:
+        """Form new group if its time to, then spawn whatever fits into tick's
+        budget. Receives amount of enemies alive, returns amount of spawned"""
+        if self.done:
+            return 0
+
+        self.timer -= dt
+        if self.timer <= 0 and not self.queue and self.remaining > 0:
+            amount = min(self.burst_size, self.remaining, self.max_alive - alive)
+            if amount > 0:
+                log.debug(f"Forming group of {amount} enemies")
+                self.queue.extend(self.get_spawnpoints(amount))
+                self.remaining -= amount
+                self.timer += self.pause
+            else:
+                # arena is full - spawning next group as soon as there is space
+                self.timer = 0
+
+        started = perf_counter()
+        spawned = 0
+        while self.queue and spawned < self.max_per_tick:
+            self.spawn(self.queue.popleft())
+            spawned += 1
+            if self.budget is not None and perf_counter() - started > self.budget:
+                break
+
+        return spawned
+
+
 class LoadLevel:
-    def __init__(self, player_class, map_scale: int):
+    # values displayed on player's hud. Changing them makes hud update related
+    # texts on the next frame
+    score = interface.HUDField()
+    score_multiplier = interface.HUDField()
+    enemy_amount = interface.HUDField()
+    wave_number = interface.HUDField()
+
+    def __init__(
+        self,
+        player_class,
+        map_scale: int,
+        player_type=entity2d.Player,
+        record_scores: bool = True,
+        spawn_budget: float = SPAWN_TIME_BUDGET,
+    ):
         shared.ui.switch("loading")
+        # entities attach themselves to level's simulation on spawn, which happens
+        # before GameWindow will get the chance to assign us to shared storage
+        shared.level = self
         self.map_scale = map_scale
         self.player_class = player_class
-        # doing it there before everything else to avoid issues during generation
-        # of walls and entity objects
-        log.debug("Setting up collision processors")
-        base.cTrav = CollisionTraverser()
-        base.chandler = CollisionHandlerEvent()
-        # showing all occuring collisions. This is debatably better than manually
-        # enabling collision.show() for each entity entry
-        if shared.settings.show_collisions:
-            base.cTrav.show_collisions(render)
-
-        # this way we are basically naming the events we want to track, so these
-        # will be possible to handle via base.accept and do the stuff accordingly
-        # "in" is what happens when one object start colliding with another
-        # "again" is if object continue to collide with another
-        # "out" is when objects stop colliding
-        base.chandler.addInPattern("%fn-into-%in")
-        base.chandler.addAgainPattern("%fn-again-%in")
-        # we dont need this one there
-        # base.pusher.addOutPattern('%fn-out-%in')
-
-        # tracking all the collision events related to instances of player colliding
-        # with enemy projectile and causing related function to trigger on these
-        base.accept(
-            f"{shared.game_data.player_category}-into-{shared.game_data.enemy_projectile_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.player_category],
-        )
-        base.accept(
-            f"{shared.game_data.enemy_projectile_category}-into-{shared.game_data.player_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.player_category],
-        )
-        base.accept(
-            f"{shared.game_data.player_category}-again-{shared.game_data.enemy_projectile_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.player_category],
-        )
-        base.accept(
-            f"{shared.game_data.enemy_projectile_category}-again-{shared.game_data.player_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.player_category],
-        )
-
-        # also tracking collisions of enemy with player's attack projectile
-        base.accept(
-            f"{shared.game_data.player_projectile_category}-into-{shared.game_data.enemy_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.enemy_category],
-        )
-        base.accept(
-            f"{shared.game_data.enemy_category}-into-{shared.game_data.player_projectile_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.enemy_category],
-        )
-        base.accept(
-            f"{shared.game_data.player_projectile_category}-again-{shared.game_data.enemy_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.enemy_category],
-        )
-        base.accept(
-            f"{shared.game_data.enemy_category}-again-{shared.game_data.player_projectile_category}",
-            collision_events.creature_with_projectile,
-            [shared.game_data.enemy_category],
-        )
-
-        # tracking collisions with map borders, in order to create custom
-        # pusher-like behaviour with collisioneventhandler
-        base.accept(
-            f"{shared.game_data.player_category}-into-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-        base.accept(
-            f"{shared.game_data.player_category}-again-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-        base.accept(
-            f"{shared.game_data.enemy_category}-into-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-        base.accept(
-            f"{shared.game_data.enemy_category}-again-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-
-        # same for projectiles
-        base.accept(
-            f"{shared.game_data.player_projectile_category}-into-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-        base.accept(
-            f"{shared.game_data.enemy_projectile_category}-into-{shared.game_data.border_category}",
-            collision_events.entity_with_border,
-        )
-
-        # pushing enemies from eachother
-        base.accept(
-            f"{shared.game_data.enemy_category}-into-{shared.game_data.enemy_category}",
-            collision_events.entity_with_entity,
-        )
-        base.accept(
-            f"{shared.game_data.enemy_category}-again-{shared.game_data.enemy_category}",
-            collision_events.entity_with_entity,
-        )
-
+        # class of player's entity. Can be overriden to, say, control player
+        # by script instead of keyboard
+        self.player_type = player_type
+        # whether score should be added to leaderboards on player's death
+        self.record_scores = record_scores
+        # max seconds per tick spent on spawning enemies, see WaveScheduler
+        self.spawn_budget = spawn_budget
         log.debug("Setting up camera")
         # this will set camera to be right above card.
         # changing first value will rotate the floor
@@ -163,6 +173,7 @@ class LoadLevel:
 
         log.debug("Initializing UI")
         self.player_hud = interface.PlayerHUD()
+        self.hud_model = self.player_hud.model
 
         # initializing death screen
         def show_lb():
@@ -178,11 +189,6 @@ class LoadLevel:
         shared.ui.add(self.player_hud, "player hud")
         shared.ui.add(self.death_screen, "death screen")
 
-        log.debug("Initializing handlers")
-        # task manager is function that runs on background each frame and execute
-        # whatever functions are attached to it
-        base.task_mgr.add(self.remove_dead, "remove dead")
-
         # dictionary that stores default state of keys
         self.controls_status = {
             "move_up": False,
@@ -271,6 +277,60 @@ class LoadLevel:
         )
         self.map.generate()
 
+        log.debug("Initializing simulation")
+        # all the entities will attach their routines to it, instead of running
+        # as separate taskmanager tasks. Its done there and not in init, so each
+        # restart will get a clean one. Same goes for storage of entities' data
+        self.entities = entity2d.EntityStore()
+        self.simulation = simulation.Simulation(self.entities)
+        # running it after events have been processed, so it will receive up to
+        # date controls status, but before camera follower to avoid jittering
+        base.task_mgr.add(self.simulation.update, "simulation", sort=1)
+        # contacts found by collision engine are passed to handlers in batches,
+        # by pairs of categories. Which pairs collide at all is decided by matrix
+        self.collisions = collision_events.CollisionDispatcher(
+            self.entities,
+            collision_events.get_collision_matrix(),
+            collision_events.get_categories(),
+        )
+        # every entity is a circle on the floor's plane, thus instead of panda's
+        # traverser, collisions are found by our own engine, once per tick
+        self.physics = entity2d.CollisionEngine(
+            self.entities,
+            self.collisions.dispatch,
+            self.collisions.from_masks,
+            self.collisions.into_masks,
+        )
+        self.simulation.add(simulation.COLLISIONS_STAGE, self.physics.update)
+        # crowds of enemies are drawn by instancing their sprites. Done after
+        # simulation, so these will be drawn at already interpolated positions
+        self.sprites = entity2d.SpriteRenderer(self.entities)
+        base.task_mgr.add(self.sprites.update, "sprite renderer", sort=2)
+        # dead projectiles are kept there to be reused by next casts of skills
+        self.projectile_pool = entity2d.EntityPool(self.simulation)
+        # same for enemies, which corpses get reused after rotting away
+        self.enemy_pool = entity2d.EntityPool(self.simulation)
+        # all enemies share the same brain, processed in one go each tick
+        self.ai = entity2d.ChaserAI(self.entities, shared.game_data.enemy_category)
+        self.simulation.add(simulation.AI_STAGE, self.ai.update)
+        # same goes for projectiles, which all fly and expire together
+        self.projectiles = entity2d.ProjectileKinematics(self.entities)
+        self.simulation.add(simulation.LIFETIMES_STAGE, self.projectiles.expire)
+        self.simulation.add(simulation.MOVEMENT_STAGE, self.projectiles.update)
+        # pushing enemies from eachother. Its not done with collision events, coz
+        # checking each pair of enemies would be way too slow on large crowds
+        self.crowd = entity2d.CrowdSeparation(
+            self.entities, shared.game_data.enemy_category
+        )
+        self.simulation.add(simulation.COLLISIONS_STAGE, self.crowd.update)
+        # keeping everything inside of arena. Done last, so nothing that has been
+        # pushed around by the stuff above could end up outside
+        self.bounds = entity2d.ArenaBounds(self.entities, self.map.map_size)
+        self.simulation.add(simulation.COLLISIONS_STAGE, self.bounds.update)
+        # bounds and separation may move casters after projectiles have been
+        # attached to them, thus attaching these again once everything is done
+        self.simulation.add(simulation.COLLISIONS_STAGE, self.projectiles.attach)
+
         log.debug("Initializing player")
         # variables for spawners to make debugging process easier. Basically,
         # its meant to increase with each new creature of that type and never
@@ -284,24 +344,25 @@ class LoadLevel:
         # setting this lower may cause glitches, as below lies the floor_layer
         # hitbox is adjusted to match our current sprites. In case of change - will
         # need to tweak it manually
-        self.player = entity2d.Player(self.player_class)
+        self.player = self.player_type(self.player_class)
         self.player.spawn(self.map.player_spawnpoint)
         self.player.id = self.player_id
-        self.player.node.set_python_tag("id", self.player.id)
         self.player_id += 1
 
         self.wave_number = 0
         self.enemy_increase = 10
-        self.enemies_this_wave = DEFAULT_ENEMIES_AMOUNT
-        # TODO: rework this thing to spawn multiple enemies per tick
-        self.enemy_spawn_timer = ENEMY_SPAWN_TIME
+        self.spawner = WaveScheduler(
+            self.spawn_enemy,
+            self.get_spawnpoints,
+            budget=self.spawn_budget,
+        )
         self.pause_between_waves = PAUSE_BETWEEN_WAVES
 
-        # these will be our lists to store enemies and projectiles to reffer to
-        self.enemies = []
-        self.projectiles = []
-        # and this is amount of time, per which dead objects get removed from these
-        self.cleanup_timer = DEAD_CLEANUP_TIME
+        # this will be our registry to store enemies to reffer to. Projectiles
+        # are kept by self.projectile_pool instead. Enemies whose corpses have
+        # rotten get removed from it at the end of tick they did so
+        self.enemies = entity2d.EntityRegistry()
+        self.simulation.add(simulation.COLLISIONS_STAGE, self.enemies.flush)
 
         # amount of enemies, killed by player
         self.kill_counter = 0
@@ -337,106 +398,93 @@ class LoadLevel:
 
         shared.music_player.crossfade(shared.assets.music["battle"])
 
-        # its important to sync items there, otherwise they will show incorrect
-        # values before related event occurs for first time
-        # self.update_player_hud()
+        # player's hp isnt level's attribute, thus its pushed to hud manually
+        # on each change. Other hud fields get there on assignment
+        self.hud_model.set("hp", self.player.stats["hp"])
         base.task_mgr.add(self.update_player_hud, "player hud autoupdater")
         shared.ui.switch("player hud")
 
-        base.task_mgr.add(self.wave_changer, "wave changer")
+        # waves are processed by simulation, so their timing only depends on
+        # amount of ticks that have passed and not on frame rate
+        self.simulation.add(simulation.SPAWNS_STAGE, self.wave_changer)
 
         # enabling self.player_follower to autoupdate
-        base.task_mgr.add(self.follow_player, "player follower routine for camera")
+        base.task_mgr.add(
+            self.follow_player, "player follower routine for camera", sort=2
+        )
 
     def spawn_enemies(self, event):
-        """If amount of enemies is less than MAX_ENEMY_COUNT: spawns enemy each
-        ENEMY_SPAWN_TIME seconds. Meant to be ran as taskmanager routine"""
+        """Simulation's routine that spawns enemies of current wave, keeping
+        amount of them on screen below MAX_ENEMY_COUNT"""
         # safety check to dont spawn more enemies if player is dead
         if self.player.dead:
             return
 
-        if self.enemies_this_wave <= 0:
+        if self.spawner.done:
             # if not self.enemies:
             if self.enemy_amount <= 0:
                 log.info("Wave cleared, initializing wave changer")
                 self.player_hud.wave_cleared_msg.show()
-                base.task_mgr.add(self.wave_changer, "wave changer")
+                self.simulation.add(simulation.SPAWNS_STAGE, self.wave_changer)
                 return
             return event.cont
 
-        # this clock runs on background and updates each frame
-        # e.g 'dt' will always be the amount of time passed since last frame
-        # and no, "from time import sleep" wont fit for this - game will freeze
-        # because in its core, task manager isnt like multithreading but async
-        dt = globalClock.get_dt()
-
-        # similar method can also be used for skill cooldowns, probably anims stuff
-        self.enemy_spawn_timer -= dt
-        if self.enemy_spawn_timer <= 0:
-            log.debug("Checking if we can spawn enemy")
-            self.enemy_spawn_timer = ENEMY_SPAWN_TIME
-            if self.enemy_amount < MAX_ENEMY_COUNT:
-                log.debug("Initializing enemy")
-                # determining the distance to player from each spawnpoint and
-                # spawning enemies on the furthest. Depending on map type, it may be
-                # not best behavior. But for now it will do, as it solves the issue
-                # with enemies spawning on top of player if player is sitting at
-                # map's very corner. #TODO: add more "pick spawnpoint" variations
-                player_position = self.player.node.get_pos()
-
-                spawns = []
-                for spawnpoint in self.map.enemy_spawnpoints:
-                    spawn = *spawnpoint, shared.game_data.entity_layer
-                    vec_to_player = player_position - spawn
-                    vec_length = vec_to_player.length()
-                    # spawns.append((vec_length, spawn))
-                    spawns.append((vec_length, spawnpoint))
-
-                # sort spawns by the very first number in tuple (which is lengh)
-                spawns.sort()
-
-                # picking up the spawn from last list's entry (e.g the furthest from player)
-                # spawn_position = spawns[-1][1]
-                spawn_xy = spawns[-1][1]
-
-                # determining type of enemy to spawn
-                spawn_chance = randint(0, 100)
-                if spawn_chance < UNIQUE_ENEMY_CHANCE:
-                    # for now there are only 2 types of enemies, choosing from them
-                    affix = choice(("Big", "Small"))
-                    # nasty workaround to avoid flying of small enemies and falling
-                    # through the floor of big enemies. Once I will implement floor
-                    # collision, this can be removed. #TODO
-                    if affix == "Small":
-                        spawn_position = *spawn_xy, shared.game_data.entity_layer / 2
-                    else:
-                        spawn_position = *spawn_xy, shared.game_data.entity_layer * 2
-                else:
-                    affix = "Normal"
-                    spawn_position = *spawn_xy, shared.game_data.entity_layer
-
-                enemy_type = "Cuboid"
-                log.debug(f"Spawning {affix} {enemy_type} on {spawn_position}")
-                enemy = entity2d.Enemy(name=enemy_type, affix=affix)
-                enemy.spawn(spawn_position)
-                enemy.id = self.enemy_id
-                enemy.node.set_python_tag("id", enemy.id)
-                self.enemy_id += 1
-                self.enemy_amount += 1
-                self.enemies_this_wave -= 1
-                self.enemies.append(enemy)
-                log.debug(f"There are currently {self.enemy_amount} enemies on screen")
+        # dt is fixed length of simulation's tick, thus spawns happen at the
+        # same ticks regardless of how fast the game runs
+        self.spawner.update(event.dt, self.enemy_amount)
 
         return event.cont
 
+    def get_spawnpoints(self, amount: int) -> list:
+        """Get positions for group of provided amount of enemies"""
+        # spreading groups among spawnpoints, furthest from player. Depending
+        # on map type, it may be not best behavior. But for now it will do, as it
+        # solves the issue with enemies spawning on top of player if player is
+        # sitting at map's very corner
+        return self.map.spawn_index.pick(
+            self.player.position, amount=amount, among=SPAWN_AMONG_FURTHEST
+        )
+
+    def spawn_enemy(self, spawn_xy: tuple):
+        """Spawn random enemy on provided (x, y) position"""
+        # determining type of enemy to spawn
+        spawn_chance = shared.rng.randint(0, 100)
+        if spawn_chance < UNIQUE_ENEMY_CHANCE:
+            # for now there are only 2 types of enemies, choosing from them
+            affix = shared.rng.choice(("Big", "Small"))
+            # nasty workaround to avoid flying of small enemies and falling
+            # through the floor of big enemies. Once I will implement floor
+            # collision, this can be removed. #TODO
+            if affix == "Small":
+                spawn_position = *spawn_xy, shared.game_data.entity_layer / 2
+            else:
+                spawn_position = *spawn_xy, shared.game_data.entity_layer * 2
+        else:
+            affix = "Normal"
+            spawn_position = *spawn_xy, shared.game_data.entity_layer
+
+        enemy_type = "Cuboid"
+        log.debug(f"Spawning {affix} {enemy_type} on {spawn_position}")
+        enemy = self.enemy_pool.get(
+            (enemy_type, affix),
+            lambda: entity2d.Enemy(name=enemy_type, affix=affix),
+        )
+        enemy.spawn(spawn_position)
+        enemy.id = self.enemy_id
+        self.enemy_id += 1
+        self.enemy_amount += 1
+        enemy.handle = self.enemies.add(enemy)
+        log.debug(f"There are currently {self.enemy_amount} enemies on screen")
+
     def wave_changer(self, event):
-        """Taskmanager routine that runs between waves"""
+        """Simulation's routine that runs between waves"""
         if self.player.dead:
             return
 
-        dt = globalClock.get_dt()
+        # using the pause to create enemies of the next wave in advance
+        self.prewarm_enemies(self.wave_number + 1)
 
-        self.pause_between_waves -= dt
+        self.pause_between_waves -= event.dt
         if self.pause_between_waves > 0:
             return event.cont
 
@@ -444,51 +492,46 @@ class LoadLevel:
         self.pause_between_waves = PAUSE_BETWEEN_WAVES
         self.wave_number += 1
 
-        # this formula is questionable at best, but for now it will do
-        self.enemies_this_wave = int(
-            (DEFAULT_ENEMIES_AMOUNT / 100) * self.enemy_increase * self.wave_number
-        )
-        # ensuring that no empty waves can occur
-        if self.enemies_this_wave <= 1:
-            self.enemies_this_wave = 1
+        enemies_this_wave = self.get_wave_size(self.wave_number)
+        self.spawner.start(enemies_this_wave)
 
         self.enemy_increase += int(self.enemy_increase / self.wave_number)
         log.debug(f"Enemy increase has been set to {self.enemy_increase}")
 
         # todo: show message about beginning of new wave
-        log.info(
-            f"Starting wave {self.wave_number} with {self.enemies_this_wave} enemies"
-        )
+        log.info(f"Starting wave {self.wave_number} with {enemies_this_wave} enemies")
         self.player_hud.show_new_wave_msg(
-            wave_number=self.wave_number, kill_requirement=self.enemies_this_wave
+            wave_number=self.wave_number, kill_requirement=enemies_this_wave
         )
-        base.task_mgr.add(self.spawn_enemies, "enemy spawner")
+        self.simulation.add(simulation.SPAWNS_STAGE, self.spawn_enemies)
         return
 
-    def remove_dead(self, event):
-        """Designed to run as taskmanager routine. Each self.cleanup_timer secs,
-        remove all dead enemies and projectiles from related lists"""
-        # shutdown the task if player has died, coz there is no point
-        if self.player.dead:
-            return
-
-        dt = globalClock.get_dt()
-        self.cleanup_timer -= dt
-        if self.cleanup_timer > 0:
-            return event.cont
-
-        self.cleanup_timer = DEAD_CLEANUP_TIME
-        log.debug(f"Cleaning up dead entities from memory")
-        for entity in self.enemies:
-            # if entity.dead:
-            if entity.can_be_removed:
-                self.enemies.remove(entity)
-
-        for entity in self.projectiles:
-            if entity.dead:
-                self.projectiles.remove(entity)
-
-        return event.cont
+    def get_wave_size(self, wave_number: int) -> int:
+        """Get amount of enemies that will be spawned on provided wave"""
+        # this formula is questionable at best, but for now it will do
+        amount = int((DEFAULT_ENEMIES_AMOUNT / 100) * self.enemy_increase * wave_number)
+        # ensuring that no empty waves can occur
+        return max(amount, 1)
+
+    def prewarm_enemies(self, wave_number: int):
+        """Create some of enemies, expected to be on screen at once during
+        provided wave. Only PREWARMED_ENEMIES_PER_TICK are created per call"""
+        amount = min(self.get_wave_size(wave_number), MAX_ENEMY_COUNT)
+        # roughly splitting enemies between affixes, based on their spawn chances
+        unique = int(amount * UNIQUE_ENEMY_CHANCE / 100 / 2)
+        affixes = (("Normal", amount - unique), ("Big", unique), ("Small", unique))
+
+        enemy_type = "Cuboid"
+        budget = PREWARMED_ENEMIES_PER_TICK
+        for affix, affix_amount in affixes:
+            budget -= self.enemy_pool.prewarm(
+                (enemy_type, affix),
+                lambda: entity2d.Enemy(name=enemy_type, affix=affix),
+                affix_amount,
+                limit=budget,
+            )
+            if budget <= 0:
+                return
 
     def increase_score(self, amount):
         """Increase score variable and displayed score amount by int(amount * self.score_multiplier)"""
@@ -520,17 +563,11 @@ class LoadLevel:
 
     def update_player_hud(self, event):
         """Meant to be ran as taskmanager routine.
-        Update all player hud elements to be in sync"""
-        # todo: remake this into taskmanager thing that runs each frame
-        # this way, there will be no need for dozen of other functions above
+        Update hud elements which values have changed since last frame"""
         if self.player.dead:
             return
 
-        self.player_hud.update_hp(self.player.stats["hp"])
-        self.player_hud.update_enemy_counter(self.enemy_amount)
-        self.player_hud.update_multiplier(self.score_multiplier)
-        self.player_hud.update_score(self.score)
-        self.player_hud.update_current_wave(self.wave_number)
+        self.player_hud.model.flush()
 
         return event.cont
 
@@ -546,11 +583,12 @@ class LoadLevel:
         shared.music_player.crossfade(shared.assets.music["death"])
 
         # interface.switch(self.death_screen)
-        shared.user_data.update_leaderboard(
-            score=self.score,
-            player_class=self.player_class,
-        )
-        shared.user_data.save_leaderboards()
+        if self.record_scores:
+            shared.user_data.update_leaderboard(
+                score=self.score,
+                player_class=self.player_class,
+            )
+            shared.user_data.save_leaderboards()
 
         shared.ui.switch("death screen")
 
@@ -565,6 +603,10 @@ class LoadLevel:
         # Otherwise it will keep showing player's remains regardless of stuff below
         base.camera.reparent_to(render)
 
+        # stopping simulation, so it wont try to process removed entities
+        base.task_mgr.remove("simulation")
+        base.task_mgr.remove("sprite renderer")
+
         # this magic function remove all the nodes from scene, nullifying the need
         # to manually call .die() for each enemy and projectile. There is a caveat
         # tho - if I will ever attach some gui part of similar thing to base.render,
@@ -576,7 +618,11 @@ class LoadLevel:
 
         self.player = None
         self.enemies = None
-        self.projectiles = None
+        self.projectile_pool = None
+        self.enemy_pool = None
+        self.sprites = None
+        self.collisions = None
+        self.physics = None
 
     def exit_level(self):
         """Exit level to main menu"""
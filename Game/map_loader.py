@@ -15,12 +15,10 @@
 ## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
 
 import logging
+import numpy as np
 from panda3d.core import (
     CardMaker,
     TextureStage,
-    CollisionPlane,
-    Plane,
-    CollisionNode,
     SamplerState,
     Texture,
 )
@@ -31,6 +29,67 @@ log = logging.getLogger(__name__)
 # module where I specify everything related to generating and loading maps
 
 
+class SpawnIndex:
+    """Spawnpoints of map, stored in a way that allows to quickly find these far
+    enough from provided position. Weights are optional and make some of
+    spawnpoints be picked more often than others"""
+
+    def __init__(self, spawnpoints: list, weights: list = None):
+        self.spawnpoints = list(spawnpoints)
+        self.points = np.array(self.spawnpoints, dtype=np.float32).reshape(-1, 2)
+        self.weights = None
+        if weights is not None:
+            self.weights = np.array(weights, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.spawnpoints)
+
+    def get_distances(self, position) -> np.ndarray:
+        """Get squared distances from provided (x, y) position to each spawnpoint"""
+        vectors = self.points - (position[0], position[1])
+        return np.einsum("ij,ij->i", vectors, vectors)
+
+    def farthest(self, position) -> tuple:
+        """Get spawnpoint, farthest from provided position"""
+        return self.spawnpoints[int(np.argmax(self.get_distances(position)))]
+
+    def get_farthest(
+        self, position, amount: int, distances: np.ndarray = None
+    ) -> np.ndarray:
+        """Get indexes of provided amount of spawnpoints, farthest from position.
+        These are not sorted, since there is no need to"""
+        if amount >= len(self):
+            return np.arange(len(self))
+        if distances is None:
+            distances = self.get_distances(position)
+        # partitioning instead of sorting, coz we only need to know which ones
+        # are the farthest and not their order
+        return np.argpartition(-distances, amount - 1)[:amount]
+
+    def pick(self, position, amount: int = 1, among: int = 1) -> list:
+        """Pick provided amount of spawnpoints among `among` farthest from
+        position. The farther spawnpoint is, the more often it gets picked, on
+        top of its own weight. Same spawnpoint may be picked multiple times, if
+        there are not enough of them"""
+        distances = self.get_distances(position)
+        candidates = self.get_farthest(position, among, distances)
+        if len(candidates) == 1:
+            return [self.spawnpoints[candidates[0]]] * amount
+
+        # sorting candidates themselves, to make picks not depend on how
+        # argpartition has ordered them
+        candidates = np.sort(candidates)
+        weights = np.sqrt(distances[candidates])
+        if self.weights is not None:
+            weights = weights * self.weights[candidates]
+        if not weights.any():
+            weights = None
+        else:
+            weights = weights.tolist()
+        picked = shared.rng.choices(candidates.tolist(), weights=weights, k=amount)
+        return [self.spawnpoints[i] for i in picked]
+
+
 class FlatMap:
     """Generate flat map with provided settings"""
 
@@ -49,6 +108,8 @@ class FlatMap:
         self.map_size = None
         self.floor = None
         self.enemy_spawnpoints = None
+        # SpawnIndex of enemy_spawnpoints
+        self.spawn_index = None
         self.player_spawnpoint = None
 
         # attempting to fix "flickering" on movement. This will soap the texture
@@ -72,11 +133,11 @@ class FlatMap:
         self.scene = scene or self.scene
 
         self.create_floor()
-        # TODO: add bool to either generate only some borders or none, to provide
-        # ability to fall/kick enemies into the void. This will require addition
-        # of collision node to floor, aswell as checks to ensure that entity hasnt
-        # fell. Maybe basic gravity, idk
-        self.add_borders()
+        # there are no walls on map's borders. Instead, level keeps entities in
+        # bounds of self.map_size, see entity2d.ArenaBounds
+        # TODO: add bool to disable bounds on some sides, to provide ability to
+        # fall/kick enemies into the void. This will require checks to ensure that
+        # entity hasnt fell. Maybe basic gravity, idk
 
         # TODO: it may be good idea to make these configurable
         self.enemy_spawnpoints = [
@@ -85,6 +146,7 @@ class FlatMap:
             (self.map_size[1], self.map_size[2]),
             (self.map_size[0], self.map_size[3]),
         ]
+        self.spawn_index = SpawnIndex(self.enemy_spawnpoints)
 
         # TODO: make this configurable aswell. For now its just center of map
         self.player_spawnpoint = 0, 0, shared.game_data.entity_layer
@@ -124,26 +186,3 @@ class FlatMap:
         floor_object.set_p(shared.game_data.floor_angle)
         floor_object.set_pos(0, 0, shared.game_data.floor_layer)
         self.floor = floor_object
-
-    def add_borders(self):
-        """Attach invisible walls to map's borders, to avoid falling off map"""
-        log.debug("Adding invisible walls to collide with on map's borders")
-        wall_coordinates = [
-            ((self.map_size[0], 0, 0), (self.map_size[1], 0, 0)),
-            ((-self.map_size[0], 0, 0), (-self.map_size[1], 0, 0)),
-            ((0, self.map_size[2], 0), (0, self.map_size[3], 0)),
-            ((0, -self.map_size[2], 0), (0, -self.map_size[3], 0)),
-        ]
-
-        for sizes in wall_coordinates:
-            wall_node = CollisionNode(shared.game_data.border_category)
-            # it looks like without adding node to pusher (we dont need that there),
-            # masks wont work. Thus for now I wont use them, as defaults seem to work
-            # wall_node.set_collide_mask(BitMask32(shared.WALLS_COLLISION_MASK))
-            wall_node.add_solid(CollisionPlane(Plane(*sizes)))
-            wall = self.scene.attach_new_node(wall_node)
-
-            # adding tag with wall's coordinations, so it will be possible to
-            # push entities back if these collide with wall
-            # because calling .get_pos() will return LPoint3f(0,0,0)
-            wall_node.set_python_tag("position", sizes)
@@ -19,7 +19,7 @@
 import logging
 
 from Game.common import shared
-from Game import game_window
+from Game import game_window, headless
 
 import argparse
 
@@ -69,6 +69,26 @@ ap.add_argument(
         "Override window's Y. Cant be less than " f"{shared.settings.window_size[1]}"
     ),
 )
+ap.add_argument(
+    "--headless",
+    action="store_true",
+    help=(
+        "Run level without window, with scripted player and fixed timestep. "
+        "Results of runs with the same seed are identical"
+    ),
+)
+ap.add_argument(
+    "--seed",
+    type=int,
+    default=0,
+    help="Seed of randomness. Only used in headless mode",
+)
+ap.add_argument(
+    "--ticks",
+    type=int,
+    default=headless.DEFAULT_TICKS,
+    help="Amount of simulation ticks to run. Only used in headless mode",
+)
 args = ap.parse_args()
 
 if args.debug:
@@ -96,6 +116,14 @@ if args.window_y and (args.window_y > shared.settings.window_size[1]):
     win_x = shared.settings.window_size[0]
     shared.settings.window_size = (win_x, args.window_y)
 
+if args.headless:
+    try:
+        headless.run(seed=args.seed, ticks=args.ticks)
+    except Exception as e:
+        log.critical(e)
+        exit(2)
+    exit(0)
+
 play = game_window.GameWindow()
 log.info("Running the game")
 try:
@@ -0,0 +1,126 @@
+## a2s3 - action arena game, written in python + panda3d
+## Copyright (c) 2021 moonburnt
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see https://www.gnu.org/licenses/gpl-3.0.txt
+
+# module dedicated to fixed-timestep simulation. Instead of having each entity
+# register its own taskmanager routines, entities attach their handlers to one
+# of simulation's stages, which then get processed in batches on each tick
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# Amount of simulation ticks per second. Movement speeds in entity configs are
+# specified per tick, so changing this will also change how fast things move
+TICK_RATE = 60
+# Maximum amount of ticks processed per frame. Without it, a long freeze (say,
+# window being dragged around) would cause simulation to endlessly try to catch up
+MAX_TICKS_PER_FRAME = 5
+
+# Stages are processed in that exact order on each tick
+INPUT_STAGE = "input"
+# waves and spawns of enemies
+SPAWNS_STAGE = "spawns"
+AI_STAGE = "ai"
+EFFECTS_STAGE = "effects"
+COOLDOWNS_STAGE = "cooldowns"
+LIFETIMES_STAGE = "lifetimes"
+MOVEMENT_STAGE = "movement"
+# resolving whatever entities have bumped into after moving
+COLLISIONS_STAGE = "collisions"
+
+STAGES = (
+    INPUT_STAGE,
+    SPAWNS_STAGE,
+    AI_STAGE,
+    EFFECTS_STAGE,
+    COOLDOWNS_STAGE,
+    LIFETIMES_STAGE,
+    MOVEMENT_STAGE,
+    COLLISIONS_STAGE,
+)
+
+
+class Tick:
+    """Data passed to stage handlers on each tick.
+    Mimics taskmanager's event, so handlers written as taskmanager routines can
+    keep returning event.cont to stay scheduled, or None to be removed"""
+
+    __slots__ = ("dt", "number", "cont")
+
+    def __init__(self, dt: float):
+        # fixed amount of time that passes with each tick
+        self.dt = dt
+        # amount of ticks processed since simulation's start
+        self.number = 0
+        self.cont = True
+
+
+class Simulation:
+    """Fixed-timestep simulation loop. Meant to be owned by level and ran as its
+    only taskmanager routine, that processes all the level's entities"""
+
+    def __init__(self, entities, tick_rate: int = TICK_RATE):
+        # EntityStore of level. Its positions are the simulated ones, while
+        # entities' nodes are only used to render them
+        self.entities = entities
+        self.tick = Tick(1 / tick_rate)
+        # time that has passed, but hasnt been simulated yet
+        self.accumulator = 0
+        # how far (from 0 to 1) we currently are between two last ticks
+        self.alpha = 0
+
+        self.stages = {}
+        for stage in STAGES:
+            self.stages[stage] = []
+
+    def add(self, stage: str, handler):
+        """Attach handler to provided stage. Handler will receive Tick instance
+        and should return its .cont in order to keep being processed"""
+        self.stages[stage].append(handler)
+
+    def update(self, event):
+        """Taskmanager routine that runs as many ticks as there is time
+        accumulated since last frame, then interpolates positions of nodes"""
+        self.accumulator += globalClock.get_dt()
+
+        ticks = int(self.accumulator / self.tick.dt)
+        if ticks > MAX_TICKS_PER_FRAME:
+            log.debug(f"Simulation is {ticks} ticks behind, skipping some of them")
+            ticks = MAX_TICKS_PER_FRAME
+            self.accumulator = ticks * self.tick.dt
+
+        for _ in range(ticks):
+            # positions from before the tick are used both to interpolate nodes
+            # and to sweep fast entities' paths for collisions
+            self.entities.save_positions()
+            self.step()
+        self.accumulator -= ticks * self.tick.dt
+
+        self.alpha = self.accumulator / self.tick.dt
+        self.entities.sync_nodes(self.alpha)
+
+        return event.cont
+
+    def step(self):
+        """Process all stages once"""
+        tick = self.tick
+        for stage in STAGES:
+            handlers = self.stages[stage]
+            if handlers:
+                # handlers attached during this stage will still be processed,
+                # since list comprehension iterates over the original list
+                self.stages[stage] = [h for h in handlers if h(tick)]
+        tick.number += 1
@@ -18,10 +18,13 @@
 # from toml files. Very WIP, grep for '#TODO's
 
 import logging
-from Game import entity2d, shared
+from Game import entity2d, shared, simulation
 
 log = logging.getLogger(__name__)
 
+# Amount of projectiles of each type created together with skill
+PREWARMED_PROJECTILES = 3
+
 
 class Skill:
     """Class dedicated to entity-independant skills"""
@@ -30,125 +33,58 @@ class Skill:
         # Name of skill
         self.name = name
 
-        # Whoever casts the skill. Based on this, we should eventually calculate
-        # skill's position, skill category, damage and other stuff. Well, actually
-        # we should probably provide other vars for that, but for now, since I have
-        # no idea how to design this whole class yet, Im sticking to that
+        # Creature that casts the skill. Based on this, we should eventually
+        # calculate skill's position, skill category, damage and other stuff. Well,
+        # actually we should probably provide other vars for that, but for now,
+        # since I have no idea how to design this whole class yet, Im sticking to that
         self.caster = caster
-        self.caster_stats = self.caster.get_python_tag("stats")
-
-        # No safety checks rn, will crash if skill has no config file
-        data = shared.assets.skills[self.name]
-        main = data["Main"]
+        self.caster_stats = self.caster.stats
 
-        # data storage class, which we will instance and attach optional variables to
-        class Storage:
-            pass
+        # No safety checks rn, will crash if skill has no config file. Everything
+        # that doesnt depend on caster has been already compiled into archetype
+        self.archetype = shared.archetypes.skills[self.name]
 
         # whatever data we can get from configuration file
-        self.caster_animation = main.get("caster_animation", None)
+        self.caster_animation = self.archetype.caster_animation
 
         # Commented out, since its not supported yet. #TODO
         # self.caster_animation_speed = main.get('caster_animation_speed', 0)
 
         # Amount of time, caster will be enforced to play self.caster_animation
         # (if not None and unless got damage) and be unable to cast any other skills
-        self.cast_time = main.get("cast_time", 0)
+        self.cast_time = self.archetype.cast_time
 
         # Well, skill's cooldown
-        self.cooldown = main.get("cooldown", 0)
+        self.cooldown = self.archetype.cooldown
 
         # Projectile spawned by skill, in case skill has that thing
-        projectile_data = data.get("Projectile", None)
-        if projectile_data and projectile_data.get("name", None):
-            self.projectile = Storage()
-            self.projectile.name = projectile_data["name"]
-        else:
-            self.projectile = None
+        self.projectile = self.archetype.projectile
 
-        if "Effects" in data:
-            effects = data["Effects"]
-        else:
-            effects = None
+        # (value, multiplier) of damage passed to projectile, or None
+        self.dmg = self.archetype.dmg
+        self.target_effects = self.archetype.target_effects
+        self.caster_effects = self.archetype.caster_effects
 
         if self.projectile:
-            # stuff below is located there, because for the time being it makes
-            # no sense to load it if skill has no projectiles attached to it, as
-            # these only affect projectile
-            self.projectile.scale = projectile_data.get("scale", 0)
-            self.projectile.hitbox = projectile_data.get("hitbox", 0)
-            self.projectile.lifetime = projectile_data.get("lifetime", 0)
-            self.projectile.knockback = projectile_data.get("knockback", 0)
-            self.projectile.spawn_offset = projectile_data.get("spawn_offset", 0)
-            self.projectile.die_on_object_collision = projectile_data.get(
-                "die_on_object_collision", False
-            )
-            self.projectile.die_on_creature_collision = projectile_data.get(
-                "die_on_creature_collision", False
-            )
-            # max is there to ensure that no negative ricochet values can be attached
-            self.projectile.ricochets_amount = max(
-                0, projectile_data.get("ricochets_amount", 0)
-            )
-
-            self.projectile.behavior = projectile_data.get("behavior", None)
             # specify whatever correct variables there, except for "stationary",
             # because stationary projectile doesnt move anywhere
-            if self.projectile.behavior == "follow_caster":
-                self.projectile.target = self.caster
+            if self.projectile.behavior in ("follow_caster", "attach_to_caster"):
+                self.projectile_target = self.caster
                 # setting it there coz it should follow the caster with caster's spd
-                self.projectile.speed = self.caster_stats.get("mov_spd", 0)
-            else:
-                self.projectile.target = None
-                self.projectile.speed = projectile_data.get("speed", 0)
-
-            if (
-                projectile_data.get("scale_with_caster", False)
-                and self.caster.get_scale() != 1
-            ):
-                self.projectile.scale_modifier = self.caster.get_scale()[0]
+                self.projectile_speed = self.caster_stats.get("mov_spd", 0)
             else:
-                self.projectile.scale_modifier = 0
+                self.projectile_target = None
+                self.projectile_speed = self.projectile.speed
 
-            caster_category = self.caster.get_python_tag("category")
-
-            if caster_category == shared.game_data.player_category:
-                self.projectile.category = shared.game_data.player_projectile_category
-            else:
-                self.projectile.category = shared.game_data.enemy_projectile_category
-
-            # Idk about current format, but Im trying to make it easy to use below
-            # without need to store useless variables in memory
-            if "Stats" in data:
-                self.stats = Storage()
-                dstats = data["Stats"]
-
-                dmg = dstats.get("dmg", 0)
-                dmg_multiplier = dstats.get("dmg_multiplier", 0)
-                if dmg or dmg_multiplier:
-                    self.stats.dmg = Storage()
-                    self.stats.dmg.value = dmg
-                    self.stats.dmg.multiplier = dmg_multiplier
-                else:
-                    self.stats.dmg = None
+            if self.projectile.scale_with_caster and self.caster.node.get_scale() != 1:
+                self.projectile_scale_modifier = self.caster.node.get_scale()[0]
             else:
-                self.stats = None
+                self.projectile_scale_modifier = 0
 
-            if effects and "target" in effects:
-                dteffects = effects["target"]
-                self.target_effects = Storage()
-
-                self.target_effects.stun = dteffects.get("stun", 0)
+            if self.caster.category == shared.game_data.player_category:
+                self.projectile_category = shared.game_data.player_projectile_category
             else:
-                self.target_effects = None
-
-        if effects and "caster" in effects:
-            dceffects = effects["caster"]
-            self.caster_effects = Storage()
-
-            self.caster_effects.stun = dceffects.get("stun", 0)
-        else:
-            self.caster_effects = None
+                self.projectile_category = shared.game_data.enemy_projectile_category
 
         # This is a timer variable, that resets to self.cooldown when it reach 0
         if self.cooldown:
@@ -162,131 +98,139 @@ class Skill:
         # idk if I can get rid of it
         self.used = False
 
+        self.prewarm_projectiles()
+
+    def get_projectile_settings(self) -> tuple:
+        """Get (class, kwargs) of projectile that should be spawned on cast"""
+        settings = {
+            "name": self.projectile.name,
+            # this will explode on None, but it shouldnt happen... I guess
+            "category": self.projectile_category,
+            # this shouldnt do anything on None or 0
+            "scale": self.projectile.scale,
+            "damage": self.calculate_stat("dmg"),
+            # same for all of these
+            "hitbox_size": self.projectile.hitbox,
+            "lifetime": self.projectile.lifetime,
+            "effects": self.target_effects,
+            "scale_modifier": self.projectile_scale_modifier,
+            "die_on_object_collision": self.projectile.die_on_object_collision,
+            "die_on_creature_collision": self.projectile.die_on_creature_collision,
+            "rehit_interval": self.projectile.rehit_interval,
+        }
+
+        if self.projectile.behavior == "follow_caster":
+            projectile_class = entity2d.ChasingProjectile
+            settings["speed"] = self.projectile_speed
+        elif self.projectile.behavior == "attach_to_caster":
+            projectile_class = entity2d.AttachedProjectile
+        elif self.projectile.behavior == "move_towards_direction":
+            projectile_class = entity2d.MovingProjectile
+            settings["speed"] = self.projectile_speed
+            settings["ricochets_amount"] = self.projectile.ricochets_amount
+        else:
+            projectile_class = entity2d.Projectile
+
+        return projectile_class, settings
+
+    def get_projectile_key(self, projectile_class, settings: dict) -> tuple:
+        """Get key of projectile pool, shared by all identical projectiles"""
+        # effects are mapping, which cant be hashed. Thus using their content
+        settings = dict(settings)
+        if settings["effects"]:
+            settings["effects"] = tuple(sorted(settings["effects"].items()))
+        return (projectile_class, *sorted(settings.items()))
+
     def initialize_projectile(self):
-        """Initializes projectile from provided data"""
+        """Get projectile from pool, or initialize new one from provided data"""
         if not self.projectile:
             log.debug(f"{self.name} has no projectile attached to it")
             return
 
-        dmg = self.calculate_stat("dmg")
-
-        if self.projectile.behavior == "follow_caster":
-            projectile = entity2d.ChasingProjectile(
-                name=self.projectile.name,
-                # this will explode on None, but it
-                # shouldnt happen... I guess
-                category=self.projectile.category,
-                # this shouldnt do anything on None or 0
-                scale=self.projectile.scale,
-                damage=dmg,
-                # same for all of these
-                hitbox_size=self.projectile.hitbox,
-                lifetime=self.projectile.lifetime,
-                effects=self.target_effects,
-                scale_modifier=self.projectile.scale_modifier,
-                speed=self.projectile.speed,
-                die_on_object_collision=self.projectile.die_on_object_collision,
-                die_on_creature_collision=self.projectile.die_on_creature_collision,
-            )
-
-        elif self.projectile.behavior == "move_towards_direction":
-            projectile = entity2d.MovingProjectile(
-                name=self.projectile.name,
-                category=self.projectile.category,
-                speed=self.projectile.speed,
-                scale=self.projectile.scale,
-                damage=dmg,
-                hitbox_size=self.projectile.hitbox,
-                lifetime=self.projectile.lifetime,
-                effects=self.target_effects,
-                scale_modifier=self.projectile.scale_modifier,
-                die_on_object_collision=self.projectile.die_on_object_collision,
-                die_on_creature_collision=self.projectile.die_on_creature_collision,
-                ricochets_amount=self.projectile.ricochets_amount,
-            )
-        else:
-            projectile = entity2d.Projectile(
-                name=self.projectile.name,
-                category=self.projectile.category,
-                scale=self.projectile.scale,
-                damage=dmg,
-                hitbox_size=self.projectile.hitbox,
-                lifetime=self.projectile.lifetime,
-                effects=self.target_effects,
-                scale_modifier=self.projectile.scale_modifier,
-                die_on_object_collision=self.projectile.die_on_object_collision,
-                die_on_creature_collision=self.projectile.die_on_creature_collision,
-            )
+        # I tried deepcopy approach, but it didnt work coz same node on scene
+        # graph was reused for projectiles of same type, which caused many
+        # issues. So instead, projectiles that has died are reused
+        projectile_class, settings = self.get_projectile_settings()
+        return shared.level.projectile_pool.get(
+            self.get_projectile_key(projectile_class, settings),
+            lambda: projectile_class(**settings),
+        )
+
+    def prewarm_projectiles(self, amount: int = PREWARMED_PROJECTILES):
+        """Create projectiles in advance, so first casts wont have to do that"""
+        if not self.projectile:
+            return
 
-        return projectile
+        projectile_class, settings = self.get_projectile_settings()
+        shared.level.projectile_pool.prewarm(
+            self.get_projectile_key(projectile_class, settings),
+            lambda: projectile_class(**settings),
+            amount,
+        )
 
     def calculate_stat(self, stat_name: str):
         """Calculates, how much of provided stat skill will pass to projectile,
         based on (stat+self.caster_stats['stat'])*multiplier"""
-        if self.stats and getattr(self.stats, stat_name, None):
-            stat = getattr(self.stats, stat_name)
+        stat = getattr(self, stat_name, None)
+        if stat:
+            value, multiplier = stat
             caster_stat = self.caster_stats.get(stat_name, 0)
-            calculated_stat = (stat.value + caster_stat) * stat.multiplier
+            calculated_stat = (value + caster_stat) * multiplier
 
             return calculated_stat
         else:
 
             return 0
 
+    def reset(self):
+        """Make skill available again, as if it has never been casted"""
+        self.used = False
+        if self.cooldown:
+            self.current_cooldown = 0
+        if self.cast_time:
+            self.current_cast_time = 0
+
     def cast(self, position=None, direction=0, angle=None):
         """Casts the skill"""
         # TODO: maybe configure position and angle automatically, based on caster?
 
-        # if self.caster.get_python_tag("using_skill") or self.used:
-        if self.used or self.caster.get_python_tag("using_skill"):
+        if self.used or self.caster.using_skill:
             return
 
-        log.info(f"{self.caster} casts skill {self.name}")
+        log.info(f"{self.caster.name} casts skill {self.name}")
 
         if self.cast_time:
-            self.caster.set_python_tag("using_skill", True)
+            self.caster.using_skill = True
             self.current_cast_time = self.cast_time
-            base.task_mgr.add(
-                self.cast_time_handler,
-                f"cast time handler of {self.caster}'s {self.name} skill",
+            shared.level.simulation.add(
+                simulation.COOLDOWNS_STAGE, self.cast_time_handler
             )
 
         if self.caster_animation:
             # since custom values for animation playback arent implemented yet,
             # not worrying about speed at all
             # if self.caster_speed =
-            change_func = self.caster.get_python_tag("change_animation")
-            change_func(self.caster_animation)
+            self.caster.change_animation(self.caster_animation)
 
         if self.caster_effects:
             # and self.buff_caster:
-            # This may not look like it, but it actually applies custom values
-            buff_caster = self.caster.get_python_tag("apply_effect")
-
-            if self.caster_effects.stun:
-                # caster_effects['stun'] = self.caster_effects.stun
-                # print('stun', self.caster_effects.stun, self.buff_caster)
-                buff_caster("stun", self.caster_effects.stun)
+            if self.caster_effects["stun"]:
+                self.caster.apply_effect("stun", self.caster_effects["stun"])
 
         if self.cooldown:
             # there is no point to flip this switch if skill has no cd, I think
             self.used = True
             self.current_cooldown = self.cooldown
             # and there is no point to reset cd if it equals 0 since start
-            base.task_mgr.add(
-                self.cooldown_handler,
-                f"cooldown handler of {self.caster}'s {self.name} skill",
+            shared.level.simulation.add(
+                simulation.COOLDOWNS_STAGE, self.cooldown_handler
             )
 
         if self.projectile:
-            # I tried deepcopy approach, but it didnt work coz same node on scene
-            # graph was reused for projectiles of same type, which caused many
-            # issues. Probably I should try some other serialization approach
-            # TODO
             projectile = self.initialize_projectile()
 
             if not position:
-                position = self.caster.get_pos()
+                position = self.caster.position
 
             # I could just import offsets with 1 being replacement value in case
             # its not set, but I thought this will be better
@@ -298,44 +242,34 @@ class Skill:
                 direction=direction,
                 angle=angle,
                 # this will need adjustments in future
-                target=self.projectile.target,
+                target=self.projectile_target,
             )
 
-            # maybe I should attach it to skill itself instead? or to caster? and
-            # destroy together? Hmmm.... #TODO
-            shared.level.projectiles.append(projectile)
-
     def cast_time_handler(self, event):
         """Same as cooldown handler, but for self.cast_time"""
         # safety check that disables routine if caster has died
-        # if not self.caster or self.caster.dead:
-        if not self.caster or self.caster.get_python_tag("dead"):
+        if not self.caster or self.caster.dead:
             return
 
-        dt = globalClock.get_dt()
-
-        self.current_cast_time -= dt
+        self.current_cast_time -= event.dt
         if self.current_cast_time <= 0:
             self.current_cast_time = 0
-            self.caster.set_python_tag("using_skill", False)
+            self.caster.using_skill = False
             return
 
         return event.cont
 
     def cooldown_handler(self, event):
-        """Intended to be used as taskmanager routine, triggered on skill's cast.
+        """Intended to be used as simulation's routine, triggered on skill's cast.
         If self.cooldown > 0, count self.current_cooldown to 0, then reset it
         back to self.current_cooldown = self.cooldown, making skill available to
         re-cast again"""
 
         # safety check that disables routine if caster has died
-        # if not self.caster or self.caster.dead:
-        if not self.caster or self.caster.get_python_tag("dead"):
+        if not self.caster or self.caster.dead:
             return
 
-        dt = globalClock.get_dt()
-
-        self.current_cooldown -= dt
+        self.current_cooldown -= event.dt
         if self.current_cooldown <= 0:
             self.used = False
             self.current_cooldown = 0
@@ -32,6 +32,8 @@ DATA_DIR = join(USER_DIR, "Data")
 # maybe save it in different place.
 # say, data in .local/share and settings in .config #TODO
 SETTINGS_DIR = join(USER_DIR, "Settings")
+# data of assets, preprocessed during previous launches
+CACHE_DIR = join(USER_DIR, "Cache")
 
 LEADERBOARDS = "leaderboards.json"
 